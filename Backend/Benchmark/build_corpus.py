@@ -0,0 +1,182 @@
+import os
+import json
+import random
+from os.path import join as pjoin, dirname, abspath
+
+
+# Builds the frozen page corpus of the crawler benchmarks. The pages follow the layouts of typical university and company
+# websites (mega menus, cookie banners, page-builder nesting, sitemaps) and are generated from fixed seeds, so a rebuilt
+# corpus is identical and benchmark results stay comparable between commits.
+corpus_dir = pjoin(dirname(abspath(__file__)), 'corpus')
+
+words = ('study program research campus faculty student admission course lecture exam degree master bachelor science '
+         'engineering library semester application deadline scholarship department professor international exchange '
+         'laboratory innovation project partner industry career event news contact office building housing mobility '
+         'visa language certificate module credit thesis doctoral institute center management medicine informatics').split()
+
+
+def sentence(rng, length=14):
+    text = ' '.join(rng.choice(words) for _ in range(length))
+    return text[0].upper() + text[1:] + '.'
+
+
+def paragraph(rng, sentences=5):
+    return ' '.join(sentence(rng, rng.randint(8, 20)) for _ in range(sentences))
+
+
+def head(title, rng):
+    styles = ''.join(f'.c{i}{{margin:{i}px;padding:{i % 7}px}}' for i in range(300))
+    scripts = ''.join(f'<script src="/static/js/chunk-{i}.{rng.getrandbits(32):08x}.js" defer></script>' for i in range(12))
+    return (f'<head><meta charset="utf-8"><title>{title}</title>'
+            f'<meta name="viewport" content="width=device-width, initial-scale=1">'
+            f'<meta name="description" content="{sentence(rng)}">'
+            f'<meta property="og:title" content="{title}"><meta property="og:image" content="/static/og.png">'
+            f'<link rel="stylesheet" href="/static/css/main.css"><link rel="icon" href="/favicon.ico">'
+            f'<style>{styles}</style>{scripts}'
+            f'<script type="application/ld+json">{json.dumps({"@type": "Organization", "name": "Example University"})}</script>'
+            f'<script>window.dataLayer=window.dataLayer||[];function gtag(){{dataLayer.push(arguments)}}</script>'
+            f'</head>')
+
+
+def site_header():
+    # The same on every page, the part of the site template
+    rng = random.Random(1)
+    menus = ''.join(
+        f'<li class="menu-item has-children"><a href="/en/{section}/">{section.title()}</a><div class="mega-menu"><ul>'
+        + ''.join(f'<li><a href="/en/{section}/{rng.choice(words)}-{i}/">{sentence(rng, 3)[:-1]}</a></li>' for i in range(12))
+        + '</ul></div></li>'
+        for section in ('studies', 'research', 'about', 'campus', 'international', 'news'))
+    return ('<div id="cookie-banner" class="cookie-consent"><p>We use cookies to improve your experience on our website. '
+            'By continuing to browse you agree to our use of cookies.</p><button>Accept all</button><button>Settings</button></div>'
+            '<header class="site-header"><div class="container"><a class="logo" href="/en/"><img src="/static/logo.svg" alt="Example University"></a>'
+            f'<nav class="main-navigation" aria-label="Main"><ul class="menu">{menus}</ul></nav>'
+            '<form class="search" action="/en/search"><input type="search" name="q" placeholder="Search"><button>Search</button></form>'
+            '</div></header>')
+
+
+def site_footer():
+    rng = random.Random(2)
+    columns = ''.join(
+        '<div class="footer-column"><h4>' + sentence(rng, 2)[:-1] + '</h4><ul>'
+        + ''.join(f'<li><a href="/en/{rng.choice(words)}/{rng.choice(words)}/">{sentence(rng, 3)[:-1]}</a></li>' for _ in range(8))
+        + '</ul></div>'
+        for _ in range(4))
+    return (f'<footer class="site-footer"><div class="container"><div class="footer-columns">{columns}</div>'
+            '<p class="copyright">Copyright 2024 Example University, all rights reserved. Imprint, privacy policy and accessibility.</p>'
+            '<div class="social"><a href="https://twitter.com/example"><svg><path d="M0 0h24v24H0z"/></svg></a></div></div></footer>')
+
+
+def page(title, body, rng):
+    return f'<!DOCTYPE html><html lang="en">{head(title, rng)}<body class="page">{site_header()}{body}{site_footer()}</body></html>'
+
+
+def small_page(rng):
+    """
+    A short landing page with a teaser grid.
+    """
+    teasers = ''.join(f'<div class="teaser"><a href="/en/{rng.choice(words)}/"><img src="/img/t{i}.jpg" alt="{sentence(rng, 3)}">'
+                      f'<h3>{sentence(rng, 4)[:-1]}</h3></a><p>{sentence(rng)}</p></div>' for i in range(6))
+    body = (f'<main id="content"><section class="hero"><h1>Welcome to Example University</h1><p>{paragraph(rng, 2)}</p></section>'
+            f'<section class="teasers"><div class="grid">{teasers}</div></section></main>')
+    return page('Example University', body, rng)
+
+
+def article_page(rng):
+    """
+    A news article with images, a quote, a fact box and related links.
+    """
+    blocks = []
+    for i in range(12):
+        blocks.append(f'<h2>{sentence(rng, 5)[:-1]}</h2><p>{paragraph(rng)}</p><p>{paragraph(rng, 4)}</p>')
+        if i % 4 == 1:
+            blocks.append(f'<figure><img src="/img/news/{i}.jpg" alt="{sentence(rng, 6)}"><figcaption>{sentence(rng)}</figcaption></figure>')
+        if i == 5:
+            blocks.append(f'<blockquote><p>{sentence(rng, 20)}</p><cite>Prof. Example</cite></blockquote>')
+    facts = ''.join(f'<tr><th>{rng.choice(words).title()}</th><td>{rng.randint(10, 9999)}</td></tr>' for _ in range(8))
+    related = ''.join(f'<li><a href="/en/news/{rng.randint(1000, 9999)}">{sentence(rng, 6)[:-1]}</a></li>' for _ in range(6))
+    body = (f'<main id="content"><nav class="breadcrumb"><a href="/en/">Home</a> / <a href="/en/news/">News</a></nav>'
+            f'<article><h1>{sentence(rng, 8)[:-1]}</h1><p class="date">12.03.2024</p><p class="lead"><strong>{paragraph(rng, 2)}</strong></p>'
+            f'{"".join(blocks)}<table class="facts">{facts}</table></article>'
+            f'<aside class="related"><h3>Related news</h3><ul>{related}</ul></aside></main>')
+    return page('News - Example University', body, rng)
+
+
+def huge_page(rng):
+    """
+    A long handbook page with hundreds of sections, tables and a table of contents.
+    """
+    sections, toc = [], []
+    for i in range(400):
+        toc.append(f'<li><a href="#section-{i}">{i + 1}. {sentence(rng, 4)[:-1]}</a></li>')
+        rows = ''.join(f'<tr><td>{rng.choice(words)}</td><td>{rng.randint(1, 30)} ECTS</td><td>{sentence(rng, 6)}</td></tr>'
+                       for _ in range(4))
+        sections.append(f'<section id="section-{i}"><h2>{i + 1}. {sentence(rng, 4)[:-1]}</h2><p>{paragraph(rng, 6)}</p>'
+                        f'<ul>{"".join(f"<li>{sentence(rng, 10)}</li>" for _ in range(3))}</ul>'
+                        f'<table><thead><tr><th>Module</th><th>Credits</th><th>Description</th></tr></thead><tbody>{rows}</tbody></table></section>')
+    body = (f'<main id="content"><h1>Module handbook</h1><nav class="toc"><ol>{"".join(toc)}</ol></nav>'
+            f'<div class="handbook">{"".join(sections)}</div></main>')
+    return page('Module handbook - Example University', body, rng)
+
+
+def nested_page(rng):
+    """
+    A page-builder page, where each content element is wrapped in dozens of layout divs.
+    """
+    def wrapped(content, depth):
+        for level in range(depth):
+            content = f'<div class="et_pb_row et_pb_column_{level} c{rng.randint(0, 299)}"><div class="wrapper">{content}</div></div>'
+        return content
+
+    elements = ''.join(wrapped(f'<div class="et_pb_text"><p>{paragraph(rng, 2)}</p></div>' if i % 3 else
+                               f'<div class="et_pb_image"><img src="/img/b{i}.jpg" alt="{sentence(rng, 4)}"></div>', rng.randint(10, 30))
+                       for i in range(60))
+    # A single deeply nested chain, as left by broken markup
+    chain = wrapped(f'<p>{paragraph(rng)}</p>', 250)
+    body = f'<main id="content"><div id="page-container"><h1>{sentence(rng, 5)[:-1]}</h1>{elements}{chain}</div></main>'
+    return page('Campus life - Example University', body, rng)
+
+
+def links_page(rng):
+    """
+    A sitemap page with thousands of links in nested lists.
+    """
+    groups = []
+    for section in ('studies', 'research', 'about', 'campus', 'international', 'news', 'people', 'events'):
+        items = ''.join(f'<li><a href="/en/{section}/{rng.choice(words)}-{rng.randint(0, 99999)}/">{sentence(rng, 4)[:-1]}</a>'
+                        f'<ul>{"".join(f"<li><a href=/en/{section}/{i}/{j}/>{sentence(rng, 3)[:-1]}</a></li>" for j in range(4))}</ul></li>'
+                        for i in range(80))
+        groups.append(f'<section><h2>{section.title()}</h2><ul class="sitemap">{items}</ul></section>')
+    body = f'<main id="content"><h1>Sitemap</h1>{"".join(groups)}</main>'
+    return page('Sitemap - Example University', body, rng)
+
+
+corpus_pages = {
+    'small': small_page,
+    'article': article_page,
+    'huge': huge_page,
+    'nested': nested_page,
+    'links': links_page,
+}
+
+
+def build_corpus(output_dir=corpus_dir):
+    """
+    Writes the corpus pages as html files.
+    Args:
+        output_dir (str): Directory of the corpus
+    Returns:
+        dict: Size in bytes of each page by name
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    sizes = {}
+    for seed, (name, build_page) in enumerate(corpus_pages.items()):
+        html = build_page(random.Random(seed)).encode('utf-8')
+        with open(pjoin(output_dir, f'{name}.html'), 'wb') as f:
+            f.write(html)
+        sizes[name] = len(html)
+    return sizes
+
+
+if __name__ == '__main__':
+    for name, size in build_corpus().items():
+        print(f'{name:8s} {size / 1024:8.1f} KiB')
@@ -0,0 +1,104 @@
+import os
+import threading
+from os.path import join as pjoin, dirname, abspath
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+corpus_dir = pjoin(dirname(abspath(__file__)), 'corpus')
+
+
+def load_corpus(directory=corpus_dir):
+    """
+    Loads the corpus pages.
+    Args:
+        directory (str): Directory of the corpus
+    Returns:
+        dict: Html bytes of each page by name, in name order
+    """
+    corpus = {}
+    for file_name in sorted(os.listdir(directory)):
+        if file_name.endswith('.html'):
+            with open(pjoin(directory, file_name), 'rb') as f:
+                corpus[file_name[:-len('.html')]] = f.read()
+    return corpus
+
+
+class CorpusServer:
+    """
+    Serves the corpus as a local website for end-to-end crawl benchmarks.
+    The site has page_count pages under /site/, page i showing corpus page i modulo the corpus size. Each page links to
+    the next branching pages of the site, so a crawl starting at /site/0 reaches every page within a few levels.
+    Args:
+        page_count (int): Number of pages of the site
+        branching (int): Number of site pages each page links to
+        corpus (dict): Html bytes of the corpus pages by name, the checked-in corpus by default
+        host (str): Host to listen on
+        port (int): Port to listen on, 0 for a free port
+    """
+    site_path = '/site/'
+
+    def __init__(self, page_count=200, branching=8, corpus=None, host='127.0.0.1', port=0):
+        self.page_count = page_count
+        self.branching = branching
+        self.corpus = list((corpus or load_corpus()).values())
+        self.server = ThreadingHTTPServer((host, port), self.handler_class())
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}{self.site_path}'
+
+    def page(self, index):
+        """
+        Builds a page of the site from its corpus page and its links to the next pages.
+        Args:
+            index (int): Index of the page
+        Returns:
+            bytes: Html of the page
+        """
+        html = self.corpus[index % len(self.corpus)]
+        links = ''.join(f'<li><a href="{self.site_path}{(index * self.branching + k) % self.page_count}">Page {k}</a></li>'
+                        for k in range(1, self.branching + 1))
+        return html.replace(b'</body>', f'<ul class="site-pages">{links}</ul></body>'.encode('utf-8'), 1)
+
+    def handler_class(self):
+        site = self
+
+        class CorpusHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                index = self.path[len(site.site_path):] if self.path.startswith(site.site_path) else ''
+                if not index.isdigit() or int(index) >= site.page_count:
+                    self.send_error(404)
+                    return
+                body = site.page(int(index))
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return CorpusHandler
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name='corpus-server', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+if __name__ == '__main__':
+    import time
+    server = CorpusServer().start()
+    print(f'Serving {server.page_count} corpus pages at {server.url}0, press Ctrl+C to stop')
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
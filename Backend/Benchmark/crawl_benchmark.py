@@ -0,0 +1,295 @@
+import os
+import sys
+import json
+import time
+import platform
+import statistics
+import subprocess
+import tracemalloc
+import multiprocessing
+from os.path import join as pjoin, dirname, abspath
+from datetime import datetime
+
+
+parser_stages = ('parse_document', 'clean_head', 'clean_elements', 'remove_existing_link_elements',
+                 'remove_empty_elements', 'remove_redundant_divs', 'generate_markdown')
+
+
+"""
+************************
+*** Parser benchmark ***
+************************
+"""
+def benchmark_parser(backend, corpus, repeat=5):
+    """
+    Times each cleaning stage of HTMLParser.clean_html on every corpus page, and its peak memory.
+    Args:
+        backend (str): HTML parser backend, 'lxml' or 'bs4'
+        corpus (dict): Html bytes of the corpus pages by name
+        repeat (int): Number of timed runs per page, the median is reported
+    Returns:
+        dict: Results by page name, with the page size, median milliseconds per stage, their total and the peak memory
+    """
+    from scrapy.http import HtmlResponse
+    from Crawler.html_parser import create_html_parser
+
+    # Without template learning, which would strip most of the page after the first runs
+    parser = create_html_parser(backend, template_learning_pages=0)
+    results = {}
+    for name, html in corpus.items():
+        response = HtmlResponse(url=f'https://www.example.edu/en/{name}', body=html, encoding='utf-8')
+        timings = {stage: [] for stage in parser_stages}
+        for _ in range(repeat):
+            start = time.perf_counter()
+            document = parser.parse_document(response)
+            timings['parse_document'].append(time.perf_counter() - start)
+            # Half of the links count as discovered before, as on a page in the middle of a crawl
+            existing_urls = set(parser.extract_links(document)[::2])
+            for stage in parser_stages[1:]:
+                if stage == 'remove_existing_link_elements':
+                    args = (document, existing_urls)
+                elif stage == 'generate_markdown':
+                    args = (document, response.url)
+                else:
+                    args = (document,)
+                start = time.perf_counter()
+                getattr(parser, stage)(*args)
+                timings[stage].append(time.perf_counter() - start)
+
+        # Measured in a separate run, as tracing slows down allocations
+        tracemalloc.start()
+        parser.clean_html(response, set())
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        stages_ms = {stage: round(statistics.median(times) * 1000, 3) for stage, times in timings.items()}
+        results[name] = {
+            'bytes': len(html),
+            'stages_ms': stages_ms,
+            'total_ms': round(sum(stages_ms.values()), 3),
+            'peak_memory_bytes': peak_memory
+        }
+        print(f'{backend:5s} {name:8s} {len(html) / 1024:7.1f} KiB {results[name]["total_ms"]:9.2f} ms '
+              f'{peak_memory / 2 ** 20:7.1f} MiB peak  ' + ' '.join(f'{stage}={ms:.2f}' for stage, ms in stages_ms.items()))
+    return results
+
+
+"""
+************************
+*** Spider benchmark ***
+************************
+"""
+def max_rss_bytes():
+    """
+    Returns:
+        int: Peak resident memory of the current process, None where the resource module is not available
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if sys.platform == 'darwin' else max_rss * 1024  # Bytes on macOS, KiB on Linux
+
+
+def run_spider(backend, site_url, output_dir, settings, cleaning_workers, results):
+    """
+    Crawls the corpus site with UTASpider in the current process, the target of the spider benchmark processes.
+    Args:
+        backend (str): HTML parser backend
+        site_url (str): Url of the corpus site, the crawl starts at its first page and is limited to it
+        output_dir (str): Directory to save the crawled pages to
+        settings (dict): Scrapy settings
+        cleaning_workers (int): Number of page cleaning worker processes
+        results (multiprocessing.Queue): Queue to put the results on
+    """
+    from scrapy.crawler import CrawlerProcess
+    from Crawler.crawler import UTASpider
+
+    sys.stdout = open(os.devnull, 'w')  # The spider reports every page
+    process = CrawlerProcess(settings)
+    start = time.perf_counter()
+    process.crawl(UTASpider, output_dir=output_dir, start_urls=[site_url + '0'], company_name=backend, domain_limit=site_url,
+                  near_duplicate_distance=None, parser_backend=backend, cleaning_workers=cleaning_workers)
+    process.start()
+    elapsed = time.perf_counter() - start
+    with open(pjoin(output_dir, backend, 'website_info.json'), 'r', encoding='utf-8') as f:
+        info = json.load(f)
+    results.put({
+        'pages': info['visited_count'],
+        'failed': info['failed_count'],
+        'seconds': round(elapsed, 3),
+        'pages_per_second': round(info['visited_count'] / elapsed, 2),
+        'max_rss_bytes': max_rss_bytes()
+    })
+
+
+def benchmark_spider(backend, page_count=200, concurrency=16, cleaning_workers=0):
+    """
+    Crawls the corpus served by a local CorpusServer end-to-end, in a fresh process per run so the reactor and the
+    memory peak are not shared between runs.
+    Args:
+        backend (str): HTML parser backend
+        page_count (int): Number of pages of the corpus site
+        concurrency (int): Number of concurrent requests
+        cleaning_workers (int): Number of page cleaning worker processes
+    Returns:
+        dict: Crawled and failed pages, seconds, pages per second and peak resident memory of the crawler process
+    """
+    import tempfile
+    from Benchmark.corpus_server import CorpusServer
+
+    settings = {
+        'LOG_ENABLED': True,
+        'LOG_LEVEL': 'ERROR',
+        'ROBOTSTXT_OBEY': False,
+        'CONCURRENT_REQUESTS': concurrency,
+        'CONCURRENT_REQUESTS_PER_DOMAIN': concurrency,
+        'DOWNLOAD_DELAY': 0
+    }
+    server = CorpusServer(page_count=page_count).start()
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    try:
+        with tempfile.TemporaryDirectory() as output_dir:
+            process = context.Process(target=run_spider, args=(backend, server.url, output_dir, settings, cleaning_workers, results))
+            process.start()
+            result = results.get()
+            process.join()
+    finally:
+        server.stop()
+    print(f'{backend:5s} spider   {result["pages"]} pages in {result["seconds"]:.1f}s, {result["pages_per_second"]:.1f} pages/s, '
+          f'{(result["max_rss_bytes"] or 0) / 2 ** 20:.0f} MiB peak RSS')
+    return result
+
+
+"""
+******************
+*** Comparison ***
+******************
+"""
+def result_metrics(results):
+    """
+    Flattens the comparable metrics of a benchmark result.
+    Args:
+        results (dict): Benchmark result
+    Returns:
+        dict: {metric path: (value, whether higher is better)}
+    """
+    metrics = {}
+    for backend, pages in results.get('parser', {}).items():
+        for name, page in pages.items():
+            for stage, ms in page['stages_ms'].items():
+                metrics[f'parser.{backend}.{name}.{stage}_ms'] = (ms, False)
+            metrics[f'parser.{backend}.{name}.total_ms'] = (page['total_ms'], False)
+            metrics[f'parser.{backend}.{name}.peak_memory_bytes'] = (page['peak_memory_bytes'], False)
+    for backend, spider in results.get('spider', {}).items():
+        metrics[f'spider.{backend}.pages_per_second'] = (spider['pages_per_second'], True)
+        if spider.get('max_rss_bytes'):
+            metrics[f'spider.{backend}.max_rss_bytes'] = (spider['max_rss_bytes'], False)
+    return metrics
+
+
+def compare_results(baseline, current, threshold=0.1, min_ms=0.5):
+    """
+    Compares two benchmark results and reports the metrics that got worse by more than the threshold.
+    Args:
+        baseline (dict): Benchmark result of the baseline commit
+        current (dict): Benchmark result to check
+        threshold (float): Relative change above which a metric counts as a regression
+        min_ms (float): Stage timings below this many milliseconds are too noisy to be compared
+    Returns:
+        list: Regressions as (metric path, baseline value, current value)
+    """
+    baseline_metrics, current_metrics = result_metrics(baseline), result_metrics(current)
+    regressions = []
+    print(f'Comparing {current.get("commit")} with baseline {baseline.get("commit")}')
+    for path, (value, higher_is_better) in current_metrics.items():
+        if path not in baseline_metrics or not baseline_metrics[path][0]:
+            continue
+        base_value = baseline_metrics[path][0]
+        if path.endswith('_ms') and max(value, base_value) < min_ms:
+            continue
+        change = (value - base_value) / base_value
+        worse = -change if higher_is_better else change
+        marker = 'REGRESSION' if worse > threshold else 'improved' if worse < -threshold else ''
+        if marker:
+            print(f'{path:60s} {base_value:>14,.2f} -> {value:>14,.2f} {change:+7.1%} {marker}')
+        if worse > threshold:
+            regressions.append((path, base_value, value))
+    print(f'{len(regressions)} regression(s) above {threshold:.0%}')
+    return regressions
+
+
+def git_commit():
+    """
+    Returns:
+        str: Short hash of the checked-out commit, with '-dirty' for uncommitted changes, None outside a git checkout
+    """
+    try:
+        cwd = dirname(abspath(__file__))
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=cwd, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=cwd, capture_output=True, text=True).stdout.strip()
+        return f'{commit}-dirty' if dirty else commit
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(backends=('bs4', 'lxml'), repeat=5, page_count=200, concurrency=16, cleaning_workers=0, spider=True):
+    """
+    Runs the parser and spider benchmarks on the corpus.
+    Args:
+        backends (tuple): HTML parser backends to benchmark
+        repeat (int): Number of timed runs per corpus page
+        page_count (int): Number of pages of the crawled corpus site
+        concurrency (int): Number of concurrent requests of the spider
+        cleaning_workers (int): Number of page cleaning worker processes of the spider
+        spider (bool): Whether to run the end-to-end spider benchmark
+    Returns:
+        dict: Benchmark result
+    """
+    from Benchmark.corpus_server import load_corpus
+    corpus = load_corpus()
+    results = {
+        'commit': git_commit(),
+        'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'config': {'repeat': repeat, 'page_count': page_count, 'concurrency': concurrency, 'cleaning_workers': cleaning_workers},
+        'corpus': {name: len(html) for name, html in corpus.items()},
+        'parser': {backend: benchmark_parser(backend, corpus, repeat) for backend in backends},
+    }
+    if spider:
+        results['spider'] = {backend: benchmark_spider(backend, page_count, concurrency, cleaning_workers) for backend in backends}
+    return results
+
+
+if __name__ == '__main__':
+    import argparse
+    sys.path.append(dirname(dirname(abspath(__file__))))
+
+    # python Benchmark/crawl_benchmark.py --output before.json, then --output after.json --compare before.json
+    arg_parser = argparse.ArgumentParser(description='Benchmarks the HTML parser stages and the crawler on the frozen page corpus')
+    arg_parser.add_argument('--output', help='JSON file for the results, ./Output/benchmarks/crawl_<commit>.json by default')
+    arg_parser.add_argument('--compare', help='JSON results of a baseline commit to check for regressions')
+    arg_parser.add_argument('--threshold', type=float, default=0.1, help='Relative slowdown reported as a regression')
+    arg_parser.add_argument('--backends', nargs='+', default=['bs4', 'lxml'], choices=['bs4', 'lxml'])
+    arg_parser.add_argument('--repeat', type=int, default=5, help='Timed runs per corpus page')
+    arg_parser.add_argument('--pages', type=int, default=200, help='Pages of the crawled corpus site')
+    arg_parser.add_argument('--concurrency', type=int, default=16, help='Concurrent requests of the spider')
+    arg_parser.add_argument('--cleaning-workers', type=int, default=0, help='Page cleaning worker processes of the spider')
+    arg_parser.add_argument('--no-spider', action='store_true', help='Only benchmark the parser stages')
+    args = arg_parser.parse_args()
+
+    results = run_benchmarks(tuple(args.backends), args.repeat, args.pages, args.concurrency, args.cleaning_workers, not args.no_spider)
+    output = args.output or pjoin('./Output/benchmarks', f'crawl_{results["commit"] or datetime.now().strftime("%Y%m%d_%H%M%S")}.json')
+    os.makedirs(dirname(abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f'Saved benchmark results to {output}')
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        sys.exit(1 if compare_results(baseline, results, args.threshold) else 0)
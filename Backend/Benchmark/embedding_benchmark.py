@@ -0,0 +1,228 @@
+import os
+import sys
+import json
+import time
+import platform
+from os.path import join as pjoin, dirname, abspath
+from datetime import datetime
+import numpy as np
+
+
+queries = ('What are the admission deadlines for the master program?', 'How many credits is the thesis module?',
+           'Where can international students find housing?', 'Which scholarships are available for doctoral students?',
+           'How do I contact the faculty office?', 'What research laboratories does the engineering department have?')
+
+
+"""
+*************
+*** Texts ***
+*************
+"""
+def corpus_texts(chunk_size=1024, chunk_overlap=20):
+    """
+    Chunks the markdown of the benchmark corpus pages as the RAG systems chunk crawled pages.
+    Args:
+        chunk_size (int): Size of the text chunks
+        chunk_overlap (int): Overlap of the text chunks
+    Returns:
+        list: Text chunks
+    """
+    from scrapy.http import HtmlResponse
+    from llama_index.core.node_parser import SentenceSplitter
+    from Crawler.html_parser import create_html_parser
+    from Benchmark.corpus_server import load_corpus
+
+    parser = create_html_parser('lxml', template_learning_pages=0)
+    splitter = SentenceSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    texts = []
+    for name, html in load_corpus().items():
+        markdown = parser.clean_html(HtmlResponse(url=f'https://www.example.edu/en/{name}', body=html, encoding='utf-8'))[0]
+        texts += splitter.split_text(markdown)
+    return texts
+
+
+def website_texts(website_dir, chunk_size=1024, chunk_overlap=20, max_files=None):
+    """
+    Chunks the saved pages of a crawled website, read as the RAG systems read them.
+    Args:
+        website_dir (str): Directory of the crawled website, with its pages in processed/ or in a page store
+        chunk_size (int): Size of the text chunks
+        chunk_overlap (int): Overlap of the text chunks
+        max_files (int): Maximum number of pages to read, all if None
+    Returns:
+        list: Text chunks
+    """
+    from itertools import islice
+    from llama_index.core.node_parser import SentenceSplitter
+    from RAG.processed_page_reader import ProcessedPageReader
+    from RAG.page_store_reader import PageStoreReader
+
+    if ProcessedPageReader.exists(website_dir):
+        reader = ProcessedPageReader(website_dir)
+    elif PageStoreReader.exists(website_dir):
+        reader = PageStoreReader(website_dir)
+    else:
+        raise ValueError(f'No crawled pages in {website_dir}')
+    splitter = SentenceSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    texts = []
+    for document in islice(reader.lazy_load_data(), max_files):
+        texts += splitter.split_text(document.text)
+    return texts
+
+
+"""
+*****************
+*** Embedding ***
+*****************
+"""
+def load_backend(backend, model_name, threads=None, batch_size=None):
+    """
+    Creates the embedding model of a benchmarked backend.
+    Args:
+        backend (str): 'huggingface' for the PyTorch path, 'onnx' for the int8 ONNX export, 'onnx-fp32' for the unquantized one
+        model_name (str): Name of the HuggingFace embedding model
+        threads (int): Number of ONNX Runtime threads, all cores if None
+        batch_size (int): Number of texts per inference call of the ONNX backends
+    Returns:
+        BaseEmbedding: The embedding model
+    """
+    if backend == 'huggingface':
+        from RAG.embedding_registry import EmbeddingRegistry
+        return EmbeddingRegistry.load_model(backend, model_name)
+    from RAG.onnx_embedding import ONNXEmbedding
+    return ONNXEmbedding.from_model_name(model_name, quantize=backend == 'onnx', threads=threads, batch_size=batch_size)
+
+
+def benchmark_backend(model, texts, repeat=3):
+    """
+    Times embedding the texts and the queries with a model.
+    Args:
+        model (BaseEmbedding): The embedding model
+        texts (list): Text chunks to embed
+        repeat (int): Number of timed runs, the fastest is reported
+    Returns:
+        tuple: Timings, text embeddings and query embeddings as normalized arrays
+    """
+    model.get_text_embedding("warm up")
+    text_times, text_embeddings = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        text_embeddings = model.get_text_embedding_batch(texts)
+        text_times.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    query_embeddings = [model.get_query_embedding(query) for query in queries]
+    query_seconds = (time.perf_counter() - start) / len(queries)
+    timings = {
+        'texts_per_second': round(len(texts) / min(text_times), 2),
+        'seconds': round(min(text_times), 3),
+        'query_ms': round(query_seconds * 1000, 2)
+    }
+    return timings, normalized(text_embeddings), normalized(query_embeddings)
+
+
+def normalized(embeddings):
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    return embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+
+
+def agreement(embeddings, reference):
+    """
+    Compares embeddings to the reference embeddings of the same texts.
+    Args:
+        embeddings (np.ndarray): Normalized embeddings
+        reference (np.ndarray): Normalized reference embeddings
+    Returns:
+        dict: Mean and minimum cosine similarity of each embedding to its reference
+    """
+    cosine = (embeddings * reference).sum(axis=1)
+    return {'mean_cosine': round(float(cosine.mean()), 5), 'min_cosine': round(float(cosine.min()), 5)}
+
+
+def top_k_overlap(query_embeddings, text_embeddings, reference_queries, reference_texts, k=5):
+    """
+    Returns:
+        float: Mean share of the reference top-k chunks of each query that are also retrieved with the embeddings
+    """
+    k = min(k, len(text_embeddings))
+    top = np.argsort(-query_embeddings @ text_embeddings.T, axis=1)[:, :k]
+    reference_top = np.argsort(-reference_queries @ reference_texts.T, axis=1)[:, :k]
+    return round(float(np.mean([len(set(a) & set(b)) / k for a, b in zip(top, reference_top)])), 3)
+
+
+"""
+*****************
+*** Benchmark ***
+*****************
+"""
+def run_benchmarks(texts, model_name="BAAI/bge-small-en-v1.5", backends=('huggingface', 'onnx'), batch_sizes=(None,),
+                   threads=None, repeat=3):
+    """
+    Benchmarks the throughput of the embedding backends and their agreement with the first backend, the reference.
+    Args:
+        texts (list): Text chunks to embed
+        model_name (str): Name of the HuggingFace embedding model
+        backends (tuple): Backends to benchmark, see load_backend
+        batch_sizes (tuple): Inference batch sizes of the ONNX backends, None for the thread-based default
+        threads (int): Number of ONNX Runtime threads, all cores if None
+        repeat (int): Number of timed runs per backend
+    Returns:
+        dict: Benchmark result
+    """
+    from Benchmark.crawl_benchmark import git_commit
+    results = {
+        'commit': git_commit(),
+        'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'config': {'model_name': model_name, 'texts': len(texts), 'threads': threads, 'repeat': repeat},
+        'backends': {}
+    }
+    reference = None
+    for backend in backends:
+        for batch_size in (batch_sizes if backend != 'huggingface' else (None,)):
+            run_name = backend if batch_size is None else f'{backend}-batch{batch_size}'
+            start = time.perf_counter()
+            model = load_backend(backend, model_name, threads, batch_size)
+            load_seconds = time.perf_counter() - start
+            timings, text_embeddings, query_embeddings = benchmark_backend(model, texts, repeat)
+            result = {'load_seconds': round(load_seconds, 3), **timings}
+            if hasattr(model, 'weight_bytes'):
+                result['weight_bytes'] = model.weight_bytes()
+            if reference is None:
+                reference = (text_embeddings, query_embeddings)
+            else:
+                result['texts'] = agreement(text_embeddings, reference[0])
+                result['queries'] = agreement(query_embeddings, reference[1])
+                result['top5_overlap'] = top_k_overlap(query_embeddings, text_embeddings, reference[1], reference[0])
+            results['backends'][run_name] = result
+            print(f'{run_name:20s} {result["texts_per_second"]:8.1f} texts/s {result["query_ms"]:7.2f} ms/query'
+                  + (f'  cosine mean {result["texts"]["mean_cosine"]:.4f} min {result["texts"]["min_cosine"]:.4f}'
+                     f'  top-5 overlap {result["top5_overlap"]:.2f}' if 'texts' in result else '  (reference)'))
+    return results
+
+
+if __name__ == '__main__':
+    import argparse
+    sys.path.append(dirname(dirname(abspath(__file__))))
+
+    # python Benchmark/embedding_benchmark.py --batch-sizes 8 32 128, the first backend is the reference of the agreement
+    arg_parser = argparse.ArgumentParser(description='Benchmarks the PyTorch and ONNX embedding backends on corpus or website chunks')
+    arg_parser.add_argument('--output', help='JSON file for the results, ./Output/benchmarks/embedding_<commit>.json by default')
+    arg_parser.add_argument('--model', default="BAAI/bge-small-en-v1.5", help='HuggingFace embedding model')
+    arg_parser.add_argument('--backends', nargs='+', default=['huggingface', 'onnx'], choices=['huggingface', 'onnx', 'onnx-fp32'])
+    arg_parser.add_argument('--batch-sizes', nargs='+', type=int, default=None, help='Inference batch sizes of the ONNX backends')
+    arg_parser.add_argument('--threads', type=int, default=None, help='ONNX Runtime threads, all cores by default')
+    arg_parser.add_argument('--website-dir', help='Crawled website to take the chunks from instead of the corpus')
+    arg_parser.add_argument('--max-texts', type=int, default=500, help='Maximum number of chunks to embed')
+    arg_parser.add_argument('--repeat', type=int, default=3, help='Timed runs per backend')
+    args = arg_parser.parse_args()
+
+    texts = website_texts(args.website_dir) if args.website_dir else corpus_texts()
+    texts = texts[:args.max_texts]
+    results = run_benchmarks(texts, args.model, tuple(args.backends), tuple(args.batch_sizes or [None]), args.threads, args.repeat)
+    output = args.output or pjoin('./Output/benchmarks', f'embedding_{results["commit"] or datetime.now().strftime("%Y%m%d_%H%M%S")}.json')
+    os.makedirs(dirname(abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f'Saved benchmark results to {output}')
@@ -0,0 +1,202 @@
+import time
+from scrapy import signals
+from scrapy.exceptions import NotConfigured, IgnoreRequest
+
+
+class HostThrottle:
+    """
+    Latency and error feedback of one download slot (one host), smoothed by exponentially weighted moving averages.
+    Args:
+        alpha (float): Weight of the newest sample in the moving averages
+    """
+    def __init__(self, alpha=0.3):
+        self.alpha = alpha
+        self.latency = None  # Seconds
+        self.error_rate = 0.0
+        self.samples = 0
+        self.samples_since_adjust = 0
+
+    def observe(self, latency=None, error=False):
+        """
+        Adds the outcome of a request.
+        Args:
+            latency (float): Download latency in seconds, None if the request failed before a response
+            error (bool): Whether the request failed, timed out or was answered with 429/5xx
+        """
+        if latency is not None:
+            self.latency = latency if self.latency is None else self.alpha * latency + (1 - self.alpha) * self.latency
+        self.error_rate = self.alpha * float(error) + (1 - self.alpha) * self.error_rate
+        self.samples += 1
+        self.samples_since_adjust += 1
+
+
+class AdaptiveThrottle:
+    """
+    Downloader middleware adapting the concurrency and delay of each host's download slot to its latency and error rate,
+    and enforcing a wall-clock and byte budget per crawl.
+    Hosts that answer fast without errors get one more concurrent request per adjustment and a shorter delay, up to the
+    configured bounds. Slow or failing hosts get their concurrency halved and their delay doubled.
+
+    Settings:
+        ADAPTIVE_THROTTLE_ENABLED (bool): Whether to enable the middleware
+        ADAPTIVE_THROTTLE_MIN_CONCURRENCY (int): Lowest concurrency per host, default 1
+        ADAPTIVE_THROTTLE_MAX_CONCURRENCY (int): Highest concurrency per host, default 8
+        ADAPTIVE_THROTTLE_MIN_DELAY (float): Lowest delay per host in seconds, default 0
+        ADAPTIVE_THROTTLE_MAX_DELAY (float): Highest delay per host in seconds, default 10
+        ADAPTIVE_THROTTLE_TARGET_LATENCY (float): Latency in seconds up to which a host counts as fast, default 1
+        ADAPTIVE_THROTTLE_ERROR_THRESHOLD (float): Error rate above which a host is backed off, default 0.1
+        ADAPTIVE_THROTTLE_ADJUST_INTERVAL (int): Responses of a host between two adjustments, default 5
+        CRAWL_TIME_BUDGET (float): Seconds after which the crawl is stopped, 0 for no limit
+        CRAWL_BYTE_BUDGET (int): Downloaded bytes after which the crawl is stopped, 0 for no limit
+    The spider attributes time_budget and byte_budget override the budget settings for a single crawl.
+    """
+    close_reason = 'budget_exceeded'
+
+    def __init__(self, crawler):
+        settings = crawler.settings
+        if not settings.getbool('ADAPTIVE_THROTTLE_ENABLED'):
+            raise NotConfigured
+        self.crawler = crawler
+        self.min_concurrency = max(1, settings.getint('ADAPTIVE_THROTTLE_MIN_CONCURRENCY', 1))
+        self.max_concurrency = max(self.min_concurrency, settings.getint('ADAPTIVE_THROTTLE_MAX_CONCURRENCY', 8))
+        self.min_delay = settings.getfloat('ADAPTIVE_THROTTLE_MIN_DELAY', 0.0)
+        self.max_delay = settings.getfloat('ADAPTIVE_THROTTLE_MAX_DELAY', 10.0)
+        self.target_latency = settings.getfloat('ADAPTIVE_THROTTLE_TARGET_LATENCY', 1.0)
+        self.error_threshold = settings.getfloat('ADAPTIVE_THROTTLE_ERROR_THRESHOLD', 0.1)
+        self.adjust_interval = max(1, settings.getint('ADAPTIVE_THROTTLE_ADJUST_INTERVAL', 5))
+        self.time_budget = settings.getfloat('CRAWL_TIME_BUDGET', 0)
+        self.byte_budget = settings.getint('CRAWL_BYTE_BUDGET', 0)
+
+        self.hosts = {}  # {download slot key: HostThrottle}
+        self.start_time = None
+        self.downloaded_bytes = 0
+        self.responses = 0
+        self.budget_exceeded = None  # Description of the exceeded budget
+        crawler.signals.connect(self.spider_opened, signal=signals.spider_opened)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def spider_opened(self, spider):
+        self.start_time = time.monotonic()
+        self.time_budget = getattr(spider, 'time_budget', None) or self.time_budget
+        self.byte_budget = getattr(spider, 'byte_budget', None) or self.byte_budget
+        spider.throttle = self  # Lets the spider report throughput and host states in its summary
+
+    """
+    ***************************
+    *** Middleware handlers ***
+    ***************************
+    """
+    def process_request(self, request, spider):
+        if self.budget_exceeded or self.check_budgets(spider):
+            raise IgnoreRequest(f'Crawl budget exceeded: {self.budget_exceeded}')
+        return None
+
+    def process_response(self, request, response, spider):
+        self.responses += 1
+        self.downloaded_bytes += len(response.body)
+        error = response.status == 429 or response.status >= 500
+        self.observe(request, request.meta.get('download_latency'), error)
+        self.check_budgets(spider)
+        return response
+
+    def process_exception(self, request, exception, spider):
+        self.observe(request, None, True)
+        return None
+
+    """
+    ******************
+    *** Throttling ***
+    ******************
+    """
+    def observe(self, request, latency, error):
+        """
+        Records the outcome of a request and adjusts its download slot every adjust_interval responses.
+        Args:
+            request (scrapy.Request): The downloaded request
+            latency (float): Download latency in seconds, None if no response was received
+            error (bool): Whether the request failed
+        """
+        key = request.meta.get('download_slot')
+        slot = self.crawler.engine.downloader.slots.get(key) if key is not None else None
+        if slot is None:
+            return
+        host = self.hosts.setdefault(key, HostThrottle())
+        host.observe(latency, error)
+        # Errors back off immediately, speed-ups wait for enough evidence
+        if error and host.error_rate > self.error_threshold or host.samples_since_adjust >= self.adjust_interval:
+            self.adjust(slot, host)
+            host.samples_since_adjust = 0
+
+    def adjust(self, slot, host):
+        """
+        Raises or lowers the concurrency and delay of a download slot within the configured bounds.
+        Args:
+            slot (scrapy.core.downloader.Slot): The download slot of the host
+            host (HostThrottle): Feedback of the host
+        """
+        if host.error_rate > self.error_threshold or (host.latency or 0) > 2 * self.target_latency:
+            slot.concurrency = max(self.min_concurrency, slot.concurrency // 2)
+            slot.delay = min(self.max_delay, max(slot.delay * 2, self.min_delay, 0.25))  # Doubling needs a nonzero start
+        elif host.latency is not None and host.latency <= self.target_latency:
+            slot.concurrency = min(self.max_concurrency, slot.concurrency + 1)
+            slot.delay = max(self.min_delay, slot.delay * 0.75)
+
+    """
+    ***************
+    *** Budgets ***
+    ***************
+    """
+    def check_budgets(self, spider):
+        """
+        Stops the crawl once its wall-clock or byte budget is used up, as a resumable interruption.
+        Args:
+            spider (scrapy.Spider): The running spider
+        Returns:
+            bool: True if a budget is exceeded
+        """
+        if self.budget_exceeded:
+            return True
+        if self.time_budget and self.elapsed() >= self.time_budget:
+            self.budget_exceeded = f'time budget of {self.time_budget:g}s'
+        elif self.byte_budget and self.downloaded_bytes >= self.byte_budget:
+            self.budget_exceeded = f'byte budget of {self.byte_budget} bytes'
+        else:
+            return False
+        spider.logger.info(f'Stopping crawl: {self.budget_exceeded} exceeded')
+        # Requests already queued in the download slots are fetched without waiting for their delays
+        for slot in self.crawler.engine.downloader.slots.values():
+            slot.delay = 0
+        self.crawler.engine.close_spider(spider, self.close_reason)
+        return True
+
+    def elapsed(self):
+        return time.monotonic() - self.start_time if self.start_time is not None else 0.0
+
+    def summary(self):
+        """
+        Summarizes the throughput and per-host throttle state.
+        Returns:
+            dict: Elapsed time, downloaded bytes, responses per second and per-host latency, error rate, concurrency and delay
+        """
+        elapsed = self.elapsed()
+        slots = self.crawler.engine.downloader.slots if self.crawler.engine else {}
+        hosts = {}
+        for key, host in self.hosts.items():
+            slot = slots.get(key)
+            hosts[key] = {
+                'latency': round(host.latency, 3) if host.latency is not None else None,
+                'error_rate': round(host.error_rate, 3),
+                'concurrency': slot.concurrency if slot else None,
+                'delay': round(slot.delay, 3) if slot else None
+            }
+        return {
+            'elapsed_seconds': round(elapsed, 1),
+            'downloaded_bytes': self.downloaded_bytes,
+            'responses_per_second': round(self.responses / elapsed, 2) if elapsed else 0.0,
+            'budget_exceeded': self.budget_exceeded,
+            'hosts': hosts
+        }
+
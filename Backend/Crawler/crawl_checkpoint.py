@@ -0,0 +1,72 @@
+import json
+import os
+from os.path import join as pjoin
+from datetime import datetime
+
+
+class CrawlCheckpoint:
+    """
+    Persists the crawl frontier and visited state to disk so an interrupted crawl can resume.
+    Args:
+        output_dir (str): Directory of the company being crawled
+        interval (int): Number of processed pages between two checkpoint saves
+    """
+    file_name = 'crawl_checkpoint.json'
+
+    def __init__(self, output_dir, interval=50):
+        self.file_path = pjoin(output_dir, self.file_name)
+        self.interval = max(1, interval)
+        self.pages_since_save = 0
+
+    def exists(self):
+        """
+        Checks whether a checkpoint has been saved for this crawl.
+        Returns:
+            bool: True if the checkpoint file exists
+        """
+        return os.path.exists(self.file_path)
+
+    def tick(self):
+        """
+        Counts a processed page.
+        Returns:
+            bool: True if enough pages have been processed to save a new checkpoint
+        """
+        self.pages_since_save += 1
+        return self.pages_since_save >= self.interval
+
+    def save(self, state):
+        """
+        Writes the crawl state atomically, so a crash during saving never corrupts the previous checkpoint.
+        Args:
+            state (dict): Serializable crawl state produced by the spider
+        """
+        state = dict(state, checkpoint_time=datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+        tmp_path = f'{self.file_path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.file_path)
+        self.pages_since_save = 0
+        print(f'Saved crawl checkpoint to {self.file_path}')
+
+    def load(self):
+        """
+        Loads the last saved crawl state.
+        Returns:
+            dict: Crawl state, or None if there is no readable checkpoint
+        """
+        if not self.exists():
+            return None
+        try:
+            with open(self.file_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f'!!! Failed to load crawl checkpoint {self.file_path}: {e} !!!')
+            return None
+
+    def clear(self):
+        """
+        Removes the checkpoint once the crawl has finished.
+        """
+        if self.exists():
+            os.remove(self.file_path)
@@ -0,0 +1,131 @@
+import json
+import os
+from os.path import join as pjoin
+from datetime import datetime
+
+
+class CrawlManifest:
+    """
+    Append-only log of per-url records of a crawl (validators, content hash, saved file and links), one JSON line per fetched url.
+    Args:
+        output_dir (str): Directory of the company being crawled
+        incremental (bool): Whether to keep the records of the previous crawl for comparison
+        resume (bool): Whether to continue the records of an interrupted crawl
+    """
+    file_name = 'crawl_manifest.jsonl'
+    previous_file_name = 'crawl_manifest.previous.jsonl'
+    changes_file_name = 'crawl_changes.json'
+
+    def __init__(self, output_dir, incremental=False, resume=False):
+        self.output_dir = output_dir
+        self.file_path = pjoin(output_dir, self.file_name)
+        self.previous_file_path = pjoin(output_dir, self.previous_file_name)
+
+        # Move the last crawl aside, unless continuing a crawl that has already done so
+        if incremental and not resume and os.path.exists(self.file_path):
+            os.replace(self.file_path, self.previous_file_path)
+        self.previous_records = self.load_records(self.previous_file_path) if incremental else {}
+
+        # Only the status and file of each url are kept in memory, full records live in the log
+        self.statuses = {}  # {url: (status, file)}
+        if resume:
+            self.statuses = {url: (record['status'], record.get('file')) for url, record in self.load_records(self.file_path).items()}
+        self.file = open(self.file_path, 'a' if resume else 'w', encoding='utf-8')
+
+    @staticmethod
+    def load_records(file_path):
+        """
+        Loads url records from a manifest log, where later records of a url override earlier ones.
+        Args:
+            file_path (str): Path of the manifest log
+        Returns:
+            dict: Records by url, empty if the file does not exist
+        """
+        records = {}
+        if not os.path.exists(file_path):
+            return records
+        with open(file_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # Partially written last line of an interrupted crawl
+                records[record['url']] = record
+        return records
+
+    def previous_record(self, url):
+        """
+        Gets the record of a url from the previous crawl.
+        Args:
+            url (str): Url of the page
+        Returns:
+            dict: Previous record, or None if the url was not crawled before
+        """
+        return self.previous_records.get(url)
+
+    def record(self, url, **fields):
+        """
+        Appends the record of a fetched url to the log.
+        Args:
+            url (str): Url of the page
+            fields: Record fields, such as status, file, etag, last_modified, content_hash and links
+        Returns:
+            dict: The appended record
+        """
+        record = dict(fields, url=url, crawl_time=datetime.now().strftime("%Y-%m-%d %H:%M"))
+        self.file.write(json.dumps(record) + '\n')
+        self.file.flush()
+        self.statuses[url] = (record['status'], record.get('file'))
+        return record
+
+    def record_unchanged(self, url):
+        """
+        Records a url that is not modified since the previous crawl, carrying over its previous record.
+        Args:
+            url (str): Url of the page
+        Returns:
+            dict: The carried over record
+        """
+        previous = {k: v for k, v in (self.previous_record(url) or {}).items() if k not in ('url', 'crawl_time')}
+        return self.record(url, **dict(previous, status='unchanged'))
+
+    def close(self):
+        """
+        Closes the manifest log.
+        """
+        if not self.file.closed:
+            self.file.close()
+
+    def changes(self):
+        """
+        Compares the current crawl with the previous one.
+        Returns:
+            dict: Lists of added, changed and removed urls, and the number of unchanged urls
+        """
+        changes = {'added': [], 'changed': [], 'removed': [], 'unchanged': 0}
+        for url, (status, file) in self.statuses.items():
+            if status == 'unchanged':
+                changes['unchanged'] += 1
+            elif status in ('added', 'changed'):
+                changes[status].append({'url': url, 'file': file})
+        for url, record in self.previous_records.items():
+            # Only pages that had a saved document can be removed, not failed urls or near-duplicates
+            if record.get('status') == 'failed' or not record.get('file'):
+                continue
+            # Pages now dropped as near-duplicates no longer have their own document either
+            if url not in self.statuses or self.statuses[url][0] == 'duplicate':
+                changes['removed'].append({'url': url, 'file': record['file']})
+        return changes
+
+    def save_changes(self):
+        """
+        Saves the changed/added/removed page lists for downstream indexing.
+        Returns:
+            dict: The saved changes
+        """
+        changes = self.changes()
+        with open(pjoin(self.output_dir, self.changes_file_name), 'w', encoding='utf-8') as f:
+            json.dump(changes, f, indent=2)
+        print(f"Saved crawl changes: {len(changes['added'])} added, {len(changes['changed'])} changed, "
+              f"{len(changes['removed'])} removed, {changes['unchanged']} unchanged")
+        return changes
@@ -0,0 +1,121 @@
+import re
+import math
+from collections import Counter
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit
+
+
+class CrawlPriority:
+    """
+    Scores urls for Scrapy's request priority, so the most valuable pages are fetched first within the page budget.
+    The score combines the sitemap priority, crawl depth, number of pages linking to the url, sitemap lastmod and path patterns.
+    Args:
+        depth_weight (float): Score lost per level of crawl depth
+        sitemap_weight (float): Score of a sitemap priority of 1.0, urls without sitemap entry count as 0.5
+        inlink_weight (float): Score per doubling of the number of pages linking to the url
+        segment_weight (float): Score lost per path segment beyond the second
+        recent_days (int): Age in days of a sitemap lastmod for the url to count as recently modified
+        recent_bonus (float): Score of recently modified urls
+        boost_patterns (list): Regexes of urls to fetch early
+        penalty_patterns (list): Regexes of urls to fetch late, defaults to archive, tag, pagination and search pages
+        pattern_weight (float): Score added for a boost pattern and lost for a penalty pattern
+    """
+    default_penalty_patterns = [
+        r'/(tag|tags|category|categories|archive|archives|author|page|search|print)(/|$)',
+        r'/\d{4}/\d{1,2}(/|$)',
+        r'[?&](page|p|sort|order|filter|print)='
+    ]
+
+    def __init__(self, depth_weight=10, sitemap_weight=40, inlink_weight=5, segment_weight=3, recent_days=90,
+                 recent_bonus=10, boost_patterns=None, penalty_patterns=None, pattern_weight=30):
+        self.depth_weight = depth_weight
+        self.sitemap_weight = sitemap_weight
+        self.inlink_weight = inlink_weight
+        self.segment_weight = segment_weight
+        self.recent_bonus = recent_bonus
+        self.recent_since = (datetime.now() - timedelta(days=recent_days)).strftime('%Y-%m-%d')
+        self.pattern_weight = pattern_weight
+        self.boost_pattern = self.compile_patterns(boost_patterns)
+        self.penalty_pattern = self.compile_patterns(self.default_penalty_patterns if penalty_patterns is None else penalty_patterns)
+
+        self.sitemap_entries = {}  # {url: (priority, lastmod)}
+        self.inlinks = Counter()  # {url: number of pages linking to it}
+
+    @staticmethod
+    def compile_patterns(patterns):
+        return re.compile('|'.join(f'(?:{pattern})' for pattern in patterns)) if patterns else None
+
+    def add_sitemap_entry(self, url, priority=None, lastmod=None):
+        """
+        Records the sitemap priority and last modification date of a url.
+        Args:
+            url (str): Canonical url
+            priority (str): Sitemap priority between 0.0 and 1.0
+            lastmod (str): Sitemap lastmod in W3C datetime format
+        """
+        try:
+            priority = min(1.0, max(0.0, float(priority)))
+        except (TypeError, ValueError):
+            priority = None
+        self.sitemap_entries[url] = (priority, lastmod or None)
+
+    def add_inlink(self, url):
+        """
+        Counts a page linking to a url.
+        Args:
+            url (str): Canonical url of the link target
+        """
+        self.inlinks[url] += 1
+
+    def score(self, url, depth):
+        """
+        Scores a url, higher scores are fetched first.
+        Args:
+            url (str): Canonical url
+            depth (int): Crawl depth of the url
+        Returns:
+            int: Request priority
+        """
+        priority, lastmod = self.sitemap_entries.get(url, (None, None))
+        score = self.sitemap_weight * (0.5 if priority is None else priority)
+        score -= self.depth_weight * depth
+        score += self.inlink_weight * math.log2(1 + self.inlinks[url])
+        if lastmod and lastmod[:10] >= self.recent_since:
+            score += self.recent_bonus
+
+        path = urlsplit(url).path
+        score -= self.segment_weight * max(0, len([segment for segment in path.split('/') if segment]) - 2)
+        if self.boost_pattern is not None and self.boost_pattern.search(url):
+            score += self.pattern_weight
+        if self.penalty_pattern is not None and self.penalty_pattern.search(url):
+            score -= self.pattern_weight
+        return round(score)
+
+    def to_state(self):
+        """
+        Serializes the sitemap entries and in-link counts for crawl checkpoints.
+        Returns:
+            dict: Priority state
+        """
+        return {'sitemap_entries': self.sitemap_entries, 'inlinks': dict(self.inlinks)}
+
+    def load_state(self, state):
+        """
+        Restores a state serialized by to_state.
+        Args:
+            state (dict): Priority state
+        """
+        self.sitemap_entries = {url: tuple(entry) for url, entry in state['sitemap_entries'].items()}
+        self.inlinks = Counter(state['inlinks'])
+
+
+if __name__ == '__main__':
+    priority = CrawlPriority()
+    priority.add_sitemap_entry('https://example.com/en/studies', priority='0.9', lastmod=datetime.now().strftime('%Y-%m-%d'))
+    for _ in range(30):
+        priority.add_inlink('https://example.com/en/contact')
+    for url, depth in [('https://example.com/en/studies', 1),
+                       ('https://example.com/en/contact', 1),
+                       ('https://example.com/en/news/archive/2016/03/old-event', 4),
+                       ('https://example.com/en/news?page=17', 2)]:
+        print(f'{priority.score(url, depth):5d} {url}')
@@ -8,8 +8,21 @@ import os
 from os.path import join as pjoin
 from datetime import datetime
 from urllib.parse import urlparse, quote
-import base64
-from Crawler.html_parser import HTMLParser
+from scrapy.utils.defer import maybe_deferred_to_future
+from Crawler.html_parser import create_html_parser
+from Crawler.crawl_checkpoint import CrawlCheckpoint
+from Crawler.crawl_manifest import CrawlManifest
+from Crawler.url_canonicalizer import URLCanonicalizer
+from Crawler.near_duplicate import SimHashIndex
+from Crawler.page_store import PageStore, page_file_path, processed_dir_name
+from Crawler.url_filter import URLFilter
+from Crawler.crawl_priority import CrawlPriority
+from Crawler.url_set import URLFingerprintSet, create_url_set, url_set_from_state
+from scrapy.utils.sitemap import Sitemap, sitemap_urls_from_robots
+from urllib.parse import urljoin
+import gzip
+import time
+from scrapy.exceptions import IgnoreRequest
 
 
 class UTASpider(scrapy.Spider):
@@ -19,13 +32,32 @@ class UTASpider(scrapy.Spider):
         start_urls (list): Initial URLs to start crawling from
         company_name (str): Name of the company being crawled
         domain_limit (str): Optional domain restriction for crawling
+        resume (bool): Whether to resume from the saved checkpoint of an interrupted crawl
+        checkpoint_interval (int): Number of processed pages between two checkpoint saves
+        incremental (bool): Whether to re-crawl with conditional requests and skip pages unchanged since the last crawl
+        summary_interval (int): Number of processed pages between two rewrites of the website info summary
+        near_duplicate_distance (int): Maximum SimHash bit distance for a page to be dropped as a near-duplicate, None to keep all pages.
+            Pages with fewer words than SimHashIndex.min_words are never dropped, as the fingerprints of short pages collide
+        parser_backend (str): HTML parser backend, 'lxml' to parse each page once with lxml or 'bs4' for BeautifulSoup
+        cleaning_workers (int): Number of worker processes cleaning pages off the reactor thread, 0 to clean in the callback
+        page_store (bool): Whether to save pages into the compressed page store instead of one file per url
+        url_rules (dict): Further url rules by the argument names of URLFilter, such as deny_paths or exclude_patterns
+        prioritize (bool): Whether to seed the crawl from the sitemaps in robots.txt and fetch the highest scored urls first
+        time_budget (float): Seconds after which the AdaptiveThrottle middleware stops the crawl, None for its setting
+        byte_budget (int): Downloaded bytes after which the AdaptiveThrottle middleware stops the crawl, None for its setting
+        stream_index (bool): Whether to embed and index saved pages during the crawl, so the website is queryable before it finishes
+        seen_urls_error_rate (float): False-positive rate of a Bloom filter for the discovered hrefs, None for an exact fingerprint set
     """
     name = 'UTASpider'
 
     def __init__(self, output_dir, start_urls=['https://www.bmw.com/en-au/index.html'], company_name='bmw', domain_limit=None, exclude_domains:list[str]=None,
-                  *args, **kwargs):
+                  resume=False, checkpoint_interval=50, incremental=False, summary_interval=20,
+                  near_duplicate_distance=3, parser_backend='lxml', cleaning_workers=0,
+                  page_store=False, url_rules=None, prioritize=False,
+                  time_budget=None, byte_budget=None, stream_index=False, seen_urls_error_rate=None, *args, **kwargs):
         super(UTASpider, self).__init__(*args, **kwargs)
-        self.html_parser = HTMLParser()
+        self.html_parser = create_html_parser(parser_backend)
+        self.canonicalizer = URLCanonicalizer()
 
         # Website info
         self.name = company_name
@@ -33,23 +65,62 @@ class UTASpider(scrapy.Spider):
         self.company_name = company_name 
         self.domain_limit = domain_limit
         self.exclude_domains = exclude_domains  # List of domains to exclude
+        self.url_filter = URLFilter.from_rules(self.canonicalizer.canonicalize(domain_limit) if domain_limit else None,
+                                               exclude_domains, url_rules)
         self.website_info = {}
 
         # Crawling parameters
         self.max_depth = 5
         self.max_urls_per_domain = 1000
+        self.time_budget = time_budget
+        self.byte_budget = byte_budget
+        self.throttle = None  # Set by the AdaptiveThrottle middleware if enabled
 
         # Crawling state
         self.crawl_finished = False
         self.domain_urls = {}
-        self.visited_urls = set()
+        # Visited and discovered urls are kept as 64-bit fingerprints, the discovered hrefs optionally in a Bloom filter
+        self.seen_urls_error_rate = seen_urls_error_rate
+        self.visited_urls = URLFingerprintSet()
+        self.alias_urls = URLFingerprintSet()  # Urls of pages stored under the url of their <link rel="canonical">, not counted as visited
         self.failed_urls = set()
-        self.all_urls = set()
+        self.all_urls = create_url_set(seen_urls_error_rate)
+        self.pending_urls = {}  # Scheduled but not yet processed urls {canonical url: (requested url, depth)}
+        self.scheduled_priorities = {}  # Priority of the latest request of each pending url {canonical url: priority}
+        self.near_duplicates = SimHashIndex(max_distance=near_duplicate_distance) if near_duplicate_distance is not None else None
+        self.priority = CrawlPriority() if prioritize else None
+        self.reprioritize_step = 5  # Score gain of a pending url, by in-links or its sitemap entry, to request it again
+
+        # Cleaning workers, also fingerprinting the pages for the near-duplicate index
+        self.page_pool = None
+        if cleaning_workers:
+            from Crawler.page_pool import PageCleaningPool
+            near_duplicates = self.near_duplicates
+            self.page_pool = PageCleaningPool(parser_backend, template=self.html_parser.template, max_workers=cleaning_workers,
+                                              shingle_size=near_duplicates.shingle_size if near_duplicates is not None else None,
+                                              min_words=near_duplicates.min_words if near_duplicates is not None else None)
 
         # Output
         self.timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        self.start_time = time.monotonic()
+        self.visited_at_start = 0  # Pages visited before resuming, excluded from the crawl speed
         self.output_dir = pjoin(output_dir, self.company_name)
         os.makedirs(self.output_dir, exist_ok=True)
+        self.page_store = PageStore(self.output_dir) if page_store else None
+        self.stream_indexer = None
+        if stream_index:
+            from RAG.stream_indexer import StreamIndexer
+            self.stream_indexer = StreamIndexer(self.output_dir)
+
+        # Checkpoint
+        self.checkpoint = CrawlCheckpoint(self.output_dir, interval=checkpoint_interval)
+        self.resumed = resume and self.restore_checkpoint()
+        self.visited_at_start = len(self.visited_urls)
+
+        # Manifest of fetched urls, compared with the last crawl in incremental mode
+        self.incremental = incremental
+        self.manifest = CrawlManifest(self.output_dir, incremental=incremental, resume=self.resumed)
+        self.summary_interval = max(1, summary_interval)
 
 
     @classmethod
@@ -60,32 +131,170 @@ class UTASpider(scrapy.Spider):
         spider = super().from_crawler(crawler, *args, **kwargs)
         crawler.signals.connect(spider.spider_closed, signal=signals.spider_closed)
         return spider
+
+    async def start(self):
+        """
+        Yields the initial requests on Scrapy 2.13+, delegating to start_requests for older versions.
+        """
+        for request in self.start_requests():
+            yield request
+
+    def start_requests(self):
+        """
+        Yields the initial requests, either the start urls or the pending frontier of a resumed crawl.
+        """
+        self.save_website_info()
+        if self.resumed:
+            print(f'\n!!! Resuming crawl for {self.company_name} with {len(self.pending_urls)} pending urls !!!\n')
+            frontier = list(self.pending_urls.values())
+        else:
+            frontier = [(url, 0) for url in self.start_urls]
+        for url, depth in frontier:
+            self.pending_urls[self.canonicalizer.canonicalize(url)] = (url, depth)
+            yield self.build_request(url, depth, dont_filter=True)
+
+        # Seed the frontier from the sitemaps listed in robots.txt
+        if self.priority is not None and not self.resumed:
+            for robots_url in {urljoin(url, '/robots.txt') for url, _ in frontier}:
+                yield scrapy.Request(robots_url, callback=self.parse_robots, errback=self.robots_failed, dont_filter=True, priority=1000)
+
+    def schedule_url(self, url, depth):
+        """
+        Adds a discovered url to the frontier, once per canonical url.
+        A pending url is requested again if its score rose since it was scheduled, the request processed first wins.
+        Args:
+            url (str): Absolute url to crawl, requested as linked
+            depth (int): Crawl depth of the URL
+        Returns:
+            scrapy.Request: The request to schedule, None if the url is already pending or crawled elsewhere
+        """
+        key = self.canonicalizer.canonicalize(url)
+        if key in self.pending_urls:
+            return self.reprioritize(key)
+        self.pending_urls[key] = (url, depth)
+        return self.build_request(url, depth)
+
+    def reprioritize(self, key):
+        """
+        Requests a pending url again with its current score, as Scrapy cannot change the priority of a scheduled request.
+        Args:
+            key (str): Canonical url of the pending url
+        Returns:
+            scrapy.Request: The request with the raised priority, None if the score did not rise by reprioritize_step
+        """
+        if self.priority is None:
+            return None
+        url, depth = self.pending_urls[key]
+        score = self.priority.score(key, depth)
+        if score < self.scheduled_priorities.get(key, score) + self.reprioritize_step:
+            return None
+        return self.build_request(url, depth, dont_filter=True)
+
+    def build_request(self, url, depth, dont_filter=False):
+        """
+        Builds a crawl request, made conditional on the validators of the last crawl in incremental mode.
+        Args:
+            url (str): URL to request, as linked
+            depth (int): Crawl depth of the URL
+            dont_filter (bool): Whether to bypass the duplicate request filter
+        Returns:
+            scrapy.Request: The request to schedule
+        """
+        # The manifest and priorities are keyed by canonical url, the server gets the url as linked
+        key = self.canonicalizer.canonicalize(url)
+        priority = 0
+        if self.priority is not None:
+            priority = self.scheduled_priorities[key] = self.priority.score(key, depth)
+        headers = {}
+        previous = self.manifest.previous_record(key)
+        if previous:
+            if previous.get('etag'):
+                headers['If-None-Match'] = previous['etag']
+            if previous.get('last_modified'):
+                headers['If-Modified-Since'] = previous['last_modified']
+        return scrapy.Request(
+            url,
+            callback=self.parse,
+            cb_kwargs={'depth': depth},
+            errback=self.handle_error,
+            headers=headers,
+            meta={'handle_httpstatus_list': [304]} if headers else {},
+            priority=priority,
+            dont_filter=dont_filter
+        )
     
     """
     ********************
     *** Main parsing ***
     ********************
     """
-    def parse(self, response, depth=0):
+    async def parse(self, response, depth=0):
+        if not self.finish_pending(response.request):
+            return  # Another request of the url, scheduled again with a higher priority, was processed already
         if depth >= self.max_depth:
             return
 
-        if not self.is_valid_url(response.url):
+        url = self.canonicalizer.canonicalize(response.url)
+        if not self.is_valid_url(url):
             return
 
-        domain = urlparse(response.url).netloc
+        # Parse the page once, links, canonical url, content hash and markdown all come from the same tree
+        # With a cleaning pool, only links and the canonical url are extracted here and the page is cleaned by a worker
+        page = None
+        if response.status != 304:
+            try:
+                if self.page_pool is None:
+                    page = self.html_parser.parse_page(response, self.all_urls)
+                else:
+                    page = {
+                        'links': response.css('a::attr(href)').getall(),
+                        'canonical': response.xpath('//head/link[contains(concat(" ", normalize-space(@rel), " "), " canonical ")]/@href').get()
+                    }
+            except Exception as e:
+                self.logger.error(f'!!!Error parsing {url}: {e} !!!')
+                self.failed_urls.add((url, str(e)))
+                self.manifest.record(url, status='failed', error=str(e))
+                return
+
+        # Store pages declaring another canonical url once, under the canonical url
+        canonical = self.canonicalizer.canonical_link(page['canonical'], response.url) if page else None
+        if canonical and canonical != url:
+            if canonical in self.visited_urls:
+                self.alias_urls.add(url)
+                return
+            if self.is_valid_url(canonical):
+                self.alias_urls.add(url)
+                url = canonical
+
+        domain = urlparse(url).netloc
         if domain not in self.domain_urls:
             self.domain_urls[domain] = 0
         if self.domain_urls[domain] >= self.max_urls_per_domain:
             return
 
-        self.visited_urls.add(response.url)
+        self.visited_urls.add(url)
         self.domain_urls[domain] += 1
+        if self.checkpoint.tick():
+            self.save_checkpoint()
 
         try:
-            print(f'\n*** Processing {response.url} ({len(self.visited_urls)}) ***')
-            soup = self.html_parser.clean_html(response, self.all_urls)
-            html_path = self.save_page_content(response.url, soup)
+            print(f'\n*** Processing {url} ({len(self.visited_urls)}) ***')
+            offloaded = False
+            if response.status == 304:
+                # Not modified since the last crawl, so keep its saved page and follow its known links
+                record = self.manifest.record_unchanged(url)
+                all_page_urls = record.get('links', [])
+                # Its stored fingerprint still catches near-duplicates of it among the pages crawled later
+                if self.near_duplicates is not None and record.get('simhash'):
+                    self.near_duplicates.add(int(record['simhash'], 16), url)
+            elif self.page_pool is None:
+                all_page_urls = page['links']
+                self.process_page(response, url, page)
+            else:
+                # Only the links discovered before this page are removed from it, so the worker needs just those
+                all_page_urls = page['links']
+                existing_urls = {link for link in all_page_urls if link in self.all_urls}
+                offloaded = True
 
             # # Save all images on the page
             # image_urls = response.css('img::attr(src)').getall()
@@ -95,33 +304,160 @@ class UTASpider(scrapy.Spider):
             #     print(f'Found image URL: {absolute_image_url}')
             #     yield from self.save_image(absolute_image_url, response.url)
 
-            # Follow links
-            all_page_urls = response.css('a::attr(href)').getall()
+            # Follow links, before waiting for an offloaded page so downloads keep going meanwhile
             self.all_urls.update(all_page_urls)
+            # Each linked page once per page in document order, so in-links are counted per linking page
+            page_links = {}
             for link in all_page_urls:
                 absolute_url = response.urljoin(link)
-                if self.is_valid_url(absolute_url):
-                    yield scrapy.Request(
-                        absolute_url,
-                        callback=self.parse,
-                        cb_kwargs={'depth': depth + 1},
-                        errback=self.handle_error
-                    )
-
-            self.save_website_info()
+                page_links.setdefault(self.canonicalizer.canonicalize(absolute_url), absolute_url)
+            for key, absolute_url in page_links.items():
+                if self.is_valid_url(key):
+                    if self.priority is not None:
+                        self.priority.add_inlink(key)
+                    request = self.schedule_url(absolute_url, depth + 1)
+                    if request is not None:
+                        yield request
+
+            if offloaded:
+                page = await maybe_deferred_to_future(self.page_pool.parse_page(response, existing_urls))
+                self.process_page(response, url, page)
+
+            if len(self.visited_urls) % self.summary_interval == 0:
+                self.save_website_info()
         except Exception as e:
-            self.logger.error(f'!!!Error processing {response.url}: {e} !!!')
-            self.failed_urls.add((response.url, str(e)))
+            self.logger.error(f'!!!Error processing {url}: {e} !!!')
+            self.failed_urls.add((url, str(e)))
+            self.manifest.record(url, status='failed', error=str(e))
+
+    def process_page(self, response, url, page):
+        """
+        Saves a parsed page, skipping the write if its content is unchanged since the last crawl.
+        Args:
+            response (scrapy.Response): The response of the page
+            url (str): Canonical url of the page
+            page (dict): The page parsed by HTMLParser.parse_page
+        """
+        # Drop pages nearly identical to an already stored page, such as print views and locale mirrors
+        simhash = page.get('simhash')  # Computed by the cleaning workers if enabled
+        if self.near_duplicates is not None:
+            if 'simhash' not in page:
+                simhash = self.near_duplicates.page_fingerprint(page['markdown'])
+            # Short pages have no fingerprint and are always kept
+            if simhash is not None:
+                duplicate = self.near_duplicates.find(simhash)
+                if duplicate:
+                    print(f'Skipped near-duplicate of {duplicate[0]} (distance {duplicate[1]})')
+                    self.manifest.record(url, status='duplicate', duplicate_of=duplicate[0], distance=duplicate[1], links=page['links'])
+                    return
+                self.near_duplicates.add(simhash, url)
+
+        content_hash = page['content_hash']
+        previous = self.manifest.previous_record(url)
+        if previous and previous.get('content_hash') == content_hash and self.has_saved_page(url, previous.get('file')):
+            status, saved_file = 'unchanged', previous['file']
+        else:
+            status = 'changed' if previous else 'added'
+            saved_file, metadata = self.save_page_content(url, page)
+            if self.stream_indexer is not None:
+                self.stream_indexer.put(url, page['markdown'], metadata)
+        self.manifest.record(
+            url,
+            status=status,
+            file=saved_file,
+            etag=response.headers.get('ETag', b'').decode('latin-1'),
+            last_modified=response.headers.get('Last-Modified', b'').decode('latin-1'),
+            content_hash=content_hash,
+            simhash=f'{simhash:016x}' if simhash is not None else None,
+            links=page['links']
+        )
 
-    def spider_closed(self, spider):
+    def spider_closed(self, spider, reason='finished'):
         """
         Handler for spider_closed signal to perform cleanup tasks.
         Args:
             spider (UTASpider): The spider instance that was closed
+            reason (str): Why the spider was closed, 'finished' if the frontier was exhausted
         """
-        self.crawl_finished = True
+        self.crawl_finished = reason == 'finished'
+        if self.page_pool is not None:
+            self.page_pool.close()
+        if self.page_store is not None:
+            self.page_store.close()
+        if self.stream_indexer is not None:
+            self.stream_indexer.close()
         self.save_website_info()  # Save final state
-        print(f'\n!!! Crawling finished for {self.company_name} !!!\n')
+        if self.crawl_finished:
+            if self.incremental:
+                self.manifest.save_changes()
+            self.manifest.close()
+            self.checkpoint.clear()
+            print(f'\n!!! Crawling finished for {self.company_name} !!!\n')
+        else:
+            self.manifest.close()
+            self.save_checkpoint()
+            print(f'\n!!! Crawling stopped for {self.company_name} ({reason}), resumable from checkpoint !!!\n')
+
+    """
+    ***********************
+    *** Sitemap seeding ***
+    ***********************
+    """
+    def parse_robots(self, response):
+        """
+        Requests the sitemaps listed in robots.txt, or /sitemap.xml if it lists none.
+        Args:
+            response (scrapy.Response): The robots.txt response
+        """
+        sitemap_urls = list(sitemap_urls_from_robots(response.text, base_url=response.url))
+        for sitemap_url in sitemap_urls or [urljoin(response.url, '/sitemap.xml')]:
+            yield scrapy.Request(sitemap_url, callback=self.parse_sitemap, errback=self.sitemap_failed, priority=1000)
+
+    def robots_failed(self, failure):
+        """
+        Falls back to /sitemap.xml if robots.txt cannot be fetched.
+        Args:
+            failure (Failure): The failure object containing error details
+        """
+        self.logger.info(f'No robots.txt at {failure.request.url}, trying /sitemap.xml')
+        yield scrapy.Request(urljoin(failure.request.url, '/sitemap.xml'), callback=self.parse_sitemap,
+                             errback=self.sitemap_failed, priority=1000)
+
+    def sitemap_failed(self, failure):
+        self.logger.info(f'Sitemap not available: {failure.request.url}')
+
+    def parse_sitemap(self, response):
+        """
+        Schedules the urls of a sitemap with their sitemap priority and lastmod, following nested sitemap indexes.
+        Args:
+            response (scrapy.Response): The sitemap response, optionally gzip-compressed
+        """
+        body = response.body
+        if body[:2] == b'\x1f\x8b':
+            body = gzip.decompress(body)
+        try:
+            sitemap = Sitemap(body)
+        except Exception as e:
+            self.logger.info(f'Invalid sitemap {response.url}: {e}')
+            return
+
+        if sitemap.type == 'sitemapindex':
+            for entry in sitemap:
+                yield scrapy.Request(entry['loc'], callback=self.parse_sitemap, errback=self.sitemap_failed, priority=1000)
+        elif sitemap.type == 'urlset':
+            count = 0
+            for entry in sitemap:
+                key = self.canonicalizer.canonicalize(entry['loc'])
+                if not self.is_valid_url(key):
+                    continue
+                # Pending urls are requested again if their sitemap entry raises their score
+                self.priority.add_sitemap_entry(key, entry.get('priority'), entry.get('lastmod'))
+                # Sitemap urls count as linked from the start page
+                count += 1
+                request = self.schedule_url(entry['loc'], 1)
+                if request is not None:
+                    yield request
+            print(f'Seeded {count} urls from sitemap {response.url}')
 
     """
     *********************
@@ -143,45 +479,23 @@ class UTASpider(scrapy.Spider):
         # Skip if not a valid URL format
         if not url.startswith(('http://', 'https://')):
             return False
-            
-        parsed = urlparse(url)
-        domain = parsed.netloc
+
+        # Compare the canonical form, so that variants of visited pages are skipped
+        url = self.canonicalizer.canonicalize(url)
         
-        # Skip if already visited
-        if url in self.visited_urls:
+        # Skip if already visited, also under the url its page declared canonical
+        if url in self.visited_urls or url in self.alias_urls:
             return False
             
-        # Skip if domain limit is set and URL doesn't match
-        if self.domain_limit:
-            parsed_url = urlparse(url)
-            parsed_domain_limit = urlparse(self.domain_limit)
-            
-            # Compare domains and paths
-            if parsed_url.netloc != parsed_domain_limit.netloc:
-                return False
-                
-            # If domain limit includes a path, check if URL path starts with domain limit path
-            if parsed_domain_limit.path:
-                domain_limit_path = parsed_domain_limit.path.rstrip('/')
-                url_path = parsed_url.path.rstrip('/')
-                if not url_path.startswith(domain_limit_path):
-                    return False
-            
-        # Skip if domain is in excluded domains
-        if self.exclude_domains:
-            for excluded in self.exclude_domains:
-                if excluded in url:
-                    return False
-                    
+        # Skip if the domain limit, excluded domains, path, pattern or file type rules reject the URL
+        if not self.url_filter.allows(url):
+            return False
+
         # Skip if max urls per domain reached
+        domain = URLFilter.split_url(url)[0]
         if domain in self.domain_urls and self.domain_urls[domain] >= self.max_urls_per_domain:
             return False
             
-        # Skip if file extension matches excluded types
-        skip_extensions = ['.pdf', '.jpg', '.png', '.gif', '.zip']
-        if any(url.lower().endswith(ext) for ext in skip_extensions):
-            return False
-            
         return True
 
     def handle_error(self, failure):
@@ -190,11 +504,94 @@ class UTASpider(scrapy.Spider):
         Args:
             failure (Failure): The failure object containing error details
         """
-        failed_url = failure.request.url
+        failed_url = self.canonicalizer.canonicalize(failure.request.url)
+        if failure.check(IgnoreRequest) and self.throttle is not None and self.throttle.budget_exceeded:
+            return  # Dropped as the crawl budget is used up, stays pending for resuming
+        if not self.finish_pending(failure.request):
+            return
         error_message = str(failure.value)
         self.failed_urls.add((failed_url, error_message))
+        self.manifest.record(failed_url, status='failed', error=error_message)
         self.logger.error(f'Request failed: {failed_url}')
 
+    def finish_pending(self, request):
+        """
+        Removes the url of a processed or failed request from the frontier.
+        Args:
+            request (scrapy.Request): The request of the url
+        Returns:
+            bool: False if the url was not pending, as another request of it was handled already
+        """
+        key = self.canonicalizer.canonicalize(self.original_url(request))
+        self.scheduled_priorities.pop(key, None)
+        return self.pending_urls.pop(key, None) is not None
+
+    @staticmethod
+    def original_url(request):
+        """
+        Gets the url a request was originally scheduled with, before any redirects.
+        Args:
+            request (scrapy.Request): The request to inspect
+        Returns:
+            str: The originally scheduled url
+        """
+        return request.meta.get('redirect_urls', [request.url])[0]
+
+    """
+    ******************
+    *** Checkpoint ***
+    ******************
+    """
+    def save_checkpoint(self):
+        """
+        Saves the crawl frontier and visited state so the crawl can be resumed.
+        """
+        self.checkpoint.save({
+            'start_urls': self.start_urls,
+            'domain_urls': self.domain_urls,
+            'visited_urls': self.visited_urls.to_state(),
+            'alias_urls': self.alias_urls.to_state(),
+            'failed_urls': list(self.failed_urls),
+            'all_urls': self.all_urls.to_state(),
+            'pending_urls': self.pending_urls,
+            'near_duplicates': self.near_duplicates.to_state() if self.near_duplicates is not None else [],
+            'template': self.html_parser.template.to_state() if self.html_parser.template else None,
+            'priority': self.priority.to_state() if self.priority is not None else None
+        })
+
+    def restore_checkpoint(self):
+        """
+        Restores the crawl frontier and visited state from the saved checkpoint.
+        Returns:
+            bool: True if a checkpoint with pending urls was restored
+        """
+        state = self.checkpoint.load()
+        if not state or not state.get('pending_urls'):
+            return False
+        self.load_checkpoint_state(state)
+        return True
+
+    def load_checkpoint_state(self, state):
+        """
+        Loads the crawl frontier and visited state of a checkpoint.
+        Args:
+            state (dict): Checkpoint state saved by save_checkpoint
+        """
+        self.domain_urls = state['domain_urls']
+        self.visited_urls = url_set_from_state(state['visited_urls'])
+        self.alias_urls = url_set_from_state(state.get('alias_urls', []))  # Checkpoints of older crawls have none
+        self.failed_urls = set(tuple(failed) for failed in state['failed_urls'])
+        self.all_urls = url_set_from_state(state['all_urls'], self.seen_urls_error_rate)
+        # Checkpoints of older crawls saved the canonical url with its depth only
+        self.pending_urls = {key: tuple(value) if isinstance(value, list) else (key, value)
+                             for key, value in state['pending_urls'].items()}
+        if self.near_duplicates is not None:
+            self.near_duplicates.load_state(state.get('near_duplicates', []))
+        if self.html_parser.template and state.get('template'):
+            self.html_parser.template.load_state(state['template'])
+        if self.priority is not None and state.get('priority'):
+            self.priority.load_state(state['priority'])
+
     """
     *******************
     *** File saving ***
@@ -202,50 +599,72 @@ class UTASpider(scrapy.Spider):
     """
     def filename_from_url(self, url):
         """
-        Generates a filesystem-safe filename from a URL.
+        Generates a filesystem-safe filename from a URL, in the processed directory.
         Args:
             url (str): URL to convert to filename
         Returns:
-            str: Path where the file should be saved
+            str: Path where the file should be saved, without extension
         """
-        # Parse URL and create domain directory
-        parsed_url = urlparse(url)
-        domain = parsed_url.netloc
-        domain_dir = f'{self.output_dir}/{domain}'
-        
-        # Create path for file
-        path = parsed_url.path
-        if not path or path == '/':
-            path = 'root-index'
-        else:
-            path = path.strip('/')
-        # Add query string if it exists, with safe encoding
-        if parsed_url.query:
-            encoded_query = base64.urlsafe_b64encode(parsed_url.query.encode()).decode()
-            path = f'{path}_{encoded_query}'
-            
-        # Create full directory path and ensure it exists
-        full_path = f'{domain_dir}/{path}'.replace('.html', '')
-        os.makedirs(os.path.dirname(full_path), exist_ok=True)
-        return full_path
+        return page_file_path(pjoin(self.output_dir, processed_dir_name), url)
 
-    def save_page_content(self, url, soup):
+    def save_page_content(self, url, page):
         """
-        Saves cleaned HTML content to a file.
+        Saves a cleaned page as a markdown document with a JSON metadata sidecar, or to the page store if enabled.
         Args:
             url (str): Source URL of the content
-            soup (BeautifulSoup): Cleaned HTML content
+            page (dict): The page parsed by HTMLParser.parse_page
+        Returns:
+            tuple: Saved document relative to the output directory or page store key of the content, and the page metadata
         """
+        metadata = {
+            'url': url,
+            'title': page['metadata'].get('title'),
+            'images': page['metadata'].get('images', []),
+            'content_hash': page['content_hash'],
+            'crawl_time': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        }
+        if self.page_store is not None:
+            content_hash = self.page_store.put(url, page['markdown'], metadata)
+            print(f'Saved cleaned page to {self.page_store.store_dir}')
+            return f'{PageStore.dir_name}/{content_hash}', metadata
+
         # Get the filename from the URL
-        file_path = f'{self.filename_from_url(url)}.html'
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(str(soup))
-        print(f'Saved cleaned HTML to {file_path}')
-        return os.path.relpath(file_path, self.output_dir)
+        file_path = self.filename_from_url(url)
+        with open(f'{file_path}.md', 'w', encoding='utf-8') as f:
+            f.write(page['markdown'])
+        with open(f'{file_path}.json', 'w', encoding='utf-8') as f:
+            json.dump(metadata, f, indent=2)
+        print(f'Saved cleaned page to {file_path}.md')
+        return os.path.relpath(f'{file_path}.md', self.output_dir), metadata
+
+    def has_saved_page(self, url, file):
+        """
+        Checks whether the page saved by a previous crawl is still available.
+        Args:
+            url (str): Url of the page
+            file (str): Saved file or page store key from the previous record
+        Returns:
+            bool: True if the saved page exists
+        """
+        if not file:
+            return False
+        if self.page_store is not None and file.startswith(f'{PageStore.dir_name}/'):
+            return url in self.page_store
+        # Pages saved as html by older crawls are saved again into the processed layout
+        return file.startswith(f'{processed_dir_name}/') and os.path.exists(pjoin(self.output_dir, file))
+
+    def pages_per_second(self):
+        """
+        Computes the effective crawl speed of this run.
+        Returns:
+            float: Pages visited per second since the spider started
+        """
+        elapsed = time.monotonic() - self.start_time
+        return round((len(self.visited_urls) - self.visited_at_start) / elapsed, 2) if elapsed > 0 else 0.0
 
     def save_website_info(self):
         """
-        Saves website information to a JSON file.
+        Saves the website information summary to a JSON file, per-url records are in the crawl manifest.
         """
         data = {
             'company_name': self.company_name,
@@ -254,9 +673,16 @@ class UTASpider(scrapy.Spider):
             'domain_urls': self.domain_urls,
             'crawl_time': datetime.now().strftime("%Y-%m-%d %H:%M"),
             'crawl_finished': self.crawl_finished,
-            'visited_urls': list(self.visited_urls),
-            'failed_urls': list(self.failed_urls)
+            'visited_count': len(self.visited_urls),
+            'failed_count': len(self.failed_urls),
+            'failed_urls': list(self.failed_urls)[:50],  # Sample for display, all failures are in the manifest
+            'pages_per_second': self.pages_per_second(),
+            'manifest': self.manifest.file_name
         }
+        if self.stream_indexer is not None:
+            data['indexed_count'] = self.stream_indexer.indexed_count
+        if self.throttle is not None:
+            data['throttle'] = self.throttle.summary()
         with open(f'{self.output_dir}/website_info.json', 'w', encoding='utf-8') as f:
             json.dump(data, f, indent=2)
         print(f'Saved website info to {self.output_dir}/website_info.json')
@@ -274,7 +700,10 @@ if __name__ == "__main__":
         'ROBOTSTXT_OBEY': True,
         'CONCURRENT_REQUESTS_PER_DOMAIN': 2,
         'DOWNLOAD_DELAY': 1,
-        'DOWNLOAD_TIMEOUT': 10
+        'DOWNLOAD_TIMEOUT': 10,
+        'DOWNLOADER_MIDDLEWARES': {'Crawler.adaptive_throttle.AdaptiveThrottle': 950},
+        'ADAPTIVE_THROTTLE_ENABLED': True,
+        'ADAPTIVE_THROTTLE_MAX_CONCURRENCY': 10
     })
     process.crawl(UTASpider, start_urls=[web_urls], company_name=company_name, domain_limit=domain_limit)
     process.start()
@@ -1,100 +1,178 @@
-from bs4 import BeautifulSoup
-import graphtage
-import json
-import logging
+import hashlib
+from bs4 import BeautifulSoup, NavigableString, Comment
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-def html_to_dict(html):
-    soup = BeautifulSoup(html, 'html.parser')
+class SubtreeHasher:
+    """
+    Merkle hashes of DOM subtrees: each element is hashed from its tag, its whitespace-normalized own text and the
+    hashes of its children, bottom-up in one pass over the page. Identical subtrees get identical hashes regardless of
+    their attributes, so the parts a page shares with a site template are found by set lookups.
+    Args:
+        min_text_length (int): Minimum text length of a subtree to be matched, so short generic elements stay unique
+    """
+    def __init__(self, min_text_length=20):
+        self.min_text_length = min_text_length
 
-    def recursive_dict(element):
-        if isinstance(element, str):
-            return element.strip()
+    """
+    *******************
+    *** DOM helpers ***
+    *******************
+    Implemented for BeautifulSoup, overridden for other parser backends.
+    """
+    @staticmethod
+    def page_root(soup):
+        return soup.body or soup
 
-        result = {}
+    @staticmethod
+    def element_name(tag):
+        return tag.name
 
-        for child in element.children:
-            if isinstance(child, str):
+    @staticmethod
+    def own_text(tag):
+        return ' '.join(child for child in tag.children if isinstance(child, NavigableString) and not isinstance(child, Comment))
+
+    @staticmethod
+    def child_elements(tag):
+        return list(tag.find_all(True, recursive=False))
+
+    @staticmethod
+    def child_nodes(tag):
+        # Child elements and non-blank own text nodes in document order
+        return [child for child in tag.children
+                if not isinstance(child, Comment) and (not isinstance(child, NavigableString) or child.strip())]
+
+    """
+    ***************
+    *** Hashing ***
+    ***************
+    """
+    def hash_subtrees(self, root):
+        """
+        Hashes every subtree below and including the root, children before their parents, without recursion.
+        Args:
+            root (bs4.Tag): The root element
+        Returns:
+            dict: {id(element): (element, 8-byte hash, text length of the subtree)}, holding the elements so their ids stay valid
+        """
+        hashes = {}
+        stack = [(root, None)]
+        while stack:
+            element, children = stack.pop()
+            if children is None:
+                children = self.child_elements(element)
+                stack.append((element, children))
+                stack.extend((child, None) for child in children)
+                continue
+            text = ' '.join(self.own_text(element).split())
+            text_length = len(text)
+            h = hashlib.blake2b(f'{self.element_name(element)}\x00{text}\x00'.encode('utf-8'), digest_size=8)
+            for child in children:
+                _, child_hash, child_length = hashes[id(child)]
+                h.update(child_hash)
+                text_length += child_length
+            hashes[id(element)] = (element, h.digest(), text_length)
+        return hashes
+
+    def template_hashes(self, soup):
+        """
+        Collects the hashes of all subtrees of a template page that are long enough to be matched.
+        Args:
+            soup (BeautifulSoup): The template page
+        Returns:
+            set: Hex hashes of the template's subtrees
+        """
+        return {h.hex() for _, h, length in self.hash_subtrees(self.page_root(soup)).values() if length >= self.min_text_length}
+
+    def unique_regions(self, soup, template):
+        """
+        Finds the largest subtrees of a page that share no subtree with the template, top-down in one pass.
+        The own text of an element containing a shared subtree is a unique region of its own.
+        Args:
+            soup (BeautifulSoup): The page
+            template (set): Hex hashes of the template's subtrees
+        Returns:
+            list: Elements and text nodes of the unique regions in document order
+        """
+        hashes = self.hash_subtrees(self.page_root(soup))
+        # Subtrees containing a shared subtree, marked bottom-up in the children-first order of the hashes
+        contains_shared = set()
+        for key, (element, h, length) in hashes.items():
+            if length >= self.min_text_length and h.hex() in template:
+                contains_shared.add(key)
+        for key, (element, h, length) in hashes.items():
+            if key in contains_shared:
+                continue
+            if any(id(child) in contains_shared for child in self.child_elements(element)):
+                contains_shared.add(key)
+
+        regions = []
+        stack = [self.page_root(soup)]
+        while stack:
+            element = stack.pop()
+            if id(element) not in contains_shared:
+                regions.append(element)  # Also the text nodes, which are not hashed
                 continue
-            tag_name = child.name
-            child_dict = recursive_dict(child)
-            
-            if tag_name in result:
-                if isinstance(result[tag_name], list):
-                    result[tag_name].append(child_dict)
-                else:
-                    result[tag_name] = [result[tag_name], child_dict]
-            else:
-                result[tag_name] = child_dict
-        
-        if element.string and element.string.strip():
-            if element.name in result:
-                result[element.name] = [result[element.name], element.string.strip()]
-            else:
-                result[element.name] = element.string.strip()
-
-        return result
-    
-    html_dict = recursive_dict(soup)
-    logging.info(json.dumps(html_dict, indent=4))
-
-    return html_dict
-
-def diff_html(new_html, template_html):
-    new_dict = html_to_dict(new_html)
-    template_dict = html_to_dict(template_html)
-
-    new_tree = graphtage.json.build_tree(new_dict)
-    template_tree = graphtage.json.build_tree(template_dict)
-    
-    diff = new_tree.diff(template_tree)
-    with graphtage.printer.DEFAULT_PRINTER as p:
-        logging.info(f'Diff status:')
-        graphtage.json.JSONFormatter.DEFAULT_INSTANCE.print(graphtage.printer.DEFAULT_PRINTER, diff)
-
-    edits = list(new_tree.get_all_edits(template_tree))
-    logging.info(f'All diffing edits: {edits}')
-    
-    # TODO: When we save new templates...
-    # if xxx:
-    #     logging.info('No differences found, saving the new HTML as a new template.')
-    #     save_template(new_html)
-    #     return None
-    
-    # TODO: When we delete the identical parts...
-    # new_soup = BeautifulSoup(new_html, 'html.parser')
-    # for xxx:
-    #     logging.info(f'Processing edit: {edit}')
-    #     if xxx:
-    #         process_removal(edit, new_soup)
-    # logging.info(f'New HTML after editting: {new_soup}')
-
-def save_template(template_html, file_path='new_template.html'):
-    with open(file_path, 'w') as f:
-        f.write(template_html)
-    logging.info(f'Template saved to {file_path}')
+            _, h, length = hashes[id(element)]
+            if length >= self.min_text_length and h.hex() in template:
+                continue  # Shared with the template
+            stack.extend(reversed(self.child_nodes(element)))
+        return regions
+
+
+def diff_html(new_html, template, min_text_length=20):
+    """
+    Gets the regions of a page that are not part of the site template.
+    Args:
+        new_html (str): HTML of the page
+        template (str or set): HTML of a template page, or hex subtree hashes stored from SubtreeHasher.template_hashes
+        min_text_length (int): Minimum text length of a subtree to be matched with the template
+    Returns:
+        list: Unique regions of the page as BeautifulSoup elements
+    """
+    hasher = SubtreeHasher(min_text_length=min_text_length)
+    if isinstance(template, str):
+        template = hasher.template_hashes(BeautifulSoup(template, 'html.parser'))
+    return hasher.unique_regions(BeautifulSoup(new_html, 'html.parser'), template)
 
 
 if __name__ == '__main__':
+    import time
+
     # Example usage
-    new_html = '''
+    template_html = '''
     <html>
     <body>
+        <nav><a href="/">Home</a> <a href="/about">About our company</a></nav>
         <h1>Welcome to My Website</h1>
-        <p>This is a new page</p>    
+        <main><p>This is a test page</p></main>
+        <footer><p>Copyright 2024 My Website, all rights reserved</p></footer>
     </body>
     </html>
     '''
 
-    template_html = '''
+    new_html = '''
     <html>
     <body>
+        <nav class="sticky"><a href="/">Home</a> <a href="/about">About our company</a></nav>
         <h1>Welcome to My Website</h1>
-        <p>This is a test page</p>
-        <div>div</div>
+        <main><p>This is a new page</p><div>With a new section</div></main>
+        <footer><p>Copyright 2024 My Website, all rights reserved</p></footer>
     </body>
     </html>
     '''
 
-    diff_html(new_html, template_html)
+    for region in diff_html(new_html, template_html, min_text_length=10):
+        print(f'Unique region: {region}')
+
+    # Timing on a large page against its own template with one changed paragraph
+    items = ''.join(f'<li><a href="/p{i}">Navigation entry {i}</a></li>' for i in range(500))
+    paragraphs = ''.join(f'<p>Paragraph {i} of the page content, long enough to be matched.</p>' for i in range(2000))
+    big_template = f'<html><body><nav><ul>{items}</ul></nav><main>{paragraphs}</main></body></html>'
+    big_page = big_template.replace('Paragraph 1000 of', 'Changed paragraph 1000 of')
+    hasher = SubtreeHasher()
+    template_soup, page_soup = BeautifulSoup(big_template, 'lxml'), BeautifulSoup(big_page, 'lxml')
+    start = time.perf_counter()
+    template_hashes = hasher.template_hashes(template_soup)
+    regions = hasher.unique_regions(page_soup, template_hashes)
+    elapsed = time.perf_counter() - start
+    print(f'{len(regions)} unique region(s) among {len(hasher.hash_subtrees(page_soup.body))} elements in {elapsed * 1000:.1f} ms: {regions}')
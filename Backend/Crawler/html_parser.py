@@ -1,10 +1,110 @@
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, Tag, Comment
+import hashlib
+from Crawler.template_learner import TemplateLearner
+
+
+def create_html_parser(backend='lxml', **kwargs):
+    """
+    Creates the HTML parser of a parsing backend.
+    Args:
+        backend (str): 'lxml' for the single-parse lxml backend, 'bs4' for the BeautifulSoup html.parser backend
+        kwargs: Arguments of the HTML parser
+    Returns:
+        HTMLParser: The HTML parser
+    """
+    if backend == 'lxml':
+        from Crawler.lxml_html_parser import LxmlHTMLParser
+        return LxmlHTMLParser(**kwargs)
+    if backend == 'bs4':
+        return HTMLParser(**kwargs)
+    raise ValueError(f'Unknown HTML parser backend: {backend}')
+
 
 class HTMLParser:
-    def __init__(self):
-        # Record header and footer to remove redundancies
-        self.header = None
-        self.footer = None
+    template_learner_class = TemplateLearner
+
+    def __init__(self, template_learning_pages=20):
+        # Learn the blocks repeated across the site, such as header, navigation and footer, to remove redundancies
+        self.template = self.template_learner_class(learning_pages=template_learning_pages) if template_learning_pages else None
+
+    """
+    ********************
+    *** Page parsing ***
+    ********************
+    """
+    def parse_page(self, response, existing_urls=None):
+        """
+        Parses a page once and extracts everything the crawler needs from it.
+        Args:
+            response (scrapy.Response): The response object containing the webpage
+            existing_urls (set): Set of all URLs that have been discovered
+        Returns:
+            dict: Page with keys:
+                - markdown (str): Markdown content generated from cleaned HTML
+                - metadata (dict): Metadata containing the title and image links
+                - links (list): Hrefs of all links on the page
+                - canonical (str): Href of the <link rel="canonical"> of the page, or None
+                - content_hash (str): Hash of the visible text of the page
+        """
+        document = self.parse_document(response)
+        # Extract before cleaning, which removes links and the head
+        links = self.extract_links(document)
+        canonical = self.canonical_href(document)
+        content_hash = hashlib.sha256(self.visible_text(document).encode('utf-8')).hexdigest()
+        markdown_content, metadata = self.clean_document(document, response.url, existing_urls)
+        return {
+            'markdown': markdown_content,
+            'metadata': metadata,
+            'links': links,
+            'canonical': canonical,
+            'content_hash': content_hash
+        }
+
+    def parse_document(self, response):
+        """
+        Parses the HTML of a response.
+        Args:
+            response (scrapy.Response): The response object containing the webpage
+        Returns:
+            BeautifulSoup: The HTML soup object
+        """
+        return BeautifulSoup(response.text, 'html.parser')
+
+    def extract_links(self, soup):
+        """
+        Extracts the hrefs of all links.
+        Args:
+            soup (BeautifulSoup): The HTML soup object
+        Returns:
+            list: Hrefs in document order
+        """
+        return [a['href'] for a in soup.find_all('a', href=True)]
+
+    def canonical_href(self, soup):
+        """
+        Gets the href of the <link rel="canonical"> in the head.
+        Args:
+            soup (BeautifulSoup): The HTML soup object
+        Returns:
+            str: The canonical href, or None if not declared
+        """
+        link = soup.head.find('link', rel='canonical', href=True) if soup.head else None
+        return link['href'] if link else None
+
+    def visible_text(self, soup):
+        """
+        Gets the whitespace-normalized text of the body, ignoring scripts, styles and comments.
+        Args:
+            soup (BeautifulSoup): The HTML soup object
+        Returns:
+            str: The visible text
+        """
+        if not soup.body:
+            return ''
+        skip_tags = {'script', 'style', 'noscript'}
+        texts = [text for text in soup.body.find_all(string=True)
+                 if not isinstance(text, Comment) and not any(parent.name in skip_tags for parent in text.parents)]
+        return ' '.join(' '.join(texts).split())
 
     """
     *********************
@@ -20,12 +120,25 @@ class HTMLParser:
         Returns:
             tuple: Markdown content generated from cleaned HTML and metadata containing image links
         """
-        soup = BeautifulSoup(response.text, 'html.parser')
+        return self.clean_document(self.parse_document(response), response.url, existing_urls)
 
+    def clean_document(self, soup, page_url, existing_urls=None):
+        """
+        Runs all cleaning stages on a parsed page and generates its markdown.
+        Args:
+            soup (BeautifulSoup): The HTML soup object to clean
+            page_url (str): The URL of the page
+            existing_urls (set): Set of all URLs that have been discovered
+        Returns:
+            tuple: Markdown content generated from cleaned HTML and metadata containing image links
+        """
         # Clean head
         self.clean_head(soup)
         # Clean elements
         self.clean_elements(soup)
+        # Learn or remove the site template, before link removal makes the blocks differ between pages
+        if self.template:
+            self.template.process(soup)
 
         # Remove existing link elements
         self.remove_existing_link_elements(soup, existing_urls)
@@ -35,7 +148,7 @@ class HTMLParser:
         self.remove_redundant_divs(soup)
 
         # Add title and generate markdown content
-        markdown_content, metadata = self.generate_markdown(soup, response.url)
+        markdown_content, metadata = self.generate_markdown(soup, page_url)
         return markdown_content, metadata
 
     def clean_head(self, soup):
@@ -92,7 +205,7 @@ class HTMLParser:
 
     def remove_empty_elements(self, soup):
         """
-        Removes empty elements from HTML.
+        Removes empty elements from HTML in a single bottom-up pass, so parents left empty are removed as well.
         Args:
             soup (BeautifulSoup): The HTML soup object to clean
         Returns:
@@ -101,51 +214,35 @@ class HTMLParser:
         # Tags that should be kept even when empty
         preserve_tags = {'hr', 'br', 'img', 'input', 'meta', 'link', 'textarea'}
 
-        # Recursively remove empty elements
-        while True:
-            removed = False
-            for tag in soup.find_all():
-                # Skip if tag should be preserved
-                if tag.name in preserve_tags:
-                    continue
-                # Skip if tag has attributes
-                if tag.attrs:
-                    continue
-                # Get content (excluding whitespace)
-                content = ''.join(str(child) for child in tag.contents).strip()
-                # Remove if empty (no content and no attributes)
-                if not content:
-                    tag.decompose()
-                    removed = True
-                    break
-            if not removed:
-                break
+        # Reversed document order visits all descendants of a tag before the tag itself
+        for tag in reversed(soup.find_all()):
+            # Skip if tag should be preserved
+            if tag.name in preserve_tags:
+                continue
+            # Skip if tag has attributes
+            if tag.attrs:
+                continue
+            # Remove if empty, i.e. no child tags left and only whitespace text
+            if not any(isinstance(child, Tag) or child.strip() for child in tag.contents):
+                tag.decompose()
 
     def remove_redundant_divs(self, soup):
         """
-        Removes unnecessary nested div elements from HTML.
+        Removes unnecessary nested div elements from HTML in a single bottom-up pass.
         Args:
             soup (BeautifulSoup): The HTML soup object to clean
         Returns:
             None (modifies soup object in place)
         """
-        while True:
-            redundant_found = False
-            for div in soup.find_all('div'):
-                # Get all children, excluding empty whitespace
-                children = list(div.children)
-                children = [c for c in children if not isinstance(c, str) or c.strip()]
-                # Remove div if it's empty or has only one child
-                if len(children) == 0:
-                    div.decompose()
-                    redundant_found = True
-                    break
-                elif len(children) == 1:
-                    div.replace_with(children[0])
-                    redundant_found = True
-                    break
-            if not redundant_found:
-                break
+        # Reversed document order settles inner divs before the divs containing them
+        for div in reversed(soup.find_all('div')):
+            # Get all children, excluding empty whitespace
+            children = [c for c in div.contents if not isinstance(c, str) or c.strip()]
+            # Remove div if it's empty or has only one child
+            if len(children) == 0:
+                div.decompose()
+            elif len(children) == 1:
+                div.replace_with(children[0])
 
     def generate_markdown(self, soup, page_url):
         """
@@ -154,9 +251,10 @@ class HTMLParser:
             soup (BeautifulSoup): The cleaned HTML soup object
             page_url (str): The URL of the page
         Returns:
-            tuple: Markdown representation of the HTML content and metadata containing image links
+            tuple: Markdown representation of the HTML content and metadata containing the title and image links
         """
         title = soup.find('title').string if soup.find('title') else "Untitled Page"
+        title = str(title) if title is not None else "Untitled Page"
         markdown = f"# {title}\n\n"  # Title as Markdown header
         markdown += f"Source: [{page_url}]({page_url})\n\n"
 
@@ -185,4 +283,4 @@ class HTMLParser:
                     markdown += f"- {li.get_text(strip=True)}\n"
                 markdown += "\n"
 
-        return markdown, {"images": metadata}
+        return markdown, {"title": title, "images": metadata}
@@ -0,0 +1,221 @@
+import lxml.html
+from Crawler.html_parser import HTMLParser
+from Crawler.template_learner import TemplateLearner
+
+
+def is_element(node):
+    """
+    Checks whether an lxml node is an element rather than a comment or processing instruction.
+    """
+    return isinstance(node.tag, str)
+
+
+def get_text(element, strip=False):
+    """
+    Gets the text of an element like BeautifulSoup's get_text.
+    Args:
+        element (lxml.html.HtmlElement): The element
+        strip (bool): Whether to strip each text node and drop empty ones
+    Returns:
+        str: Concatenated text
+    """
+    if strip:
+        return ''.join(text.strip() for text in element.itertext() if text.strip())
+    return ''.join(element.itertext())
+
+
+def drop_element(element):
+    """
+    Removes an element with its subtree, keeping the text that follows it.
+    """
+    if element.getparent() is not None:
+        element.drop_tree()
+
+
+def replace_with_text(element, text):
+    """
+    Replaces an element with a text node, keeping the text that follows it.
+    """
+    parent = element.getparent()
+    previous = element.getprevious()
+    text = text + (element.tail or '')
+    if previous is not None:
+        previous.tail = (previous.tail or '') + text
+    else:
+        parent.text = (parent.text or '') + text
+    parent.remove(element)
+
+
+class LxmlTemplateLearner(TemplateLearner):
+    """
+    Template learner working on lxml elements.
+    """
+    @staticmethod
+    def page_root(root):
+        body = root.find('body')
+        return body if body is not None else root
+
+    @staticmethod
+    def element_name(element):
+        return element.tag
+
+    @staticmethod
+    def own_text(element):
+        texts = [element.text or '']
+        texts.extend(child.tail or '' for child in element)  # Text after comments belongs to the element as well
+        return ' '.join(texts)
+
+    @staticmethod
+    def child_elements(element):
+        return [child for child in element if is_element(child)]
+
+    @staticmethod
+    def child_nodes(element):
+        nodes = [element.text]
+        for child in element:
+            nodes.extend([child if is_element(child) else None, child.tail])
+        return [node for node in nodes if node is not None and (not isinstance(node, str) or node.strip())]
+
+    @staticmethod
+    def remove_element(element):
+        drop_element(element)
+
+
+class LxmlHTMLParser(HTMLParser):
+    """
+    HTML parser backend on lxml, with the same cleaning stages as the BeautifulSoup backend.
+    Each page is parsed once by libxml2, and the stage methods below keep the documented behavior of HTMLParser.
+    Args:
+        template_learning_pages (int): Number of pages to learn the site template from, 0 to disable
+    """
+    template_learner_class = LxmlTemplateLearner
+
+    """
+    ********************
+    *** Page parsing ***
+    ********************
+    """
+    def parse_document(self, response):
+        """
+        Parses the HTML of a response from its raw body, so lxml decodes it itself.
+        Args:
+            response (scrapy.Response): The response object containing the webpage
+        Returns:
+            lxml.html.HtmlElement: The root html element
+        """
+        parser = lxml.html.HTMLParser(encoding=response.encoding, huge_tree=True)
+        return lxml.html.document_fromstring(response.body, parser=parser)
+
+    def extract_links(self, root):
+        return [str(href) for href in root.xpath('//a/@href')]
+
+    def canonical_href(self, root):
+        hrefs = root.xpath('//head/link[contains(concat(" ", normalize-space(@rel), " "), " canonical ")]/@href')
+        return str(hrefs[0]) if hrefs else None
+
+    def visible_text(self, root):
+        texts = root.xpath('//body//text()[not(ancestor::script or ancestor::style or ancestor::noscript)]')
+        return ' '.join(' '.join(texts).split())
+
+    """
+    *********************
+    *** HTML cleaning ***
+    *********************
+    """
+    def clean_head(self, root):
+        head = root.find('head')
+        if head is not None:
+            # Remove all elements from head except title
+            for element in list(head.iterdescendants()):
+                if is_element(element) and element.tag != 'title':
+                    drop_element(element)
+
+    def clean_elements(self, root):
+        # Remove script, style, and source tags
+        for element in list(root.iter('script', 'style', 'source', 'svg')):
+            drop_element(element)
+
+        # Remove unused attributes
+        allowed_attrs = {'href', 'src', 'aria-label', 'type', 'alt'}
+        for element in root.iter():
+            if is_element(element):
+                for attr in [attr for attr in element.attrib if attr not in allowed_attrs]:
+                    del element.attrib[attr]
+
+    def remove_existing_link_elements(self, root, existing_urls):
+        if existing_urls and len(existing_urls) > 0:
+            for a_tag in list(root.iter('a')):
+                href = a_tag.get('href')
+                if href and href in existing_urls:
+                    drop_element(a_tag)
+
+    def remove_empty_elements(self, root):
+        # Tags that should be kept even when empty
+        preserve_tags = {'hr', 'br', 'img', 'input', 'meta', 'link', 'textarea'}
+
+        # Reversed document order visits all descendants of an element before the element itself
+        for element in reversed(list(root.iter())):
+            if not is_element(element) or element.tag in preserve_tags or element.attrib:
+                continue
+            # Remove if empty, i.e. no child elements or non-blank comments left and only whitespace text
+            if (element.text or '').strip():
+                continue
+            if any((is_element(child) or (child.text or '').strip() or (child.tail or '').strip()) for child in element):
+                continue
+            drop_element(element)
+
+    def remove_redundant_divs(self, root):
+        # Reversed document order settles inner divs before the divs containing them
+        for div in reversed(list(root.iter('div'))):
+            if div.getparent() is None:
+                continue
+            # Get all children, excluding empty whitespace
+            children = [div.text] if (div.text or '').strip() else []
+            for child in div:
+                if is_element(child) or (child.text or '').strip():
+                    children.append(child)
+                if (child.tail or '').strip():
+                    children.append(child.tail)
+            # Remove div if it's empty or has only one child
+            if len(children) == 0:
+                drop_element(div)
+            elif len(children) == 1:
+                if isinstance(children[0], str):
+                    replace_with_text(div, children[0])
+                else:
+                    child = children[0]
+                    child.tail = div.tail
+                    div.getparent().replace(div, child)
+
+    def generate_markdown(self, root, page_url):
+        title = root.find('.//title')
+        title = title.text if title is not None and title.text is not None else "Untitled Page"
+        markdown = f"# {title}\n\n"  # Title as Markdown header
+        markdown += f"Source: [{page_url}]({page_url})\n\n"
+
+        metadata = []  # To store image links and associated metadata
+
+        for tag in root.iter('h1', 'h2', 'h3', 'p', 'a', 'ul', 'ol', 'li', 'img'):
+            if tag.tag == 'h1':
+                markdown += f"# {get_text(tag, strip=True)}\n\n"
+            elif tag.tag == 'h2':
+                markdown += f"## {get_text(tag, strip=True)}\n\n"
+            elif tag.tag == 'h3':
+                markdown += f"### {get_text(tag, strip=True)}\n\n"
+            elif tag.tag == 'p':
+                markdown += f"{get_text(tag, strip=True)}\n\n"
+            elif tag.tag == 'a':
+                link_text = get_text(tag, strip=True)
+                href = tag.get('href', '#')
+                markdown += f"[{link_text}]({href})\n\n"
+            elif tag.tag == 'img':
+                src = tag.get('src', '')
+                alt_text = tag.get('alt', 'Image')
+                markdown += f"![{alt_text}]({src})\n\n"
+                metadata.append({"src": src, "alt": alt_text})
+            elif tag.tag in ['ul', 'ol']:
+                for li in tag.iterdescendants('li'):
+                    markdown += f"- {get_text(li, strip=True)}\n"
+                markdown += "\n"
+
+        return markdown, {"title": title, "images": metadata}
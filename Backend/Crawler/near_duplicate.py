@@ -0,0 +1,129 @@
+import re
+import hashlib
+import numpy as np
+
+
+class SimHashIndex:
+    """
+    Finds near-duplicate pages by the Hamming distance of 64-bit SimHash fingerprints of their cleaned text.
+    Fingerprints are split into max_distance + 1 bands, so any two fingerprints within max_distance bits share at
+    least one identical band and only fingerprints in the same band bucket have to be compared.
+    Texts shorter than min_words get no fingerprint: empty pages would all share one, and the few shingles of short pages,
+    such as redirect notices or contact stubs, put unrelated pages within the maximum distance.
+    Args:
+        max_distance (int): Maximum number of differing bits for two pages to count as near-duplicates
+        shingle_size (int): Number of consecutive words hashed together as one feature
+        min_words (int): Minimum number of words of a text to be fingerprinted
+    """
+    bits = 64
+    word_pattern = re.compile(r'\w+')
+    link_target_pattern = re.compile(r'\]\([^)]*\)')
+
+    def __init__(self, max_distance=3, shingle_size=3, min_words=50):
+        self.max_distance = max_distance
+        self.shingle_size = shingle_size
+        self.min_words = min_words
+
+        # Bit ranges of the bands, the last band takes the remainder
+        band_count = max_distance + 1
+        band_bits = self.bits // band_count
+        self.bands = [(i * band_bits, self.bits if i == band_count - 1 else (i + 1) * band_bits) for i in range(band_count)]
+        self.tables = [{} for _ in self.bands]  # Per band: {band value: [(fingerprint, url)]}
+        self.size = 0
+
+    def fingerprint(self, text):
+        """
+        Computes the SimHash fingerprint of a text.
+        Args:
+            text (str): Cleaned page text, link targets are ignored as they vary between crawls
+        Returns:
+            int: 64-bit fingerprint, None for texts of fewer than min_words words
+        """
+        words = self.word_pattern.findall(self.link_target_pattern.sub(']', text).lower())
+        if len(words) < max(self.min_words, 1):
+            return None
+        if len(words) < self.shingle_size:
+            shingles = [' '.join(words)]
+        else:
+            shingles = [' '.join(words[i:i + self.shingle_size]) for i in range(len(words) - self.shingle_size + 1)]
+
+        # Bits of the big-endian shingle hashes, one row per shingle from bit 63 down to bit 0, counted per bit at once
+        digests = b''.join(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest() for shingle in shingles)
+        bit_rows = np.unpackbits(np.frombuffer(digests, dtype=np.uint8).reshape(-1, 8), axis=1)
+        ones = bit_rows.sum(axis=0, dtype=np.int64)[::-1]
+        # A bit is set if more shingles have it set than not
+        return sum(1 << int(i) for i in np.flatnonzero(2 * ones > len(shingles)))
+
+    def page_fingerprint(self, markdown):
+        """
+        Computes the fingerprint of a page generated by HTMLParser.parse_page.
+        Args:
+            markdown (str): Markdown of the page, its title and source url lines are skipped
+        Returns:
+            int: 64-bit fingerprint, None for pages of fewer than min_words words
+        """
+        return self.fingerprint(markdown.split('\n', 3)[-1])
+
+    def band_values(self, fingerprint):
+        """
+        Splits a fingerprint into its band values.
+        Args:
+            fingerprint (int): 64-bit fingerprint
+        Returns:
+            generator: Value of each band
+        """
+        for start, end in self.bands:
+            yield (fingerprint >> start) & ((1 << (end - start)) - 1)
+
+    def find(self, fingerprint):
+        """
+        Finds an indexed page within the maximum distance of a fingerprint.
+        Args:
+            fingerprint (int): Fingerprint of the new page
+        Returns:
+            tuple: (url, distance) of the closest indexed page, or None if there is no near-duplicate
+        """
+        best = None
+        for table, value in zip(self.tables, self.band_values(fingerprint)):
+            for candidate, url in table.get(value, []):
+                distance = bin(candidate ^ fingerprint).count('1')
+                if distance <= self.max_distance and (best is None or distance < best[1]):
+                    best = (url, distance)
+        return best
+
+    def add(self, fingerprint, url):
+        """
+        Indexes the fingerprint of a stored page.
+        Args:
+            fingerprint (int): Fingerprint of the page
+            url (str): Url of the page
+        """
+        for table, value in zip(self.tables, self.band_values(fingerprint)):
+            table.setdefault(value, []).append((fingerprint, url))
+        self.size += 1
+
+    def to_state(self):
+        """
+        Serializes the indexed fingerprints for crawl checkpoints.
+        Returns:
+            list: [fingerprint hex, url] pairs
+        """
+        return [[f'{fingerprint:016x}', url] for bucket in self.tables[0].values() for fingerprint, url in bucket]
+
+    def load_state(self, state):
+        """
+        Restores fingerprints serialized by to_state.
+        Args:
+            state (list): [fingerprint hex, url] pairs
+        """
+        for fingerprint, url in state:
+            self.add(int(fingerprint, 16), url)
+
+
+if __name__ == '__main__':
+    index = SimHashIndex()
+    page = 'Our study programs cover engineering, natural sciences, medicine and management. ' * 5
+    index.add(index.fingerprint(page), 'https://example.com/programs')
+    print(index.find(index.fingerprint(page + ' Print version.')))
+    print(index.find(index.fingerprint('Contact our admissions office for application deadlines, fees and visa questions. ' * 5)))
+    print(index.fingerprint('Contact our admissions office for application deadlines and fees.'))  # Too short to be fingerprinted
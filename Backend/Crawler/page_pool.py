@@ -0,0 +1,146 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from twisted.internet.defer import Deferred, DeferredSemaphore
+from scrapy.http import HtmlResponse
+from Crawler.html_parser import create_html_parser
+from Crawler.near_duplicate import SimHashIndex
+
+
+"""
+**********************
+*** Worker process ***
+**********************
+"""
+_worker_parser = None
+_worker_learner = None
+_worker_simhash = None
+
+
+class TemplateSnapshot:
+    """
+    Stands in for the template learner of a worker's parser, as the template is learned in the crawl process.
+    Strips the given template from the page, or only collects the page's block hashes while it is still being learned.
+    Args:
+        learner (TemplateLearner): Learner of the worker's parser backend, used for hashing and stripping
+        template (set): Learned template, None while learning
+    """
+    def __init__(self, learner, template):
+        self.learner = learner
+        self.template = template
+        self.block_hashes = None
+
+    def process(self, soup):
+        if self.template is not None:
+            self.learner.strip(soup, self.template)
+        else:
+            self.block_hashes = self.learner.block_hashes(soup)
+
+
+def init_worker(parser_backend, shingle_size=None, min_words=50):
+    """
+    Creates the HTML parser of a worker process once, so it is reused for all pages the worker cleans.
+    Args:
+        parser_backend (str): HTML parser backend
+        shingle_size (int): Shingle size of the SimHash fingerprints of the pages, None not to fingerprint them
+        min_words (int): Minimum number of words of a page to be fingerprinted
+    """
+    global _worker_parser, _worker_learner, _worker_simhash
+    _worker_parser = create_html_parser(parser_backend, template_learning_pages=0)
+    _worker_learner = _worker_parser.template_learner_class()
+    _worker_simhash = SimHashIndex(shingle_size=shingle_size, min_words=min_words) if shingle_size is not None else None
+
+
+def clean_page(url, body, encoding, existing_urls, template):
+    """
+    Parses and cleans a page in a worker process.
+    Args:
+        url (str): Url the page was fetched from
+        body (bytes): Raw body of the response
+        encoding (str): Encoding of the response
+        existing_urls (set): Hrefs of the page that had been discovered before
+        template (set): Learned site template, None while learning
+    Returns:
+        dict: The page parsed by HTMLParser.parse_page, with the block hashes of the page while learning and its SimHash
+              fingerprint if enabled
+    """
+    snapshot = TemplateSnapshot(_worker_learner, template)
+    _worker_parser.template = snapshot
+    page = _worker_parser.parse_page(HtmlResponse(url=url, body=body, encoding=encoding), existing_urls)
+    page['block_hashes'] = snapshot.block_hashes
+    if _worker_simhash is not None:
+        page['simhash'] = _worker_simhash.page_fingerprint(page['markdown'])
+    return page
+
+
+"""
+*********************
+*** Crawl process ***
+*********************
+"""
+class PageCleaningPool:
+    """
+    Cleans pages in a bounded pool of worker processes, so parsing and markdown generation never block the reactor.
+    Results come back as Deferreds fired in the reactor thread. Once max_pending pages are submitted, further pages wait
+    for a free slot while their responses stay in Scrapy's scraper, which in turn stops new downloads when it is full.
+    Args:
+        parser_backend (str): HTML parser backend of the workers
+        template (TemplateLearner): Template learner of the crawl, fed with the block hashes computed by the workers
+        max_workers (int): Number of worker processes
+        max_pending (int): Maximum number of pages submitted to the pool at once, defaults to twice the workers
+        shingle_size (int): Shingle size of the SimHash index of the crawl, the workers fingerprint the pages if set
+        min_words (int): Minimum number of words of a page to be fingerprinted, that of the SimHash index of the crawl
+    """
+    def __init__(self, parser_backend='lxml', template=None, max_workers=2, max_pending=None, shingle_size=None, min_words=50):
+        self.template = template
+        self.max_workers = max_workers
+        self.slots = DeferredSemaphore(max_pending or 2 * max_workers)
+        # Spawn instead of fork, as forking a running reactor with its threads is unsafe
+        self.executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'),
+                                            initializer=init_worker, initargs=(parser_backend, shingle_size, min_words))
+
+    def parse_page(self, response, existing_urls):
+        """
+        Submits a page to the pool once a slot is free.
+        Args:
+            response (scrapy.Response): The response object containing the webpage
+            existing_urls (set): Hrefs of the page that had been discovered before
+        Returns:
+            Deferred: Fires with the page parsed by HTMLParser.parse_page
+        """
+        d = self.slots.run(self.submit, response, existing_urls)
+        d.addCallback(self.learn_template)
+        return d
+
+    def submit(self, response, existing_urls):
+        """
+        Runs a page in a worker process.
+        Returns:
+            Deferred: Fires in the reactor thread with the result of clean_page
+        """
+        from twisted.internet import reactor  # The reactor installed by Scrapy
+        if self.template is None:
+            template = set()  # Template learning disabled, nothing to strip
+        else:
+            template = self.template.template
+        future = self.executor.submit(clean_page, response.url, response.body, response.encoding, existing_urls, template)
+
+        d = Deferred()
+        def fire(future):
+            if future.exception() is not None:
+                reactor.callFromThread(d.errback, future.exception())
+            else:
+                reactor.callFromThread(d.callback, future.result())
+        future.add_done_callback(fire)
+        return d
+
+    def learn_template(self, page):
+        block_hashes = page.pop('block_hashes')
+        if block_hashes is not None and self.template is not None and not self.template.learned:
+            self.template.observe(block_hashes)
+        return page
+
+    def close(self):
+        """
+        Shuts down the worker processes.
+        """
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,298 @@
+import json
+import os
+import zlib
+import base64
+import hashlib
+from os.path import join as pjoin
+from urllib.parse import urlparse
+
+processed_dir_name = 'processed'  # Subdirectory of a company with one markdown document and metadata sidecar per url
+
+
+def page_file_path(output_dir, url):
+    """
+    Generates the filesystem-safe path of a page in the one-file-per-url layout, without extension.
+    Args:
+        output_dir (str): Directory of the company being crawled
+        url (str): URL to convert to filename
+    Returns:
+        str: Path where the file should be saved
+    """
+    # Parse URL and create domain directory
+    parsed_url = urlparse(url)
+    domain = parsed_url.netloc
+    domain_dir = f'{output_dir}/{domain}'
+
+    # Create path for file
+    path = parsed_url.path
+    if not path or path == '/':
+        path = 'root-index'
+    else:
+        path = path.strip('/')
+    # Add query string if it exists, with safe encoding
+    if parsed_url.query:
+        encoded_query = base64.urlsafe_b64encode(parsed_url.query.encode()).decode()
+        path = f'{path}_{encoded_query}'
+
+    # Create full directory path and ensure it exists
+    full_path = f'{domain_dir}/{path}'.replace('.html', '')
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    return full_path
+
+
+class PageStore:
+    """
+    Stores cleaned pages in zlib-compressed, append-only shard files instead of one file per url.
+    Pages are content-addressed: identical content is stored once, and an append-only index maps each url to its content hash
+    and each hash to the shard, offset and length of its compressed blob. The 'Source:' line the parsers write below the
+    title differs between urls, so it is kept in the index entry and the blob of identical pages under different urls is shared.
+    Args:
+        output_dir (str): Directory of the company being crawled, the store lives in its page_store subdirectory
+        shard_size (int): Size in bytes after which a new shard file is started
+        compression_level (int): zlib compression level
+    """
+    dir_name = 'page_store'
+    index_file_name = 'index.jsonl'
+    source_prefix = 'Source: '
+
+    def __init__(self, output_dir, shard_size=64 * 1024 * 1024, compression_level=6):
+        self.store_dir = pjoin(output_dir, self.dir_name)
+        self.index_path = pjoin(self.store_dir, self.index_file_name)
+        self.shard_size = shard_size
+        self.compression_level = compression_level
+        os.makedirs(self.store_dir, exist_ok=True)
+
+        self.urls = {}  # {url: content hash}
+        self.blobs = {}  # {content hash: (shard, offset, length)}
+        self.metadata = {}  # {url: page metadata}
+        self.sources = {}  # {url: source line of the page}
+        self.load_index()
+
+        # Appending continues in the last shard
+        self.shard = max((shard for shard, _, _ in self.blobs.values()), default=0)
+        self.shard_file = None
+        self.index_file = open(self.index_path, 'a', encoding='utf-8')
+
+    @classmethod
+    def exists(cls, output_dir):
+        """
+        Checks whether a company directory contains a page store.
+        Args:
+            output_dir (str): Directory of the company
+        Returns:
+            bool: True if the page store index exists
+        """
+        return os.path.exists(pjoin(output_dir, cls.dir_name, cls.index_file_name))
+
+    def shard_path(self, shard):
+        return pjoin(self.store_dir, f'shard-{shard:05d}.zlib')
+
+    def load_index(self):
+        """
+        Loads the url and blob tables from the index, where later entries of a url override earlier ones.
+        """
+        if not os.path.exists(self.index_path):
+            return
+        with open(self.index_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # Partially written last line of an interrupted crawl
+                self.urls[entry['url']] = entry['hash']
+                self.blobs[entry['hash']] = (entry['shard'], entry['offset'], entry['length'])
+                self.metadata[entry['url']] = entry.get('metadata')
+                self.sources[entry['url']] = entry.get('source')  # None for entries stored with their source line
+
+    def __contains__(self, url):
+        return url in self.urls
+
+    def __len__(self):
+        return len(self.urls)
+
+    """
+    ***************
+    *** Writing ***
+    ***************
+    """
+    def put(self, url, content, metadata=None):
+        """
+        Stores the content of a page, writing the blob only if the same content is not stored yet.
+        Args:
+            url (str): Url of the page
+            content (str): Cleaned page content
+            metadata (dict): Metadata of the page, kept in its index entry
+        Returns:
+            str: Content hash of the page
+        """
+        content, source = self.split_source(content)
+        data = content.encode('utf-8')
+        content_hash = hashlib.sha256(data).hexdigest()
+        if content_hash not in self.blobs:
+            self.blobs[content_hash] = self.write_blob(zlib.compress(data, self.compression_level))
+        # The blob is flushed before its index entry, so the index never points past the end of a shard
+        shard, offset, length = self.blobs[content_hash]
+        entry = {'url': url, 'hash': content_hash, 'shard': shard, 'offset': offset, 'length': length}
+        if source is not None:
+            entry['source'] = source
+        if metadata is not None:
+            entry['metadata'] = metadata
+        self.index_file.write(json.dumps(entry) + '\n')
+        self.index_file.flush()
+        self.urls[url] = content_hash
+        self.metadata[url] = metadata
+        self.sources[url] = source
+        return content_hash
+
+    @classmethod
+    def split_source(cls, content):
+        """
+        Takes the 'Source:' line out of a page, the paragraph following its title.
+        Args:
+            content (str): Cleaned page content
+        Returns:
+            tuple: (content without the source line, source line or None if the page has none)
+        """
+        title, separator, rest = content.partition('\n\n')
+        if not separator or not rest.startswith(cls.source_prefix):
+            return content, None
+        source, separator, body = rest.partition('\n\n')
+        if not separator:
+            return content, None
+        return f'{title}\n\n{body}', source
+
+    @staticmethod
+    def join_source(content, source):
+        """
+        Puts the source line taken out by split_source back into a page.
+        Args:
+            content (str): Stored page content
+            source (str): Source line of the page, None to return the content as stored
+        Returns:
+            str: The page content
+        """
+        if source is None:
+            return content
+        title, _, body = content.partition('\n\n')
+        return f'{title}\n\n{source}\n\n{body}'
+
+    def write_blob(self, blob):
+        """
+        Appends a compressed blob to the current shard, starting a new shard once it is full.
+        Args:
+            blob (bytes): Compressed page content
+        Returns:
+            tuple: (shard, offset, length) of the blob
+        """
+        if self.shard_file is None:
+            self.shard_file = open(self.shard_path(self.shard), 'ab')
+        if self.shard_file.tell() and self.shard_file.tell() + len(blob) > self.shard_size:
+            self.shard_file.close()
+            self.shard += 1
+            self.shard_file = open(self.shard_path(self.shard), 'ab')
+        offset = self.shard_file.tell()
+        self.shard_file.write(blob)
+        self.shard_file.flush()
+        return self.shard, offset, len(blob)
+
+    def close(self):
+        """
+        Closes the open shard and index files.
+        """
+        if self.shard_file is not None:
+            self.shard_file.close()
+            self.shard_file = None
+        if not self.index_file.closed:
+            self.index_file.close()
+
+    """
+    ***************
+    *** Reading ***
+    ***************
+    """
+    def get(self, url):
+        """
+        Reads the content of a page.
+        Args:
+            url (str): Url of the page
+        Returns:
+            str: Page content, or None if the url is not stored
+        """
+        if url not in self.urls:
+            return None
+        shard, offset, length = self.blobs[self.urls[url]]
+        with open(self.shard_path(shard), 'rb') as f:
+            f.seek(offset)
+            return self.join_source(zlib.decompress(f.read(length)).decode('utf-8'), self.sources.get(url))
+
+    def iter_pages(self):
+        """
+        Streams all stored pages shard by shard in file order, reading each shard once.
+        Yields:
+            tuple: (url, content) of each page
+        """
+        urls_by_hash = {}
+        for url, content_hash in self.urls.items():
+            urls_by_hash.setdefault(content_hash, []).append(url)
+        blobs = sorted((location, content_hash) for content_hash, location in self.blobs.items() if content_hash in urls_by_hash)
+
+        current_shard, f = None, None
+        try:
+            for (shard, offset, length), content_hash in blobs:
+                if shard != current_shard:
+                    if f:
+                        f.close()
+                    current_shard, f = shard, open(self.shard_path(shard), 'rb')
+                f.seek(offset)
+                content = zlib.decompress(f.read(length)).decode('utf-8')
+                for url in urls_by_hash[content_hash]:
+                    yield url, self.join_source(content, self.sources.get(url))
+        finally:
+            if f:
+                f.close()
+
+    def export(self, output_dir, extension='.md'):
+        """
+        Writes all stored pages back to the processed layout of the crawler, with a metadata sidecar per page.
+        Args:
+            output_dir (str): Directory of the company to export to
+            extension (str): Extension of the exported files
+        Returns:
+            int: Number of exported pages
+        """
+        count = 0
+        for url, content in self.iter_pages():
+            file_path = page_file_path(pjoin(output_dir, processed_dir_name), url)
+            with open(f'{file_path}{extension}', 'w', encoding='utf-8') as f:
+                f.write(content)
+            if self.metadata.get(url) is not None:
+                with open(f'{file_path}.json', 'w', encoding='utf-8') as f:
+                    json.dump(self.metadata[url], f, indent=2)
+            count += 1
+        print(f'Exported {count} pages from {self.store_dir} to {output_dir}')
+        return count
+
+
+if __name__ == '__main__':
+    import sys
+    import tempfile
+
+    if len(sys.argv) == 3:
+        # Export a crawled company: python page_store.py <company dir> <export dir>
+        store = PageStore(sys.argv[1])
+        store.export(sys.argv[2])
+        store.close()
+    else:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            store = PageStore(tmp_dir, shard_size=4096)
+            for i in range(200):
+                url = f'https://example.com/page/{i}'
+                store.put(url, f'# Page {i % 50}\n\nSource: [{url}]({url})\n\n' + 'Some cleaned page content. ' * 40,
+                          {'url': f'https://example.com/page/{i}', 'title': f'Page {i % 50}', 'images': []})
+            store.close()
+            store = PageStore(tmp_dir)
+            shards = [name for name in os.listdir(store.store_dir) if name.startswith('shard-')]
+            size = sum(os.path.getsize(pjoin(store.store_dir, name)) for name in shards)
+            print(f'{len(store)} urls, {len(store.blobs)} blobs in {len(shards)} shards, {size} bytes')
+            print(store.get('https://example.com/page/51')[:40])
+            print(store.export(pjoin(tmp_dir, 'export')))
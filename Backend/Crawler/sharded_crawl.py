@@ -0,0 +1,475 @@
+import os
+import json
+import queue
+import shutil
+import signal
+import multiprocessing
+from multiprocessing.connection import wait
+from os.path import join as pjoin
+from datetime import datetime
+from scrapy import signals
+from scrapy.exceptions import DontCloseSpider
+from twisted.internet.task import LoopingCall
+from Crawler.crawler import UTASpider
+from Crawler.crawl_manifest import CrawlManifest
+from Crawler.crawl_checkpoint import CrawlCheckpoint
+from Crawler.page_store import processed_dir_name
+from Crawler.url_filter import URLFilter
+from Crawler.url_set import URLFingerprintSet, url_fingerprint
+
+
+class ShardPartition:
+    """
+    Assigns canonical urls to the shards of a crawl.
+    Args:
+        shard_count (int): Number of shards
+        partition (str): 'host' to crawl each host in one shard, so its throttling holds, or 'url' to spread the urls of
+                         every host over all shards, for sites on few hosts
+    """
+    partitions = ('host', 'url')
+
+    def __init__(self, shard_count, partition='host'):
+        if partition not in self.partitions:
+            raise ValueError(f'Unknown shard partition {partition}, expected one of {", ".join(self.partitions)}')
+        self.shard_count = shard_count
+        self.partition = partition
+
+    def shard_of(self, url):
+        """
+        Args:
+            url (str): Canonical url
+        Returns:
+            int: Index of the shard crawling the url
+        """
+        key = URLFilter.split_url(url)[0] if self.partition == 'host' else url
+        return url_fingerprint(key) % self.shard_count
+
+
+class ShardCoordinator:
+    """
+    State shared by the shard processes: an inbox queue per shard for the urls other shards discovered, and the counters
+    telling when the crawl is over. It is finished once every shard is idle and no forwarded url is on its way, and it is
+    stopped for all shards as soon as one shard stops early, such as on its crawl budget or a cancellation.
+    Args:
+        shard_count (int): Number of shards
+        context (multiprocessing.context.BaseContext): Multiprocessing context of the shard processes
+    """
+    def __init__(self, shard_count, context):
+        self.shard_count = shard_count
+        self.inboxes = [context.Queue() for _ in range(shard_count)]
+        self.lock = context.Lock()
+        self.idle = context.Array('b', shard_count, lock=False)
+        self.in_flight = context.Value('q', 0, lock=False)  # Forwarded urls not yet received
+        self.stopped = context.Value('b', 0, lock=False)
+
+    def send(self, shard_index, urls):
+        """
+        Forwards urls to the shard owning them, counted before they are queued so the crawl cannot finish meanwhile.
+        Args:
+            shard_index (int): Receiving shard
+            urls (list): Urls as (url, depth)
+        """
+        with self.lock:
+            self.in_flight.value += len(urls)
+        self.inboxes[shard_index].put(urls)
+
+    def receive(self, shard_index, max_batches=100):
+        """
+        Takes the forwarded urls waiting in the inbox of a shard, to be acknowledged with delivered.
+        Args:
+            shard_index (int): Receiving shard
+            max_batches (int): Maximum number of forwarded batches to take
+        Returns:
+            list: Urls as (url, depth)
+        """
+        urls = []
+        for _ in range(max_batches):
+            try:
+                urls.extend(self.inboxes[shard_index].get_nowait())
+            except queue.Empty:
+                break
+        return urls
+
+    def delivered(self, shard_index, count, busy):
+        """
+        Acknowledges received urls, marking the shard busy first if it scheduled any of them.
+        Args:
+            shard_index (int): Receiving shard
+            count (int): Number of received urls
+            busy (bool): Whether the shard scheduled requests for them
+        """
+        with self.lock:
+            if busy:
+                self.idle[shard_index] = 0
+            self.in_flight.value -= count
+
+    def set_idle(self, shard_index):
+        """
+        Marks a shard as out of work.
+        Args:
+            shard_index (int): Idle shard
+        Returns:
+            bool: True if the whole crawl is finished
+        """
+        with self.lock:
+            self.idle[shard_index] = 1
+            return self.in_flight.value == 0 and all(self.idle)
+
+    def finished(self):
+        with self.lock:
+            return self.in_flight.value == 0 and all(self.idle)
+
+    def stop(self):
+        self.stopped.value = 1
+
+    def is_stopped(self):
+        return bool(self.stopped.value)
+
+
+class ShardSpider(UTASpider):
+    """
+    UTASpider crawling one shard of the url space in its own process, forwarding discovered urls of other shards to them.
+    Args:
+        shard_index (int): Index of the crawled shard
+        coordinator (ShardCoordinator): State shared with the other shards
+        partition (str): Partition of the url space, see ShardPartition
+        args, kwargs: Arguments of UTASpider, with the shard's directory as company_name
+    """
+    poll_interval = 0.2  # Seconds between two exchanges of forwarded urls
+
+    def __init__(self, shard_index, coordinator, partition='host', *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.shard_index = shard_index
+        self.coordinator = coordinator
+        self.partition = ShardPartition(coordinator.shard_count, partition)
+        # Each start url is crawled by its shard, the other shards wait for forwarded urls
+        self.start_urls = [url for url in self.start_urls if self.partition.shard_of(self.canonicalizer.canonicalize(url)) == shard_index]
+        if partition == 'url':
+            # Every shard crawls a part of each host, so the per-host limit is split between them
+            self.max_urls_per_domain = -(-self.max_urls_per_domain // coordinator.shard_count)
+
+        self.forwarded_urls = URLFingerprintSet()  # Urls already forwarded, each is sent to its shard once
+        self.outbox = {}  # {shard index: [(url, depth)]} forwarded in batches
+        self.inbox_poller = None  # Created once the crawler installed its reactor
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        crawler.signals.connect(spider.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(spider.spider_idle, signal=signals.spider_idle)
+        return spider
+
+    def restore_checkpoint(self):
+        """
+        Restores the shard's checkpoint, also with an empty frontier, as the shard is resumed together with the others.
+        Returns:
+            bool: True if a checkpoint was restored
+        """
+        state = self.checkpoint.load()
+        if not state:
+            return False
+        self.load_checkpoint_state(state)
+        return True
+
+    """
+    **********************
+    *** URL forwarding ***
+    **********************
+    """
+    def schedule_url(self, url, depth):
+        """
+        Schedules urls of this shard and forwards the others to their shard.
+        Args:
+            url (str): Absolute url to crawl, requested as linked
+            depth (int): Crawl depth of the URL
+        Returns:
+            scrapy.Request: The request to schedule, None if the url belongs to another shard
+        """
+        key = self.canonicalizer.canonicalize(url)
+        shard_index = self.partition.shard_of(key)
+        if shard_index == self.shard_index:
+            return super().schedule_url(url, depth)
+        if key not in self.forwarded_urls:
+            self.forwarded_urls.add(key)
+            self.outbox.setdefault(shard_index, []).append((url, depth))
+        return None
+
+    def flush_outbox(self):
+        for shard_index, urls in self.outbox.items():
+            self.coordinator.send(shard_index, urls)
+        self.outbox = {}
+
+    def poll_inbox(self):
+        """
+        Sends the forwarded urls of the last interval and schedules the urls forwarded by other shards.
+        """
+        self.flush_outbox()
+        if self.coordinator.is_stopped():
+            self.close_shard('shard_stopped')
+            return
+        urls = self.coordinator.receive(self.shard_index)
+        if urls:
+            scheduled = 0
+            for url, depth in urls:
+                key = self.canonicalizer.canonicalize(url)
+                if key in self.pending_urls or not self.is_valid_url(key):
+                    continue
+                self.pending_urls[key] = (url, depth)
+                self.crawler.engine.crawl(self.build_request(url, depth))
+                scheduled += 1
+            self.coordinator.delivered(self.shard_index, len(urls), busy=scheduled > 0)
+        elif self.coordinator.finished():
+            self.close_shard('finished')
+
+    def close_shard(self, reason):
+        if self.inbox_poller is not None and self.inbox_poller.running:
+            self.inbox_poller.stop()
+            self.crawler.engine.close_spider(self, reason)
+
+    """
+    ***************
+    *** Signals ***
+    ***************
+    """
+    def spider_opened(self, spider):
+        self.inbox_poller = LoopingCall(self.poll_inbox)
+        self.inbox_poller.start(self.poll_interval, now=False)
+
+    def spider_idle(self, spider):
+        """
+        Keeps an idle shard open until all shards are idle, as other shards may still forward urls to it.
+        """
+        self.flush_outbox()
+        if self.coordinator.set_idle(self.shard_index):
+            if self.inbox_poller is not None and self.inbox_poller.running:
+                self.inbox_poller.stop()
+            return  # Every shard is out of work, the spider closes as finished
+        if self.coordinator.is_stopped():
+            # Closed as stopped, so the urls forwarded to it are drained into its checkpoint
+            self.close_shard('shard_stopped')
+        raise DontCloseSpider
+
+    def spider_closed(self, spider, reason='finished'):
+        """
+        Stops the other shards if this one stops early, keeping the urls forwarded to it in its checkpoint.
+        """
+        if self.inbox_poller is not None and self.inbox_poller.running:
+            self.inbox_poller.stop()
+        if reason != 'finished':
+            self.coordinator.stop()
+            self.flush_outbox()
+            urls = self.coordinator.receive(self.shard_index, max_batches=1000000)
+            for url, depth in urls:
+                self.pending_urls.setdefault(self.canonicalizer.canonicalize(url), (url, depth))
+            self.coordinator.delivered(self.shard_index, len(urls), busy=False)
+        super().spider_closed(spider, reason)
+
+
+def run_shard(shard_index, coordinator, partition, settings, spider_kwargs):
+    """
+    Crawls one shard in the current process, the target of the shard processes.
+    Args:
+        shard_index (int): Index of the crawled shard
+        coordinator (ShardCoordinator): State shared with the other shards
+        partition (str): Partition of the url space
+        settings (dict): Scrapy settings
+        spider_kwargs (dict): Arguments of the spider
+    """
+    from scrapy.crawler import CrawlerProcess
+    process = CrawlerProcess(settings)
+    process.crawl(ShardSpider, shard_index=shard_index, coordinator=coordinator, partition=partition, **spider_kwargs)
+    process.start()
+
+
+class ShardedCrawl:
+    """
+    Crawls a website with several processes, for large sites where parsing on one core is the bottleneck.
+    The url space is partitioned by host or by url across the shards, each crawled by a ShardSpider in its own process
+    and saving to its own directory under 'shards'. Pages are moved into the website's processed directory, and the
+    manifests and website infos of the shards are merged into the website's ones.
+    Incremental crawls, stream indexing and the page store work per process and are not supported.
+    Args:
+        output_dir (str): Directory of the crawled websites
+        company_name (str): Name of the company being crawled
+        start_urls (list): Initial URLs to start crawling from
+        shard_count (int): Number of shard processes
+        partition (str): 'host' or 'url', see ShardPartition
+        settings (dict): Scrapy settings of the shard crawlers
+        summary_interval (float): Seconds between two merges of the shards' website infos while crawling
+        spider_kwargs: Further arguments of UTASpider, such as domain_limit, url_rules or time_budget
+    """
+    shards_dir_name = 'shards'
+
+    def __init__(self, output_dir, company_name, start_urls, shard_count=4, partition='host', settings=None,
+                 summary_interval=5.0, **spider_kwargs):
+        ShardPartition(shard_count, partition)  # Validates the partition
+        self.company_name = company_name
+        self.company_dir = pjoin(output_dir, company_name)
+        self.shards_dir = pjoin(self.company_dir, self.shards_dir_name)
+        self.start_urls = start_urls
+        self.shard_count = shard_count
+        self.partition = partition
+        self.settings = settings or {}
+        self.summary_interval = summary_interval
+        self.spider_kwargs = spider_kwargs
+
+    def shard_dir(self, shard_index):
+        return pjoin(self.shards_dir, f'shard-{shard_index}')
+
+    @classmethod
+    def is_resumable(cls, company_dir):
+        """
+        Checks whether a sharded crawl of a company was interrupted.
+        Args:
+            company_dir (str): Directory of the company
+        Returns:
+            bool: True if a shard left a checkpoint
+        """
+        shards_dir = pjoin(company_dir, cls.shards_dir_name)
+        return os.path.isdir(shards_dir) and any(os.path.exists(pjoin(shards_dir, name, CrawlCheckpoint.file_name))
+                                                 for name in os.listdir(shards_dir))
+
+    """
+    ****************
+    *** Crawling ***
+    ****************
+    """
+    def run(self, resume=False):
+        """
+        Crawls the website with one process per shard and merges their results.
+        Args:
+            resume (bool): Whether to resume the shards from their checkpoints
+        Returns:
+            dict: The merged website info
+        """
+        # Spawned, so the shards start without the state of a forked server or reactor
+        context = multiprocessing.get_context('spawn')
+        coordinator = ShardCoordinator(self.shard_count, context)
+        processes = []
+        for shard_index in range(self.shard_count):
+            spider_kwargs = dict(self.spider_kwargs, output_dir=self.shards_dir, company_name=f'shard-{shard_index}',
+                                 start_urls=self.start_urls, resume=resume)
+            processes.append(context.Process(target=run_shard, name=f'{self.company_name}-shard-{shard_index}',
+                                             args=(shard_index, coordinator, self.partition, self.settings, spider_kwargs)))
+        print(f'\n!!! Crawling {self.company_name} with {self.shard_count} shards by {self.partition} !!!\n')
+        for process in processes:
+            process.start()
+        try:
+            while any(process.is_alive() for process in processes):
+                wait([process.sentinel for process in processes if process.is_alive()], timeout=self.summary_interval)
+                self.save_website_info()
+        except KeyboardInterrupt:
+            # Stopped shards keep their checkpoints, the crawl is resumable
+            for process in processes:
+                if process.is_alive():
+                    if os.name != 'nt':
+                        os.kill(process.pid, signal.SIGINT)
+                    else:
+                        process.terminate()
+            for process in processes:
+                process.join()
+        return self.merge()
+
+    """
+    ***************
+    *** Merging ***
+    ***************
+    """
+    def shard_infos(self):
+        """
+        Loads the website infos of the shards.
+        Returns:
+            list: Website info of each shard, None for shards that have not saved one yet
+        """
+        infos = []
+        for shard_index in range(self.shard_count):
+            try:
+                with open(pjoin(self.shard_dir(shard_index), 'website_info.json'), 'r', encoding='utf-8') as f:
+                    infos.append(json.load(f))
+            except (OSError, json.JSONDecodeError):
+                infos.append(None)  # Not saved yet, or being written
+        return infos
+
+    def save_website_info(self):
+        """
+        Merges the website infos of the shards into the website info of the company.
+        Returns:
+            dict: The merged website info
+        """
+        infos = self.shard_infos()
+        domain_urls = {}
+        failed_urls = []
+        for info in filter(None, infos):
+            for domain, count in info['domain_urls'].items():
+                domain_urls[domain] = domain_urls.get(domain, 0) + count
+            failed_urls.extend(info['failed_urls'])
+        data = {
+            'company_name': self.company_name,
+            'start_urls': self.start_urls,
+            'domain_limit': self.spider_kwargs.get('domain_limit'),
+            'domain_urls': domain_urls,
+            'crawl_time': datetime.now().strftime("%Y-%m-%d %H:%M"),
+            'crawl_finished': all(info is not None and info['crawl_finished'] for info in infos),
+            'visited_count': sum(info['visited_count'] for info in infos if info),
+            'failed_count': sum(info['failed_count'] for info in infos if info),
+            'failed_urls': failed_urls[:50],
+            'pages_per_second': round(sum(info['pages_per_second'] for info in infos if info), 2),
+            'manifest': CrawlManifest.file_name,
+            'shard_count': self.shard_count,
+            'partition': self.partition,
+            'shards': [{'shard': shard_index,
+                        'visited_count': info['visited_count'] if info else 0,
+                        'pages_per_second': info['pages_per_second'] if info else 0.0,
+                        'crawl_finished': bool(info and info['crawl_finished'])}
+                       for shard_index, info in enumerate(infos)]
+        }
+        os.makedirs(self.company_dir, exist_ok=True)
+        with open(pjoin(self.company_dir, 'website_info.json'), 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2)
+        return data
+
+    def merge(self):
+        """
+        Moves the pages of the shards into the website's processed directory and merges their manifests and website infos.
+        The shard directories are removed once the crawl is finished, and kept with their checkpoints otherwise.
+        Returns:
+            dict: The merged website info
+        """
+        processed_dir = pjoin(self.company_dir, processed_dir_name)
+        with open(pjoin(self.company_dir, CrawlManifest.file_name), 'w', encoding='utf-8') as manifest:
+            for shard_index in range(self.shard_count):
+                shard_dir = self.shard_dir(shard_index)
+                # Saved files are relative to the website directory in the shard's and the merged manifest alike
+                shard_processed_dir = pjoin(shard_dir, processed_dir_name)
+                for root, _, files in os.walk(shard_processed_dir):
+                    target_dir = pjoin(processed_dir, os.path.relpath(root, shard_processed_dir))
+                    os.makedirs(target_dir, exist_ok=True)
+                    for file in files:
+                        os.replace(pjoin(root, file), pjoin(target_dir, file))
+                shard_manifest = pjoin(shard_dir, CrawlManifest.file_name)
+                if os.path.exists(shard_manifest):
+                    with open(shard_manifest, 'r', encoding='utf-8') as f:
+                        shutil.copyfileobj(f, manifest)
+
+        data = self.save_website_info()
+        if data['crawl_finished']:
+            shutil.rmtree(self.shards_dir, ignore_errors=True)
+            print(f'\n!!! Sharded crawling finished for {self.company_name}: {data["visited_count"]} pages !!!\n')
+        else:
+            print(f'\n!!! Sharded crawling stopped for {self.company_name}, resumable from the shard checkpoints !!!\n')
+        return data
+
+
+if __name__ == '__main__':
+    # Crawl a large website with 4 shard processes, run from Backend: python -m Crawler.sharded_crawl
+    # The end-to-end test on a local multi-host site is in Tests/test_sharded_crawl.py
+    settings = {
+        'LOG_ENABLED': True,
+        'LOG_LEVEL': 'ERROR',
+        'ROBOTSTXT_OBEY': True,
+        'CONCURRENT_REQUESTS_PER_DOMAIN': 2,
+        'DOWNLOAD_DELAY': 1,
+        'DOWNLOAD_TIMEOUT': 10
+    }
+    ShardedCrawl('./Output/websites', 'tum', ['https://www.tum.de/en/'], shard_count=4, partition='url',
+                 settings=settings, domain_limit='https://www.tum.de/en/').run()
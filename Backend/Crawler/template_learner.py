@@ -0,0 +1,129 @@
+from collections import Counter
+from Crawler.html_differ import SubtreeHasher
+
+
+class TemplateLearner(SubtreeHasher):
+    """
+    Learns the DOM blocks a site repeats on its pages (navigation, header, footer, cookie banners) from its first pages,
+    then strips them from every later page in a single pass.
+    Blocks are identified by their Merkle subtree hashes, computed for the whole page in one bottom-up pass.
+    Args:
+        learning_pages (int): Number of pages to learn the template from
+        min_page_ratio (float): Share of the learning pages a block has to appear on to be part of the template
+        min_text_length (int): Minimum text length of a block to be learned, so short generic blocks are kept
+    """
+    hashing = 'merkle'  # Version of the block hashes, templates hashed differently are learned again
+    block_tags = {'header', 'footer', 'nav', 'aside', 'section', 'div', 'ul', 'ol', 'form', 'table', 'dialog'}
+
+    def __init__(self, learning_pages=20, min_page_ratio=0.6, min_text_length=20):
+        super().__init__(min_text_length=min_text_length)
+        self.learning_pages = learning_pages
+        self.min_page_ratio = min_page_ratio
+
+        self.observed_pages = 0
+        self.block_counts = Counter()  # {block hash: number of learning pages containing it}
+        self.template = None  # Set of block hashes once learned
+
+    @property
+    def learned(self):
+        """
+        Returns:
+            bool: True once the template has been learned
+        """
+        return self.template is not None
+
+    """
+    *************************
+    *** Template learning ***
+    *************************
+    """
+    def block_hashes(self, soup):
+        """
+        Collects the hashes of all blocks on a page.
+        Args:
+            soup (BeautifulSoup): The page soup
+        Returns:
+            set: Hex hashes of the page's blocks with at least min_text_length characters of text
+        """
+        return {h.hex() for element, h, length in self.hash_subtrees(self.page_root(soup)).values()
+                if length >= self.min_text_length and self.element_name(element) in self.block_tags}
+
+    def observe(self, hashes):
+        """
+        Counts the blocks of a learning page and builds the template once enough pages are observed.
+        Args:
+            hashes (set): Block hashes of the page
+        """
+        self.block_counts.update(hashes)
+        self.observed_pages += 1
+        if self.observed_pages >= self.learning_pages:
+            min_pages = max(2, self.min_page_ratio * self.observed_pages)
+            self.template = {h for h, count in self.block_counts.items() if count >= min_pages}
+            self.block_counts.clear()
+            print(f'Learned site template with {len(self.template)} repeated blocks from {self.observed_pages} pages')
+
+    @staticmethod
+    def remove_element(tag):
+        tag.decompose()
+
+    def strip(self, soup, template=None):
+        """
+        Removes template blocks from a page, top-down so a removed block's descendants are never visited.
+        Args:
+            soup (BeautifulSoup): The page soup
+            template (set): Block hashes to remove, defaults to the learned template
+        Returns:
+            int: Number of removed blocks
+        """
+        template = self.template if template is None else template
+        if not template:
+            return 0
+        root = self.page_root(soup)
+        hashes = self.hash_subtrees(root)
+        removed = 0
+        stack = [root]
+        while stack:
+            for child in self.child_elements(stack.pop()):
+                _, h, length = hashes[id(child)]
+                if length >= self.min_text_length and self.element_name(child) in self.block_tags and h.hex() in template:
+                    self.remove_element(child)
+                    removed += 1
+                else:
+                    stack.append(child)
+        return removed
+
+    def process(self, soup):
+        """
+        Learns from the page while the template is not learned yet, strips the template from it afterwards.
+        Args:
+            soup (BeautifulSoup): The page soup, modified in place
+        """
+        if self.learned:
+            self.strip(soup)
+        else:
+            self.observe(self.block_hashes(soup))
+
+    def to_state(self):
+        """
+        Serializes the learning progress or learned template for crawl checkpoints.
+        Returns:
+            dict: Learner state
+        """
+        return {
+            'hashing': self.hashing,
+            'observed_pages': self.observed_pages,
+            'block_counts': dict(self.block_counts),
+            'template': sorted(self.template) if self.learned else None
+        }
+
+    def load_state(self, state):
+        """
+        Restores a state serialized by to_state.
+        Args:
+            state (dict): Learner state
+        """
+        if state.get('hashing') != self.hashing:
+            return
+        self.observed_pages = state['observed_pages']
+        self.block_counts = Counter(state['block_counts'])
+        self.template = set(state['template']) if state['template'] is not None else None
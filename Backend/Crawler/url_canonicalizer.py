@@ -0,0 +1,101 @@
+from urllib.parse import urlsplit, urlunsplit, urljoin, parse_qsl, urlencode
+from functools import lru_cache
+
+
+class URLCanonicalizer:
+    """
+    Normalizes urls so that different spellings of the same page map to one canonical form.
+    The canonical form is only a key, for deduplication, domain counting and file names. Pages are requested with the url
+    as linked, as a server may not serve every spelling, such as a path without its trailing slash.
+    Args:
+        strip_trailing_slash (bool): Whether to treat '/page/' and '/page' as the same page
+        tracking_params (set): Query parameters that never change page content and are dropped
+        tracking_prefixes (tuple): Prefixes of query parameters to drop, such as 'utm_'
+    """
+    default_ports = {'http': 80, 'https': 443}
+    default_tracking_params = {'gclid', 'dclid', 'fbclid', 'msclkid', 'yclid', 'igshid', 'mc_cid', 'mc_eid',
+                               '_ga', '_gl', '_hsenc', '_hsmi', 'ref_src', 'srsltid'}
+    default_tracking_prefixes = ('utm_',)
+
+    def __init__(self, strip_trailing_slash=True, tracking_params=None, tracking_prefixes=None):
+        self.strip_trailing_slash = strip_trailing_slash
+        self.tracking_params = set(tracking_params) if tracking_params is not None else self.default_tracking_params
+        self.tracking_prefixes = tuple(tracking_prefixes) if tracking_prefixes is not None else self.default_tracking_prefixes
+        # Every href of every page goes through here, so cache per canonicalizer instance
+        self.canonicalize = lru_cache(maxsize=100000)(self._canonicalize)
+
+    def _canonicalize(self, url):
+        """
+        Converts a url to its canonical form.
+        Args:
+            url (str): Absolute url to canonicalize
+        Returns:
+            str: Canonical url, or the stripped input if it is not an http(s) url
+        """
+        url = url.strip()
+        try:
+            parts = urlsplit(url)
+            port = parts.port
+        except ValueError:
+            return url
+        scheme = parts.scheme.lower()
+        if scheme not in self.default_ports or not parts.hostname:
+            return url
+
+        # Lowercase host, drop default port, keep user info
+        netloc = parts.hostname.lower()
+        if port and port != self.default_ports[scheme]:
+            netloc = f'{netloc}:{port}'
+        if parts.username:
+            userinfo = parts.username if parts.password is None else f'{parts.username}:{parts.password}'
+            netloc = f'{userinfo}@{netloc}'
+
+        # Unify trailing slashes
+        path = parts.path or '/'
+        if self.strip_trailing_slash and len(path) > 1:
+            path = path.rstrip('/') or '/'
+
+        # Drop tracking parameters and sort the rest
+        query = ''
+        if parts.query:
+            params = [(key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+                      if not self.is_tracking_param(key)]
+            query = urlencode(sorted(params))
+
+        # Fragments never reach the server
+        return urlunsplit((scheme, netloc, path, query, ''))
+
+    def is_tracking_param(self, key):
+        """
+        Checks whether a query parameter only tracks the visitor.
+        Args:
+            key (str): Query parameter name
+        Returns:
+            bool: True if the parameter should be dropped
+        """
+        key = key.lower()
+        return key in self.tracking_params or key.startswith(self.tracking_prefixes)
+
+    def canonical_link(self, href, page_url):
+        """
+        Resolves the page url declared by <link rel="canonical">, restricted to the host of the page.
+        Args:
+            href (str): Href of the canonical link, as extracted by the HTML parser
+            page_url (str): Url the page was fetched from
+        Returns:
+            str: Canonical url of the page, or None if not declared or pointing to another host
+        """
+        if not href:
+            return None
+        canonical = self.canonicalize(urljoin(page_url, href.strip()))
+        if urlsplit(canonical).netloc != urlsplit(self.canonicalize(page_url)).netloc:
+            return None
+        return canonical
+
+if __name__ == '__main__':
+    canonicalizer = URLCanonicalizer()
+    for url in ['HTTPS://Example.com:443/Page/?b=2&a=1&utm_source=x#top',
+                'https://example.com/Page?a=1&b=2',
+                'http://example.com:8080/',
+                'https://example.com']:
+        print(f'{url} -> {canonicalizer.canonicalize(url)}')
@@ -0,0 +1,290 @@
+import math
+import base64
+import hashlib
+from array import array
+
+
+def url_fingerprint(url):
+    """
+    Hashes a url to a nonzero 64-bit fingerprint.
+    Args:
+        url (str): The url
+    Returns:
+        int: Fingerprint, 0 is reserved for empty slots
+    """
+    return int.from_bytes(hashlib.blake2b(url.encode('utf-8'), digest_size=8).digest(), 'little') or 1
+
+
+class URLFingerprintSet:
+    """
+    Set of urls stored as 64-bit fingerprints in an open-addressing hash table backed by one array, about 16 bytes per url
+    instead of the string and set entry of a Python set. Two urls only collide with a probability of about n^2 / 2^65.
+    Supports add, update, membership tests and len, but not iterating over the urls.
+    Args:
+        urls (iterable): Urls to add
+        capacity (int): Number of urls to allocate room for
+        max_load (float): Share of occupied slots above which the table doubles its size
+    """
+    state_type = 'fingerprints'
+
+    def __init__(self, urls=(), capacity=1024, max_load=0.5):
+        self.max_load = max_load
+        self.count = 0
+        self.allocate(max(16, int(capacity / max_load)))
+        self.update(urls)
+
+    def allocate(self, size):
+        size = 1 << (size - 1).bit_length()  # Power of two, so the slot index is a mask of the fingerprint
+        self.slots = array('Q', bytes(8 * size))
+        self.mask = size - 1
+        self.max_count = int(size * self.max_load)
+
+    def find_slot(self, fingerprint):
+        """
+        Finds the slot holding a fingerprint, or the empty slot it belongs in, by linear probing.
+        """
+        slots, mask = self.slots, self.mask
+        i = fingerprint & mask
+        while True:
+            value = slots[i]
+            if value == fingerprint or value == 0:
+                return i
+            i = (i + 1) & mask
+
+    def add_fingerprint(self, fingerprint):
+        i = self.find_slot(fingerprint)
+        if self.slots[i] == 0:
+            self.slots[i] = fingerprint
+            self.count += 1
+            if self.count > self.max_count:
+                self.grow()
+
+    def grow(self):
+        fingerprints = [value for value in self.slots if value]
+        self.allocate(len(self.slots) * 2)
+        for fingerprint in fingerprints:
+            self.slots[self.find_slot(fingerprint)] = fingerprint
+
+    def add(self, url):
+        self.add_fingerprint(url_fingerprint(url))
+
+    def update(self, urls):
+        for url in urls:
+            self.add_fingerprint(url_fingerprint(url))
+
+    def __contains__(self, url):
+        fingerprint = url_fingerprint(url)
+        slots, mask = self.slots, self.mask
+        i = fingerprint & mask
+        while True:
+            value = slots[i]
+            if value == fingerprint:
+                return True
+            if value == 0:
+                return False
+            i = (i + 1) & mask
+
+    def __len__(self):
+        return self.count
+
+    def memory_size(self):
+        """
+        Returns:
+            int: Bytes allocated for the table
+        """
+        return self.slots.itemsize * len(self.slots)
+
+    def to_state(self):
+        """
+        Serializes the fingerprints for crawl checkpoints, 8 bytes per url before base64 encoding.
+        Returns:
+            dict: Set state
+        """
+        fingerprints = array('Q', (value for value in self.slots if value))
+        return {'type': self.state_type, 'fingerprints': base64.b64encode(fingerprints.tobytes()).decode('ascii')}
+
+    @classmethod
+    def from_state(cls, state):
+        """
+        Restores a set serialized by to_state.
+        Args:
+            state (dict): Set state
+        Returns:
+            URLFingerprintSet: The restored set
+        """
+        fingerprints = array('Q')
+        fingerprints.frombytes(base64.b64decode(state['fingerprints']))
+        url_set = cls(capacity=len(fingerprints))
+        for fingerprint in fingerprints:
+            url_set.add_fingerprint(fingerprint)
+        return url_set
+
+
+class BloomFilter:
+    """
+    Set of urls answering membership tests with a configurable false-positive rate and no false negatives, in about
+    1.44 * log2(1 / error_rate) bits per url. Full layers are kept and a new layer with twice the capacity and half the
+    error rate is added, so the overall false-positive rate stays below twice the configured one however many urls are added.
+    Args:
+        urls (iterable): Urls to add
+        capacity (int): Number of urls the first layer is sized for
+        error_rate (float): False-positive rate of the first layer
+    """
+    state_type = 'bloom'
+
+    def __init__(self, urls=(), capacity=100000, error_rate=0.001):
+        if not 0 < error_rate < 1:
+            raise ValueError('Bloom filter error rate must be between 0 and 1')
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.layers = []  # [bits, bit count, hash count, capacity, count]
+        self.add_layer(capacity, error_rate)
+        self.update(urls)
+
+    def add_layer(self, capacity, error_rate):
+        bit_count = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        hash_count = max(1, round(bit_count / capacity * math.log(2)))
+        self.layers.append([bytearray((bit_count + 7) // 8), bit_count, hash_count, capacity, 0])
+
+    @staticmethod
+    def bit_indexes(fingerprint, bit_count, hash_count):
+        # Double hashing over the two halves of the fingerprint
+        h1, h2 = fingerprint & 0xffffffff, (fingerprint >> 32) | 1
+        return [(h1 + i * h2) % bit_count for i in range(hash_count)]
+
+    def contains_fingerprint(self, fingerprint):
+        h1, h2 = fingerprint & 0xffffffff, (fingerprint >> 32) | 1
+        for bits, bit_count, hash_count, _, _ in self.layers:
+            index = h1
+            for _ in range(hash_count):
+                index %= bit_count
+                if not bits[index >> 3] & (1 << (index & 7)):
+                    break  # Most misses stop at the first unset bit
+                index += h2
+            else:
+                return True
+        return False
+
+    def add_fingerprint(self, fingerprint):
+        if self.contains_fingerprint(fingerprint):
+            return
+        layer = self.layers[-1]
+        if layer[4] >= layer[3]:
+            self.add_layer(layer[3] * 2, self.error_rate * 0.5 ** len(self.layers))
+            layer = self.layers[-1]
+        bits = layer[0]
+        for i in self.bit_indexes(fingerprint, layer[1], layer[2]):
+            bits[i >> 3] |= 1 << (i & 7)
+        layer[4] += 1
+
+    def add(self, url):
+        self.add_fingerprint(url_fingerprint(url))
+
+    def update(self, urls):
+        for url in urls:
+            self.add_fingerprint(url_fingerprint(url))
+
+    def __contains__(self, url):
+        return self.contains_fingerprint(url_fingerprint(url))
+
+    def __len__(self):
+        return sum(layer[4] for layer in self.layers)
+
+    def memory_size(self):
+        """
+        Returns:
+            int: Bytes allocated for the bit arrays
+        """
+        return sum(len(layer[0]) for layer in self.layers)
+
+    def to_state(self):
+        """
+        Serializes the bit arrays for crawl checkpoints.
+        Returns:
+            dict: Filter state
+        """
+        return {
+            'type': self.state_type,
+            'capacity': self.capacity,
+            'error_rate': self.error_rate,
+            'layers': [[base64.b64encode(bits).decode('ascii'), bit_count, hash_count, capacity, count]
+                       for bits, bit_count, hash_count, capacity, count in self.layers]
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        """
+        Restores a filter serialized by to_state.
+        Args:
+            state (dict): Filter state
+        Returns:
+            BloomFilter: The restored filter
+        """
+        bloom = cls(capacity=state['capacity'], error_rate=state['error_rate'])
+        bloom.layers = [[bytearray(base64.b64decode(bits)), bit_count, hash_count, capacity, count]
+                        for bits, bit_count, hash_count, capacity, count in state['layers']]
+        return bloom
+
+
+def create_url_set(error_rate=None, urls=()):
+    """
+    Creates an exact fingerprint set, or a Bloom filter if a false-positive rate is given.
+    Args:
+        error_rate (float): False-positive rate of a Bloom filter, None for a fingerprint set
+        urls (iterable): Urls to add
+    Returns:
+        URLFingerprintSet or BloomFilter: The url set
+    """
+    if error_rate:
+        return BloomFilter(urls, error_rate=error_rate)
+    return URLFingerprintSet(urls)
+
+
+def url_set_from_state(state, error_rate=None):
+    """
+    Restores a url set from a checkpoint, including checkpoints that stored plain url lists.
+    Args:
+        state (dict or list): Serialized url set, or a list of urls
+        error_rate (float): False-positive rate of the Bloom filter for url lists, None for a fingerprint set
+    Returns:
+        URLFingerprintSet or BloomFilter: The url set
+    """
+    if isinstance(state, list):
+        return create_url_set(error_rate, state)
+    url_set_class = {URLFingerprintSet.state_type: URLFingerprintSet, BloomFilter.state_type: BloomFilter}[state['type']]
+    return url_set_class.from_state(state)
+
+
+if __name__ == '__main__':
+    import gc
+    import time
+    import tracemalloc
+
+    # Memory per million urls of the crawl state structures, with urls of typical length
+    url_count = 1000000
+    def make_urls():
+        return (f'https://www.example-university.edu/en/studies/programs/{i}/overview?lang=en' for i in range(url_count))
+
+    for name, factory in [('set of str', lambda: set(make_urls())),
+                          ('URLFingerprintSet', lambda: URLFingerprintSet(make_urls())),
+                          ('BloomFilter 0.1%', lambda: BloomFilter(make_urls(), capacity=url_count, error_rate=0.001)),
+                          ('BloomFilter 1%', lambda: BloomFilter(make_urls(), capacity=url_count, error_rate=0.01))]:
+        gc.collect()
+        tracemalloc.start()
+        url_set = factory()
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        # Timed without tracemalloc, which slows down allocations
+        new_urls = [f'https://www.example-university.edu/en/news/{i}' for i in range(100000)]
+        known_urls = [f'https://www.example-university.edu/en/studies/programs/{i}/overview?lang=en' for i in range(0, url_count, 10)]
+        start = time.perf_counter()
+        misses = sum(1 for url in new_urls if url in url_set)
+        hits = sum(1 for url in known_urls if url in url_set)
+        lookup_ns = (time.perf_counter() - start) * 1e9 / (len(new_urls) + len(known_urls))
+        start = time.perf_counter()
+        url_set.update(new_urls)
+        add_ns = (time.perf_counter() - start) * 1e9 / len(new_urls)
+        print(f'{name:18s} {memory / 2 ** 20:7.1f} MiB per million urls, {add_ns:5.0f} ns/add, {lookup_ns:5.0f} ns/lookup, '
+              f'{hits} of {len(known_urls)} found, {misses / len(new_urls):.2%} false positives')
+        del url_set
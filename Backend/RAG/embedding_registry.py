@@ -0,0 +1,174 @@
+import os
+import time
+import threading
+
+
+class EmbeddingRegistry:
+    """
+    Embedding models shared by all RAG systems and stream indexers of a process. Each model is loaded once, on first use
+    or when warmed up at server start, instead of once per website, and its load time and memory footprint are recorded.
+    """
+    default_model_name = "BAAI/bge-small-en-v1.5"
+    # 'onnx' runs an int8-quantized ONNX export of the models, faster on CPU-only nodes
+    default_backend = os.environ.get('EMBEDDING_BACKEND', 'huggingface')
+    embed_batch_size = 100
+
+    _models = {}  # {(backend, model name): embedding model}
+    _stats = {}  # {(backend, model name): load statistics}
+    _locks = {}  # {(backend, model name): lock}, so concurrent requests load a model once
+    _registry_lock = threading.Lock()
+
+    """
+    ***************
+    *** Loading ***
+    ***************
+    """
+    @classmethod
+    def get(cls, model_name: str = None, backend: str = None):
+        """
+        Gets a shared embedding model, loading it on first use.
+        Args:
+            model_name (str): Name of the HuggingFace embedding model, the default model if None
+            backend (str): Embedding backend running the model, see load_model, the default backend if None
+        Returns:
+            BaseEmbedding: The shared embedding model
+        """
+        key = (backend or cls.default_backend, model_name or cls.default_model_name)
+        model = cls._models.get(key)
+        if model is not None:
+            return model
+        with cls._registry_lock:
+            lock = cls._locks.setdefault(key, threading.Lock())
+        with lock:
+            if key not in cls._models:
+                cls._models[key] = cls.load(*key)
+            return cls._models[key]
+
+    @classmethod
+    def load(cls, backend, model_name):
+        """
+        Loads a model and records its load time and memory footprint.
+        Args:
+            backend (str): Embedding backend
+            model_name (str): Name of the embedding model
+        Returns:
+            BaseEmbedding: The loaded model
+        """
+        print(f"Loading embedding model {model_name} ({backend})...")
+        rss_before = cls.process_rss()
+        start = time.perf_counter()
+        model = cls.load_model(backend, model_name)
+        load_seconds = time.perf_counter() - start
+        rss_after = cls.process_rss()
+        cls._stats[(backend, model_name)] = {
+            'model_name': model_name,
+            'backend': backend,
+            'load_seconds': round(load_seconds, 3),
+            'parameter_bytes': cls.parameter_bytes(model),
+            'rss_increase_bytes': rss_after - rss_before if rss_before is not None and rss_after is not None else None,
+            'loaded_at': time.strftime("%Y-%m-%d %H:%M:%S")
+        }
+        print(f"Loaded embedding model {model_name} in {load_seconds:.1f}s")
+        return model
+
+    @classmethod
+    def load_model(cls, backend, model_name):
+        """
+        Creates the embedding model of a backend.
+        Args:
+            backend (str): 'huggingface' for the PyTorch sentence transformer, 'onnx' for its int8-quantized ONNX export
+            model_name (str): Name of the embedding model
+        Returns:
+            BaseEmbedding: The embedding model
+        """
+        if backend == 'huggingface':
+            from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+            return HuggingFaceEmbedding(model_name=model_name, embed_batch_size=cls.embed_batch_size)
+        if backend == 'onnx':
+            from RAG.onnx_embedding import ONNXEmbedding
+            return ONNXEmbedding.from_model_name(model_name)
+        raise ValueError(f"Unknown embedding backend: {backend}")
+
+    @classmethod
+    def warm_up(cls, model_names: list = None, backend: str = None, background: bool = False):
+        """
+        Loads models ahead of the first query and runs a first embedding, which initializes the model's kernels.
+        Args:
+            model_names (list): Names of the models to load, the default model if None
+            backend (str): Embedding backend, the default backend if None
+            background (bool): Whether to warm up in a background thread, queries wait for models still loading
+        Returns:
+            threading.Thread: The warm-up thread if in background, else None
+        """
+        backend = backend or cls.default_backend
+
+        def warm_up_models():
+            for model_name in model_names or [cls.default_model_name]:
+                try:
+                    model = cls.get(model_name, backend)
+                    start = time.perf_counter()
+                    model.get_text_embedding("warm up")
+                    cls._stats[(backend, model_name)]['first_embedding_seconds'] = round(time.perf_counter() - start, 3)
+                except Exception as e:
+                    print(f"!!! Warming up embedding model {model_name} failed: {e} !!!")
+
+        if not background:
+            warm_up_models()
+            return None
+        thread = threading.Thread(target=warm_up_models, name='embedding-warm-up', daemon=True)
+        thread.start()
+        return thread
+
+    """
+    ******************
+    *** Statistics ***
+    ******************
+    """
+    @classmethod
+    def stats(cls):
+        """
+        Returns:
+            list: Load time and memory footprint of each loaded model
+        """
+        return [dict(stats) for stats in cls._stats.values()]
+
+    @staticmethod
+    def parameter_bytes(model):
+        """
+        Gets the size of the weights of a model.
+        Args:
+            model (BaseEmbedding): The embedding model
+        Returns:
+            int: Bytes of the parameters and buffers or of the ONNX model file, None for other models
+        """
+        if hasattr(model, 'weight_bytes'):
+            return model.weight_bytes()
+        module = getattr(model, '_model', None)
+        try:
+            tensors = list(module.parameters()) + list(module.buffers())
+        except AttributeError:
+            return None
+        return sum(tensor.numel() * tensor.element_size() for tensor in tensors)
+
+    @staticmethod
+    def process_rss():
+        """
+        Returns:
+            int: Resident memory of the process in bytes, None where /proc is not available
+        """
+        try:
+            with open('/proc/self/statm', 'r') as f:
+                return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        except (OSError, ValueError, AttributeError):
+            return None
+
+
+if __name__ == "__main__":
+    # Loading the model a second time, as every website did before, is free
+    for i in range(3):
+        start = time.perf_counter()
+        model = EmbeddingRegistry.get()
+        print(f"get #{i + 1}: {time.perf_counter() - start:.3f}s, model {id(model)}")
+    EmbeddingRegistry.warm_up()
+    for stats in EmbeddingRegistry.stats():
+        print(stats)
@@ -0,0 +1,148 @@
+import os
+import time
+import shutil
+import asyncio
+from os.path import join as pjoin
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+from llama_index.core.base.base_retriever import BaseRetriever
+from llama_index.core.schema import NodeWithScore, QueryBundle
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Retriever combining dense vector search with BM25 keyword search, for questions about product names, course codes or
+    contacts that embeddings often miss. Both searches run concurrently and their rankings are fused by reciprocal rank
+    fusion: each node scores sum(1 / (rrf_k + rank)) over the rankings it appears in, so nodes found by both rank first.
+    The BM25 inverted index is built when the website is indexed and saved in the 'bm25' subdirectory of the index,
+    where it is loaded memory-mapped.
+    Args:
+        vector_retriever (BaseRetriever): Retriever of the vector index
+        keyword_retriever (BM25Retriever): Retriever of the BM25 index
+        similarity_top_k (int): Number of fused nodes returned
+        candidate_top_k (int): Number of nodes retrieved by each search before fusion
+        rrf_k (int): Rank offset of reciprocal rank fusion, higher values weigh lower ranks more evenly with top ranks
+    """
+    keyword_dir_name = 'bm25'
+    _executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='hybrid-retriever')  # Shared by all websites
+
+    def __init__(self, vector_retriever, keyword_retriever, similarity_top_k: int = 3, candidate_top_k: int = 10,
+                 rrf_k: int = 60, **kwargs):
+        super().__init__(**kwargs)
+        self.vector_retriever = vector_retriever
+        self.keyword_retriever = keyword_retriever
+        self.similarity_top_k = similarity_top_k
+        self.rrf_k = rrf_k
+        vector_retriever.similarity_top_k = candidate_top_k
+        # BM25 retrieves at most one result per indexed node
+        keyword_retriever.similarity_top_k = min(candidate_top_k, int(keyword_retriever.bm25.scores['num_docs']))
+
+    @classmethod
+    def from_index(cls, index, persist_dir: str, similarity_top_k: int = 3, candidate_top_k: int = 10, rrf_k: int = 60):
+        """
+        Creates the hybrid retriever of a vector index, loading its saved BM25 index or building it for indexes saved
+        without one.
+        Args:
+            index (VectorStoreIndex): The vector index
+            persist_dir (str): Directory the index is saved to, None to build the BM25 index in memory only
+            similarity_top_k (int): Number of fused nodes returned
+            candidate_top_k (int): Number of nodes retrieved by each search before fusion
+            rrf_k (int): Rank offset of reciprocal rank fusion
+        Returns:
+            BaseRetriever: The hybrid retriever, the vector retriever alone for an index without nodes
+        """
+        keyword_retriever = cls.load_keyword_index(persist_dir) if persist_dir is not None else None
+        if keyword_retriever is None:
+            keyword_retriever = cls.build_keyword_index(index, persist_dir)
+        if keyword_retriever is None:
+            return index.as_retriever(similarity_top_k=similarity_top_k)
+        return cls(index.as_retriever(), keyword_retriever, similarity_top_k, candidate_top_k, rrf_k)
+
+    """
+    *********************
+    *** Keyword index ***
+    *********************
+    """
+    @classmethod
+    def build_keyword_index(cls, index, persist_dir: str = None):
+        """
+        Builds the BM25 inverted index of the nodes of a vector index and saves it next to the index.
+        Args:
+            index (VectorStoreIndex): The vector index
+            persist_dir (str): Directory the index is saved to, the BM25 index is not saved if None
+        Returns:
+            BM25Retriever: Retriever of the BM25 index, None for an index without nodes
+        """
+        from llama_index.retrievers.bm25 import BM25Retriever
+        nodes = list(index.docstore.docs.values())
+        if not nodes:
+            return None
+        start = time.perf_counter()
+        keyword_retriever = BM25Retriever.from_defaults(nodes=nodes)
+        if persist_dir is not None:
+            keyword_dir = pjoin(persist_dir, cls.keyword_dir_name)
+            shutil.rmtree(keyword_dir, ignore_errors=True)
+            keyword_retriever.persist(keyword_dir)
+        print(f"Built BM25 index of {len(nodes)} chunks in {time.perf_counter() - start:.1f}s")
+        return keyword_retriever
+
+    @classmethod
+    def load_keyword_index(cls, persist_dir: str):
+        """
+        Loads a saved BM25 index, memory-mapping its postings and chunks.
+        Args:
+            persist_dir (str): Directory the index is saved to
+        Returns:
+            BM25Retriever: Retriever of the BM25 index, None if there is none
+        """
+        keyword_dir = pjoin(persist_dir, cls.keyword_dir_name)
+        if not os.path.exists(keyword_dir):
+            return None
+        from llama_index.retrievers.bm25 import BM25Retriever
+        return BM25Retriever.from_persist_dir(keyword_dir, mmap=True)
+
+    """
+    *****************
+    *** Retrieval ***
+    *****************
+    """
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        # Embedding the query and the BM25 scoring release the GIL for most of their time
+        vector_future = self._executor.submit(self.vector_retriever.retrieve, query_bundle)
+        keyword_nodes = self.keyword_retrieve(query_bundle)
+        return self.fuse([vector_future.result(), keyword_nodes])
+
+    async def _aretrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        vector_nodes, keyword_nodes = await asyncio.gather(
+            self.vector_retriever.aretrieve(query_bundle),
+            asyncio.get_running_loop().run_in_executor(self._executor, self.keyword_retrieve, query_bundle))
+        return self.fuse([vector_nodes, keyword_nodes])
+
+    def keyword_retrieve(self, query_bundle: QueryBundle):
+        """
+        Retrieves the nodes matching keywords of the query, the question embedded for the vector search rather than the
+        full prompt if it is set.
+        Args:
+            query_bundle (QueryBundle): The query
+        Returns:
+            list: Nodes with a BM25 score, best first, BM25 fills the top k with unmatched nodes otherwise
+        """
+        nodes = self.keyword_retriever.retrieve(QueryBundle(' '.join(query_bundle.embedding_strs)))
+        return [node for node in nodes if node.score > 0]
+
+    def fuse(self, rankings):
+        """
+        Fuses rankings by reciprocal rank fusion.
+        Args:
+            rankings (list): Lists of retrieved nodes, best first
+        Returns:
+            list: The similarity_top_k nodes of highest fused score, with the fused score
+        """
+        scores, nodes = {}, {}
+        for ranking in rankings:
+            for rank, node in enumerate(ranking, 1):
+                node_id = node.node.node_id
+                scores[node_id] = scores.get(node_id, 0.0) + 1.0 / (self.rrf_k + rank)
+                nodes.setdefault(node_id, node.node)
+        top_ids = sorted(scores, key=scores.get, reverse=True)[:self.similarity_top_k]
+        return [NodeWithScore(node=nodes[node_id], score=scores[node_id]) for node_id in top_ids]
@@ -0,0 +1,135 @@
+import numpy as np
+
+
+class IVFIndex:
+    """
+    Inverted file index for approximate nearest-neighbor search over normalized embeddings.
+    The embeddings are clustered by spherical k-means into lists, and the rows of the embedding matrix are stored grouped
+    by list, so each list is a contiguous slice of the matrix and the index itself is only the centroids and list offsets.
+    A query scores the centroids and scans the rows of the ann_probes nearest lists instead of the whole matrix: more probes
+    give a higher recall at a higher latency, probing all lists is exact search.
+    Args:
+        centroids (np.ndarray): Normalized list centroids, one per row
+        offsets (np.ndarray): First matrix row of each list, followed by the row count
+        trained_rows (int): Number of rows the centroids were trained on
+    """
+    sample_per_list = 32  # Training rows per list, k-means converges on a sample
+    iterations = 10
+    block_rows = 65536  # Rows assigned to lists at once
+
+    def __init__(self, centroids, offsets, trained_rows):
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.trained_rows = int(trained_rows)
+
+    @property
+    def list_count(self):
+        return len(self.centroids)
+
+    @staticmethod
+    def default_list_count(row_count):
+        """
+        Returns:
+            int: Number of lists for a matrix, about 2 * sqrt(rows) keeps both the centroid scan and the lists short
+        """
+        return max(1, int(2 * np.sqrt(row_count)))
+
+    """
+    ****************
+    *** Building ***
+    ****************
+    """
+    @classmethod
+    def train(cls, sample, list_count, seed=0):
+        """
+        Clusters a sample of normalized embeddings by spherical k-means, where rows belong to the centroid of highest cosine.
+        Args:
+            sample (np.ndarray): Normalized float32 embeddings
+            list_count (int): Number of lists
+            seed (int): Seed of the initial centroids
+        Returns:
+            np.ndarray: Normalized centroids
+        """
+        rng = np.random.default_rng(seed)
+        list_count = min(list_count, len(sample))
+        centroids = sample[rng.choice(len(sample), list_count, replace=False)].copy()
+        for _ in range(cls.iterations):
+            labels = cls.assign(centroids, sample)
+            counts = np.bincount(labels, minlength=list_count)
+            # Sums of the rows of each list, over the sample sorted by list
+            order = np.argsort(labels, kind='stable')
+            starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+            sums = np.zeros_like(centroids)
+            filled = counts > 0
+            sums[filled] = np.add.reduceat(sample[order], starts[filled], axis=0)
+            # Empty lists restart at random sample rows
+            empty = np.flatnonzero(counts == 0)
+            sums[empty] = sample[rng.choice(len(sample), len(empty), replace=False)]
+            centroids = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-12)
+        return centroids.astype(np.float32)
+
+    @classmethod
+    def assign(cls, centroids, vectors):
+        """
+        Args:
+            centroids (np.ndarray): Normalized centroids
+            vectors (np.ndarray): Embeddings
+        Returns:
+            np.ndarray: List of each embedding, the one of highest cosine
+        """
+        labels = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), cls.block_rows):
+            block = np.asarray(vectors[start:start + cls.block_rows], dtype=np.float32)
+            labels[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+        return labels
+
+    @classmethod
+    def from_labels(cls, centroids, labels, trained_rows):
+        """
+        Groups rows by their list.
+        Args:
+            centroids (np.ndarray): Normalized centroids
+            labels (np.ndarray): List of each row
+            trained_rows (int): Number of rows the centroids were trained on
+        Returns:
+            tuple: (IVFIndex, order of the rows in the grouped matrix)
+        """
+        order = np.argsort(labels, kind='stable')
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(labels, minlength=len(centroids)))])
+        return cls(centroids, offsets, trained_rows), order
+
+    """
+    ****************
+    *** Querying ***
+    ****************
+    """
+    def probe(self, query_vector, probes):
+        """
+        Finds the lists nearest to a query.
+        Args:
+            query_vector (np.ndarray): Normalized float32 query embedding
+            probes (int): Number of lists to scan
+        Returns:
+            list: Matrix row ranges (start, end) of the nearest lists
+        """
+        scores = self.centroids @ query_vector
+        if probes < self.list_count:
+            lists = np.argpartition(-scores, probes - 1)[:probes]
+        else:
+            lists = np.arange(self.list_count)
+        # In matrix order, so the scan reads the memory-mapped file forward
+        return [(self.offsets[i], self.offsets[i + 1]) for i in np.sort(lists) if self.offsets[i + 1] > self.offsets[i]]
+
+    """
+    ******************
+    *** Persisting ***
+    ******************
+    """
+    def save(self, path):
+        with open(path, 'wb') as f:
+            np.savez(f, centroids=self.centroids, offsets=self.offsets, trained_rows=np.int64(self.trained_rows))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data['centroids'], data['offsets'], int(data['trained_rows']))
@@ -0,0 +1,472 @@
+import os
+import json
+from os.path import join as pjoin, dirname
+from typing import Any, ClassVar, List, Optional
+import numpy as np
+from llama_index.core.bridge.pydantic import Field, PrivateAttr
+from llama_index.core.vector_stores.types import (
+    BasePydanticVectorStore,
+    VectorStoreQuery,
+    VectorStoreQueryMode,
+    VectorStoreQueryResult,
+)
+from RAG.ivf_index import IVFIndex
+
+
+class MmapVectorStore(BasePydanticVectorStore):
+    """
+    Vector store persisting the embeddings as one contiguous float32 or float16 matrix (vectors.npy) and their node and
+    document ids as a compact table (vector_ids.json), next to the docstore of the index.
+    A saved store is loaded by memory-mapping the matrix instead of parsing JSON floats into Python lists, so loading is
+    instant, only the pages of the matrix touched by searches are read, and server processes share them in the page cache.
+    Embeddings are normalized when added, so the cosine similarities of a query are one matrix-vector product.
+    Nodes added or deleted after loading are kept in memory until the store is persisted again.
+    Stores of at least ann_min_rows vectors are saved with an IVF index (ivf_index.npz, see IVFIndex) and searched
+    approximately by scanning the ann_probes lists nearest to the query, smaller stores are always searched exactly.
+    Args:
+        dtype (str): 'float32', or 'float16' to halve the size of the matrix, for new stores
+        ann_min_rows (int): Number of vectors from which an IVF index is built when persisting, None to never build one
+        ann_lists (int): Number of IVF lists, about 2 * sqrt(vectors) if None
+        ann_probes (int): Number of IVF lists scanned per query, higher for better recall at a higher latency
+    """
+    stores_text: bool = False
+    vectors_file_name: ClassVar[str] = 'vectors.npy'
+    ids_file_name: ClassVar[str] = 'vector_ids.json'
+    json_file_name: ClassVar[str] = 'default__vector_store.json'  # Vectors saved by SimpleVectorStore
+    ann_file_name: ClassVar[str] = 'ivf_index.npz'
+    search_block_rows: ClassVar[int] = 65536  # Rows converted to float32 at once when searching float16 matrices
+
+    _matrix: Any = PrivateAttr()  # Persisted rows, memory-mapped
+    _pending: list = PrivateAttr()  # Blocks of rows added since loading
+    _pending_matrix: Any = PrivateAttr()
+    _node_ids: list = PrivateAttr()
+    _ref_doc_ids: list = PrivateAttr()
+    _deleted: Any = PrivateAttr()
+    _rows_by_doc: dict = PrivateAttr()
+    _dtype: Any = PrivateAttr()
+    _ivf: Any = PrivateAttr()  # IVF index of the persisted rows
+
+    ann_min_rows: Optional[int] = Field(default=20000, description="Number of vectors from which an IVF index is built")
+    ann_lists: Optional[int] = Field(default=None, description="Number of IVF lists")
+    ann_probes: int = Field(default=32, description="Number of IVF lists scanned per query")
+
+    def __init__(self, dtype: str = 'float32', **kwargs):
+        super().__init__(**kwargs)
+        self._dtype = np.dtype(dtype)
+        self.clear()
+
+    def clear(self) -> None:
+        self._matrix = None
+        self._pending = []
+        self._pending_matrix = None
+        self._node_ids = []
+        self._ref_doc_ids = []
+        self._deleted = np.zeros(0, dtype=bool)
+        self._rows_by_doc = {}
+        self._ivf = None
+
+    @classmethod
+    def exists(cls, persist_dir: str) -> bool:
+        """
+        Args:
+            persist_dir (str): Directory of a saved index
+        Returns:
+            bool: Whether the index was saved with a memory-mapped vector store
+        """
+        return os.path.exists(pjoin(persist_dir, cls.ids_file_name))
+
+    @classmethod
+    def from_persist_dir(cls, persist_dir: str, **kwargs):
+        """
+        Loads a saved store, memory-mapping its matrix read-only.
+        Args:
+            persist_dir (str): Directory of the saved index
+            kwargs: Further arguments of MmapVectorStore, such as ann_probes
+        Returns:
+            MmapVectorStore: The loaded store
+        """
+        store = cls(**kwargs)
+        store.load(persist_dir)
+        return store
+
+    def load(self, persist_dir: str):
+        """
+        Replaces the content of the store with a saved store.
+        Args:
+            persist_dir (str): Directory of the saved index
+        """
+        with open(pjoin(persist_dir, self.ids_file_name), 'r', encoding='utf-8') as f:
+            ids = json.load(f)
+        matrix = np.load(pjoin(persist_dir, self.vectors_file_name), mmap_mode='r')
+        if matrix.shape[0] != len(ids['node_ids']):
+            raise ValueError(f"Vector store in {persist_dir} has {matrix.shape[0]} vectors for {len(ids['node_ids'])} ids")
+        # Document ids are stored once, rows refer to them by position
+        documents = ids['documents']
+        ref_doc_ids = [documents[i] for i in ids['document_rows']]
+        rows_by_doc = {}
+        for row, ref_doc_id in enumerate(ref_doc_ids):
+            rows_by_doc.setdefault(ref_doc_id, []).append(row)
+        ann_path = pjoin(persist_dir, self.ann_file_name)
+        ivf = IVFIndex.load(ann_path) if ids.get('ann') and os.path.exists(ann_path) else None
+        if ivf is not None and ivf.offsets[-1] != matrix.shape[0]:
+            ivf = None  # Saved for another version of the matrix
+
+        self.clear()
+        self._dtype = matrix.dtype
+        self._matrix = matrix
+        self._node_ids = ids['node_ids']
+        self._ref_doc_ids = ref_doc_ids
+        self._deleted = np.zeros(len(ref_doc_ids), dtype=bool)
+        self._rows_by_doc = rows_by_doc
+        self._ivf = ivf
+
+    @classmethod
+    def from_vector_store(cls, vector_store, **kwargs):
+        """
+        Converts a SimpleVectorStore, as saved to JSON by earlier versions, into a memory-mapped store.
+        Args:
+            vector_store (SimpleVectorStore): The store to convert
+            kwargs: Further arguments of MmapVectorStore, such as dtype
+        Returns:
+            MmapVectorStore: The store with the same vectors, kept in memory until persisted
+        """
+        store = cls(**kwargs)
+        data = vector_store.data
+        node_ids = list(data.embedding_dict)
+        if node_ids:
+            store.add_vectors(node_ids, [data.text_id_to_ref_doc_id.get(node_id) for node_id in node_ids],
+                              [data.embedding_dict[node_id] for node_id in node_ids])
+        return store
+
+    @classmethod
+    def load_storage_context(cls, persist_dir: str, **kwargs):
+        """
+        Loads the storage of a saved index with its vectors memory-mapped. Indexes saved with the JSON vectors of
+        SimpleVectorStore are converted once, their docstore and index store are kept as they are.
+        Args:
+            persist_dir (str): Directory of the saved index
+            kwargs: Further arguments of MmapVectorStore, such as ann_probes
+        Returns:
+            StorageContext: Storage context for load_index_from_storage
+        """
+        from llama_index.core import StorageContext
+        if not cls.exists(persist_dir):
+            json_path = pjoin(persist_dir, cls.json_file_name)
+            if os.path.exists(json_path):
+                from llama_index.core.vector_stores import SimpleVectorStore
+                print(f"Converting vectors of {json_path} to {cls.vectors_file_name}...")
+                cls.from_vector_store(SimpleVectorStore.from_persist_path(json_path), **kwargs).persist(json_path)
+                os.remove(json_path)
+        return StorageContext.from_defaults(persist_dir=persist_dir, vector_store=cls.from_persist_dir(persist_dir, **kwargs))
+
+    @classmethod
+    def new_storage_context(cls, **kwargs):
+        """
+        Args:
+            kwargs: Arguments of MmapVectorStore, such as dtype
+        Returns:
+            StorageContext: Storage context for a new index, persisted with a memory-mapped vector store
+        """
+        from llama_index.core import StorageContext
+        return StorageContext.from_defaults(vector_store=cls(**kwargs))
+
+    @property
+    def client(self) -> Any:
+        return None
+
+    @property
+    def vector_count(self):
+        # Not __len__, StorageContext tests vector stores for truth and would replace an empty one
+        return len(self._node_ids) - int(self._deleted.sum())
+
+    @property
+    def dim(self):
+        if self._matrix is not None and self._matrix.shape[0]:
+            return self._matrix.shape[1]
+        return self._pending[0].shape[1] if self._pending else None
+
+    """
+    ****************
+    *** Updating ***
+    ****************
+    """
+    def add(self, nodes: List[Any], **add_kwargs: Any) -> List[str]:
+        """
+        Adds nodes with embeddings.
+        Args:
+            nodes (list): Nodes with their embeddings set
+        Returns:
+            list: Ids of the added nodes
+        """
+        if nodes:
+            self.add_vectors([node.node_id for node in nodes], [node.ref_doc_id for node in nodes],
+                             [node.get_embedding() for node in nodes])
+        return [node.node_id for node in nodes]
+
+    def add_vectors(self, node_ids: List[str], ref_doc_ids: List[str], embeddings: List[List[float]]):
+        """
+        Appends a block of normalized rows.
+        Args:
+            node_ids (list): Ids of the nodes
+            ref_doc_ids (list): Ids of the documents of the nodes
+            embeddings (list): Embeddings of the nodes
+        """
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        first_row = len(self._node_ids)
+        self._pending.append(vectors.astype(self._dtype))
+        self._pending_matrix = None
+        self._node_ids.extend(node_ids)
+        self._ref_doc_ids.extend(ref_doc_ids)
+        rows_by_doc = self._rows_by_doc
+        for row, ref_doc_id in enumerate(ref_doc_ids, first_row):
+            rows_by_doc.setdefault(ref_doc_id, []).append(row)
+        row_count = first_row + len(node_ids)
+        if len(self._deleted) < row_count:
+            # Grown by doubling, so adding nodes in small batches stays linear
+            self._deleted = np.concatenate([self._deleted, np.zeros(max(row_count, 2 * len(self._deleted)) - len(self._deleted), dtype=bool)])
+
+    def delete(self, ref_doc_id: str, **delete_kwargs: Any) -> None:
+        """
+        Deletes the nodes of a document, their rows are dropped when the store is persisted.
+        Args:
+            ref_doc_id (str): Id of the document
+        """
+        for row in self._rows_by_doc.pop(ref_doc_id, []):
+            self._deleted[row] = True
+
+    """
+    *****************
+    *** Searching ***
+    *****************
+    """
+    def query(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        """
+        Finds the nodes most similar to the query embedding by cosine similarity, approximately if the store has an IVF
+        index and the query is not restricted to nodes or documents.
+        Args:
+            query (VectorStoreQuery): The query, with its embedding, top k and optional node or document id restrictions
+        Returns:
+            VectorStoreQueryResult: Ids and similarities of the top nodes, most similar first
+        """
+        if query.mode != VectorStoreQueryMode.DEFAULT:
+            raise ValueError(f"Invalid query mode: {query.mode}")
+        if query.filters is not None:
+            raise ValueError("Metadata filters are not supported by MmapVectorStore, use node_ids or doc_ids")
+        if query.query_embedding is None or not self.vector_count:
+            return VectorStoreQueryResult(similarities=[], ids=[])
+
+        query_vector = np.asarray(query.query_embedding, dtype=np.float32)
+        query_vector /= max(float(np.linalg.norm(query_vector)), 1e-12)
+        restricted = query.node_ids is not None or query.doc_ids is not None
+        rows = None
+        if self._ivf is not None and not restricted and self.ann_probes < self._ivf.list_count:
+            rows, scores = self.ann_similarities(query_vector)
+            scores[self._deleted[rows]] = -np.inf
+            if int(np.isfinite(scores).sum()) < query.similarity_top_k:
+                rows = None  # Too few rows in the probed lists, search exactly
+        if rows is None:
+            scores = self.similarities(query_vector)
+            excluded = self._deleted[:len(scores)].copy()
+            if restricted:
+                allowed = np.zeros(len(scores), dtype=bool)
+                node_ids = set(query.node_ids or [])
+                allowed[[row for row, node_id in enumerate(self._node_ids) if node_id in node_ids]] = True
+                rows_by_doc = self._rows_by_doc
+                for ref_doc_id in query.doc_ids or []:
+                    allowed[rows_by_doc.get(ref_doc_id, [])] = True
+                excluded |= ~allowed
+            scores[excluded] = -np.inf
+
+        top = self.top_rows(scores, min(query.similarity_top_k, int(np.isfinite(scores).sum())))
+        top_rows = top if rows is None else rows[top]
+        return VectorStoreQueryResult(similarities=[float(scores[i]) for i in top],
+                                      ids=[self._node_ids[row] for row in top_rows])
+
+    def similarities(self, query_vector):
+        """
+        Computes the cosine similarity of the query to every row, persisted rows first, in blocks for float16 matrices.
+        Args:
+            query_vector (np.ndarray): Normalized float32 query embedding
+        Returns:
+            np.ndarray: Similarity of each row
+        """
+        parts = []
+        if self._matrix is not None:
+            if self._matrix.dtype == np.float32:
+                parts.append(self._matrix @ query_vector)
+            else:
+                for start in range(0, self._matrix.shape[0], self.search_block_rows):
+                    parts.append(self._matrix[start:start + self.search_block_rows].astype(np.float32) @ query_vector)
+        if self._pending:
+            parts.append(self.pending_matrix().astype(np.float32, copy=False) @ query_vector)
+        return np.concatenate(parts) if parts else np.zeros(0, dtype=np.float32)
+
+    def ann_similarities(self, query_vector):
+        """
+        Computes the cosine similarity of the query to the rows of its nearest IVF lists and to the rows added since loading.
+        Args:
+            query_vector (np.ndarray): Normalized float32 query embedding
+        Returns:
+            tuple: (rows, similarity of each row)
+        """
+        rows, scores = [], []
+        for start, end in self._ivf.probe(query_vector, self.ann_probes):
+            rows.append(np.arange(start, end))
+            scores.append(np.asarray(self._matrix[start:end], dtype=np.float32) @ query_vector)
+        if self._pending:
+            pending = self.pending_matrix()
+            rows.append(np.arange(self._matrix.shape[0], self._matrix.shape[0] + len(pending)))
+            scores.append(pending.astype(np.float32, copy=False) @ query_vector)
+        if not rows:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        return np.concatenate(rows), np.concatenate(scores)
+
+    def rows(self, rows):
+        """
+        Args:
+            rows (np.ndarray): Rows of the store, persisted rows first
+        Returns:
+            np.ndarray: Their vectors, in the dtype of the store
+        """
+        persisted_rows = self._matrix.shape[0] if self._matrix is not None else 0
+        vectors = np.empty((len(rows), self.dim), dtype=self._dtype)
+        old = rows < persisted_rows
+        if old.any():
+            vectors[old] = self._matrix[rows[old]]
+        if not old.all():
+            vectors[~old] = self.pending_matrix()[rows[~old] - persisted_rows]
+        return vectors
+
+    def pending_matrix(self):
+        """
+        Returns:
+            np.ndarray: Rows added since loading, in the dtype of the store
+        """
+        if self._pending_matrix is None:
+            self._pending_matrix = np.vstack(self._pending)
+            self._pending = [self._pending_matrix]
+        return self._pending_matrix
+
+    @staticmethod
+    def top_rows(scores, top_k):
+        """
+        Returns:
+            np.ndarray: Rows of the top_k highest scores, highest first, without sorting all scores
+        """
+        if top_k <= 0:
+            return np.zeros(0, dtype=np.int64)
+        if top_k < len(scores):
+            candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+        else:
+            candidates = np.arange(len(scores))
+        return candidates[np.argsort(-scores[candidates], kind='stable')]
+
+    """
+    ******************
+    *** Persisting ***
+    ******************
+    """
+    def persist(self, persist_path: str, fs: Any = None) -> None:
+        """
+        Saves the matrix without deleted rows and the id table to the directory of persist_path, which StorageContext
+        derives from its persist_dir, and an IVF index for large stores. The matrix is written before the ids, a store is
+        only complete once both exist. The store then continues with the saved matrix memory-mapped.
+        Args:
+            persist_path (str): Path StorageContext.persist gives the vector store, its directory is used
+            fs: Unsupported, only local directories are supported
+        """
+        persist_dir = dirname(persist_path)
+        os.makedirs(persist_dir, exist_ok=True)
+        kept_rows = np.flatnonzero(~self._deleted[:len(self._node_ids)])
+        ivf = None
+        if self.ann_min_rows is not None and len(kept_rows) >= self.ann_min_rows:
+            ivf, order = self.build_ann_index(kept_rows)
+            kept_rows = kept_rows[order]  # Grouped by IVF list
+        ann_path = pjoin(persist_dir, self.ann_file_name)
+        if ivf is not None:
+            ivf.save(ann_path)
+        elif os.path.exists(ann_path):
+            os.remove(ann_path)
+
+        dim = self.dim or 0
+        vectors_path = pjoin(persist_dir, self.vectors_file_name)
+        matrix = np.lib.format.open_memmap(vectors_path + '.tmp', mode='w+', dtype=self._dtype, shape=(len(kept_rows), dim))
+        for start in range(0, len(kept_rows), self.search_block_rows):
+            rows = kept_rows[start:start + self.search_block_rows]
+            matrix[start:start + len(rows)] = self.rows(rows)
+        matrix.flush()
+        del matrix
+
+        node_ids, ref_doc_ids = self._node_ids, self._ref_doc_ids
+        documents, document_rows, document_index = [], [], {}
+        for row in kept_rows.tolist():
+            ref_doc_id = ref_doc_ids[row]
+            if ref_doc_id not in document_index:
+                document_index[ref_doc_id] = len(documents)
+                documents.append(ref_doc_id)
+            document_rows.append(document_index[ref_doc_id])
+        ids_path = pjoin(persist_dir, self.ids_file_name)
+        with open(ids_path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump({'dtype': self._dtype.name, 'dim': dim, 'node_ids': [node_ids[row] for row in kept_rows.tolist()],
+                       'documents': documents, 'document_rows': document_rows, 'ann': ivf is not None}, f, separators=(',', ':'))
+        os.replace(vectors_path + '.tmp', vectors_path)
+        os.replace(ids_path + '.tmp', ids_path)
+        # Row numbers changed with the grouping and the dropped rows
+        self.load(persist_dir)
+
+    def build_ann_index(self, kept_rows):
+        """
+        Builds the IVF index of the rows to persist. The centroids of the loaded index are kept until the store has doubled,
+        so persisting a growing store regularly only assigns rows to lists.
+        Args:
+            kept_rows (np.ndarray): Rows to persist
+        Returns:
+            tuple: (IVFIndex, order of the rows grouped by list)
+        """
+        if self._ivf is not None and len(kept_rows) <= 2 * self._ivf.trained_rows and self._ivf.centroids.shape[1] == self.dim:
+            centroids, trained_rows = self._ivf.centroids, self._ivf.trained_rows
+        else:
+            list_count = self.ann_lists or IVFIndex.default_list_count(len(kept_rows))
+            sample_size = min(len(kept_rows), list_count * IVFIndex.sample_per_list)
+            sample_rows = np.sort(np.random.default_rng(0).choice(kept_rows, sample_size, replace=False))
+            print(f"Training IVF index with {list_count} lists on {sample_size} of {len(kept_rows)} vectors...")
+            centroids = IVFIndex.train(self.rows(sample_rows).astype(np.float32), list_count)
+            trained_rows = len(kept_rows)
+        labels = np.concatenate([IVFIndex.assign(centroids, self.rows(kept_rows[start:start + self.search_block_rows]))
+                                 for start in range(0, len(kept_rows), self.search_block_rows)])
+        return IVFIndex.from_labels(centroids, labels, trained_rows)
+
+if __name__ == "__main__":
+    import sys
+    import time
+    import tempfile
+
+    # Loading and searching 200k chunks, exactly and with the IVF index: cd Backend && python -m RAG.mmap_vector_store 200000
+    count, dim = int(sys.argv[1]) if len(sys.argv) > 1 else 200000, 384
+    rng = np.random.default_rng(0)
+    topics = rng.standard_normal((count // 50, dim), dtype=np.float32)  # Chunks of a site cluster around its topics
+    store = MmapVectorStore()
+    for start in range(0, count, 10000):
+        vectors = topics[rng.integers(0, len(topics), min(10000, count - start))]
+        vectors += rng.standard_normal(vectors.shape, dtype=np.float32)
+        store.add_vectors([f'node-{start + i}' for i in range(len(vectors))], [f'page-{(start + i) // 10}' for i in range(len(vectors))], vectors)
+    queries = [(topic + rng.standard_normal(dim, dtype=np.float32)).tolist() for topic in topics[:50]]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        start = time.perf_counter()
+        store.persist(pjoin(tmp_dir, 'default__vector_store.json'))
+        print(f"Saved {count} vectors in {time.perf_counter() - start:.1f}s")
+        del store
+        start = time.perf_counter()
+        loaded = MmapVectorStore.from_persist_dir(tmp_dir)
+        print(f"Loaded {loaded.vector_count} vectors in {(time.perf_counter() - start) * 1000:.1f} ms")
+        exact = []
+        for probes in [loaded.ann_probes * 100000, 8, 16, 32, 64]:  # Probing all lists is exact search
+            loaded.ann_probes = probes
+            start = time.perf_counter()
+            results = [set(loaded.query(VectorStoreQuery(query_embedding=query, similarity_top_k=10)).ids) for query in queries]
+            elapsed = (time.perf_counter() - start) / len(queries)
+            exact = exact or results
+            recall = np.mean([len(result & truth) / 10 for result, truth in zip(results, exact)])
+            print(f"{'exact' if results is exact else f'{probes} probes':10s} {elapsed * 1000:6.2f} ms/query, recall@10 {recall:.3f}")
+        del loaded
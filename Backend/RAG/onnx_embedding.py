@@ -0,0 +1,197 @@
+import os
+import json
+from os.path import join as pjoin
+from typing import Any, ClassVar, List
+import numpy as np
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.bridge.pydantic import Field, PrivateAttr
+
+
+bge_query_instruction = "Represent this question for searching relevant passages: "
+
+
+def export_onnx_model(model_name: str, output_dir: str, quantize: bool = True):
+    """
+    Exports a HuggingFace embedding model to ONNX and quantizes its weights to int8, once per model.
+    Needs PyTorch and transformers, the exported model runs with ONNX Runtime alone.
+    Args:
+        model_name (str): Name of the HuggingFace embedding model
+        output_dir (str): Directory to save the model, its tokenizer and its config to
+        quantize (bool): Whether to quantize the weights of linear layers to int8
+    Returns:
+        str: The output directory
+    """
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+    os.makedirs(output_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name).eval()
+
+    inputs = tokenizer(["Export the embedding model"], return_tensors='pt')
+    input_names = [name for name in ('input_ids', 'attention_mask', 'token_type_ids') if name in inputs]
+    dynamic_axes = {name: {0: 'batch', 1: 'sequence'} for name in input_names + ['last_hidden_state']}
+    fp32_path = pjoin(output_dir, 'model.onnx')
+    print(f"Exporting {model_name} to {fp32_path}...")
+    with torch.no_grad():
+        torch.onnx.export(model, ({name: inputs[name] for name in input_names},), fp32_path, input_names=input_names,
+                          output_names=['last_hidden_state'], dynamic_axes=dynamic_axes, opset_version=17)
+
+    model_file = 'model.onnx'
+    if quantize:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        # Weights are stored as int8 and activations quantized on the fly, no calibration data needed
+        quantize_dynamic(fp32_path, pjoin(output_dir, 'model_int8.onnx'), weight_type=QuantType.QInt8)
+        model_file = 'model_int8.onnx'
+    tokenizer.save_pretrained(output_dir)
+
+    with open(pjoin(output_dir, ONNXEmbedding.config_file_name), 'w', encoding='utf-8') as f:
+        json.dump({
+            'model_name': model_name,
+            'model_file': model_file,
+            'input_names': input_names,
+            'pooling': pooling_mode(model_name),
+            'max_length': min(tokenizer.model_max_length, 512)
+        }, f, indent=2)
+    return output_dir
+
+
+def pooling_mode(model_name: str):
+    """
+    Gets the pooling of a sentence transformer from its pooling config, CLS pooling for BGE models if it is unavailable.
+    Args:
+        model_name (str): Name of the HuggingFace embedding model
+    Returns:
+        str: 'cls' or 'mean'
+    """
+    try:
+        from huggingface_hub import hf_hub_download
+        with open(hf_hub_download(model_name, '1_Pooling/config.json'), 'r', encoding='utf-8') as f:
+            return 'cls' if json.load(f).get('pooling_mode_cls_token') else 'mean'
+    except Exception:
+        return 'cls' if 'bge' in model_name.lower() else 'mean'
+
+
+class ONNXEmbedding(BaseEmbedding):
+    """
+    CPU embedding model running an ONNX export of a HuggingFace sentence transformer with ONNX Runtime, by default with
+    int8-quantized weights. The texts of each embedding call are sorted by token length, so every inference batch is only
+    padded to similar lengths, and the inference batch size follows the number of threads, so each thread gets enough rows.
+    Embeddings are CLS or mean pooled and normalized like HuggingFaceEmbedding's, so both backends can share an index.
+    Args:
+        model_dir (str): Directory of the exported model, see export_onnx_model
+        threads (int): Number of ONNX Runtime threads, all cores if None
+        batch_size (int): Number of texts per inference call, 8 per thread up to 128 if None
+        embed_batch_size (int): Number of texts sorted by length together, as llama-index passes them per call
+        query_instruction (str): Prefix of queries, the BGE retrieval instruction for English BGE models if None
+    """
+    config_file_name: ClassVar[str] = 'onnx_config.json'
+    models_dir: ClassVar[str] = './Output/models'
+
+    model_dir: str = Field(description="Directory of the exported ONNX model")
+    threads: int = Field(default=1, description="Number of ONNX Runtime threads")
+    batch_size: int = Field(default=8, description="Number of texts per inference call")
+    query_instruction: str = Field(default="", description="Prefix of queries")
+    _session: Any = PrivateAttr()
+    _tokenizer: Any = PrivateAttr()
+    _config: dict = PrivateAttr()
+
+    def __init__(self, model_dir: str, threads: int = None, batch_size: int = None, embed_batch_size: int = 1024,
+                 query_instruction: str = None, **kwargs):
+        import onnxruntime
+        from tokenizers import Tokenizer
+        with open(pjoin(model_dir, self.config_file_name), 'r', encoding='utf-8') as f:
+            config = json.load(f)
+        threads = threads or os.cpu_count() or 1
+        if query_instruction is None:
+            name = config['model_name'].lower()
+            query_instruction = bge_query_instruction if 'bge' in name and '-en' in name else ""
+        super().__init__(model_name=config['model_name'], model_dir=model_dir, threads=threads, batch_size=batch_size or min(128, 8 * threads),
+                         embed_batch_size=embed_batch_size, query_instruction=query_instruction, **kwargs)
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self._session = onnxruntime.InferenceSession(pjoin(model_dir, config['model_file']), options, providers=['CPUExecutionProvider'])
+        self._tokenizer = Tokenizer.from_file(pjoin(model_dir, 'tokenizer.json'))
+        self._tokenizer.enable_truncation(max_length=config['max_length'])
+        self._tokenizer.no_padding()  # Batches are padded after sorting by length
+        self._config = config
+
+    @classmethod
+    def from_model_name(cls, model_name: str, quantize: bool = True, **kwargs):
+        """
+        Loads the ONNX export of a model, exporting it on first use.
+        Args:
+            model_name (str): Name of the HuggingFace embedding model
+            quantize (bool): Whether to use int8-quantized weights
+            kwargs: Further arguments of ONNXEmbedding
+        Returns:
+            ONNXEmbedding: The embedding model
+        """
+        model_dir = pjoin(cls.models_dir, model_name.replace('/', '__') + ('-int8' if quantize else ''))
+        if not os.path.exists(pjoin(model_dir, cls.config_file_name)):
+            export_onnx_model(model_name, model_dir, quantize=quantize)
+        return cls(model_dir, **kwargs)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "ONNXEmbedding"
+
+    def weight_bytes(self):
+        """
+        Returns:
+            int: Size of the model file
+        """
+        return os.path.getsize(pjoin(self.model_dir, self._config['model_file']))
+
+    """
+    *****************
+    *** Embedding ***
+    *****************
+    """
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embeds texts in batches of similar token lengths.
+        Args:
+            texts (list): Texts to embed
+        Returns:
+            list: Normalized embeddings in the order of the texts
+        """
+        encodings = self._tokenizer.encode_batch(texts)
+        order = sorted(range(len(texts)), key=lambda i: len(encodings[i].ids))
+        embeddings = [None] * len(texts)
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start:start + self.batch_size]
+            length = max(len(encodings[i].ids) for i in batch)
+            input_ids = np.zeros((len(batch), length), dtype=np.int64)
+            attention_mask = np.zeros((len(batch), length), dtype=np.int64)
+            for row, i in enumerate(batch):
+                ids = encodings[i].ids
+                input_ids[row, :len(ids)] = ids
+                attention_mask[row, :len(ids)] = 1
+            feeds = {'input_ids': input_ids, 'attention_mask': attention_mask, 'token_type_ids': np.zeros_like(input_ids)}
+            hidden = self._session.run(None, {name: feeds[name] for name in self._config['input_names']})[0]
+            if self._config['pooling'] == 'cls':
+                pooled = hidden[:, 0]
+            else:
+                mask = attention_mask[:, :, None].astype(hidden.dtype)
+                pooled = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+            pooled /= np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+            for row, i in enumerate(batch):
+                embeddings[i] = pooled[row].tolist()
+        return embeddings
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self.embed([self.query_instruction + query])[0]
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return self._get_query_embedding(query)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self.embed([text])[0]
+
+    async def _aget_text_embedding(self, text: str) -> List[float]:
+        return self._get_text_embedding(text)
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return self.embed(texts)
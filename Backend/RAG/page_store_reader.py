@@ -0,0 +1,34 @@
+from llama_index.core.readers.base import BaseReader
+from Crawler.page_store import PageStore
+from RAG.processed_page_reader import ProcessedPageReader
+
+
+class PageStoreReader(BaseReader):
+    """
+    Streams the pages of a crawler page store as documents, without materializing one file per url.
+    Args:
+        directory_path (str): Directory of the crawled company containing the page store
+    """
+    def __init__(self, directory_path: str):
+        self.directory_path = directory_path
+
+    @staticmethod
+    def exists(directory_path: str) -> bool:
+        """
+        Checks whether the crawled company was saved into a page store.
+        """
+        return PageStore.exists(directory_path)
+
+    def lazy_load_data(self, *args, **kwargs):
+        """
+        Yields one document per stored url, identified by its url, with the metadata stored along with the page.
+        """
+        store = PageStore(self.directory_path)
+        try:
+            for url, content in store.iter_pages():
+                yield ProcessedPageReader.page_document(url, content, store.metadata.get(url))
+        finally:
+            store.close()
+
+    def load_data(self, *args, **kwargs):
+        return list(self.lazy_load_data())
@@ -0,0 +1,71 @@
+import os
+import json
+from os.path import join as pjoin
+from llama_index.core import Document
+from llama_index.core.readers.base import BaseReader
+from Crawler.page_store import processed_dir_name
+
+
+class ProcessedPageReader(BaseReader):
+    """
+    Builds documents from the markdown pages and metadata sidecars in a crawled company's processed directory,
+    without parsing the pages again.
+    Args:
+        directory_path (str): Directory of the crawled company containing the processed directory
+    """
+    # Kept in the node metadata for the answer references, but neither embedded nor shown to the LLM
+    excluded_metadata_keys = ['file_name', 'images', 'content_hash', 'crawl_time']
+
+    def __init__(self, directory_path: str):
+        self.directory_path = directory_path
+
+    @staticmethod
+    def exists(directory_path: str) -> bool:
+        """
+        Checks whether the crawled company was saved into the processed layout.
+        """
+        return os.path.isdir(pjoin(directory_path, processed_dir_name))
+
+    @classmethod
+    def page_document(cls, url: str, text: str, metadata: dict = None) -> Document:
+        """
+        Builds the document of a crawled page, identified by its url.
+        Args:
+            url (str): Url of the page
+            text (str): Markdown content of the page
+            metadata (dict): Sidecar metadata of the page, with its title, images, content hash and crawl time
+        Returns:
+            Document: The page document
+        """
+        metadata = dict(metadata or {}, url=url, file_name=url)
+        metadata.setdefault('images', [])
+        return Document(
+            text=text,
+            id_=url,
+            metadata=metadata,
+            excluded_embed_metadata_keys=cls.excluded_metadata_keys,
+            excluded_llm_metadata_keys=cls.excluded_metadata_keys
+        )
+
+    def lazy_load_data(self, *args, **kwargs):
+        """
+        Yields one document per markdown page, with the metadata of its sidecar.
+        """
+        processed_dir = pjoin(self.directory_path, processed_dir_name)
+        for root, _, files in os.walk(processed_dir):
+            for file in sorted(files):
+                if not file.endswith('.md'):
+                    continue
+                file_path = pjoin(root, file)
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    text = f.read()
+                metadata = {}
+                sidecar_path = f'{file_path[:-len(".md")]}.json'
+                if os.path.exists(sidecar_path):
+                    with open(sidecar_path, 'r', encoding='utf-8') as f:
+                        metadata = json.load(f)
+                url = metadata.get('url') or os.path.relpath(file_path, processed_dir)
+                yield self.page_document(url, text, metadata)
+
+    def load_data(self, *args, **kwargs):
+        return list(self.lazy_load_data())
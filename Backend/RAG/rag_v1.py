@@ -1,6 +1,7 @@
 from llama_index.core import VectorStoreIndex, SimpleDirectoryReader, Settings
-from llama_index.embeddings.huggingface import HuggingFaceEmbedding
 from llama_index.llms.openai import OpenAI
+from RAG.embedding_registry import EmbeddingRegistry
+from RAG.mmap_vector_store import MmapVectorStore
 import os
 import sys
 from typing import Dict, Any
@@ -51,11 +52,8 @@ class RAGSystem:
         self.current_directory_path = directory_path
         self.conversation_history = []
 
-        # Initialize embedding model
-        self.embed_model = HuggingFaceEmbedding(
-            model_name=embed_model_name,
-            embed_batch_size=100
-        )
+        # Shared embedding model, loaded once per process for all websites
+        self.embed_model = EmbeddingRegistry.get(embed_model_name)
 
         # Configure settings with the new API
         os.environ["OPENAI_API_KEY"] = self.openai_api_key  
@@ -67,20 +65,31 @@ class RAGSystem:
         # Try to load saved index if it exists
         if load_from_disk and os.path.exists(f"{directory_path}/embedding"):
             print("Loading saved index from disk...")
-            from llama_index.core import StorageContext, load_index_from_storage
-            storage_context = StorageContext.from_defaults(persist_dir=f"{directory_path}/embedding")
+            from llama_index.core import load_index_from_storage
+            # Vectors are memory-mapped rather than parsed from JSON, converted once for indexes saved as JSON
+            storage_context = MmapVectorStore.load_storage_context(f"{directory_path}/embedding")
             self.index = load_index_from_storage(storage_context)
         else:
             # Load documents and create new index
             print("Creating new index...")
-            self.documents = SimpleDirectoryReader(
-                directory_path,
-                recursive=True,
-                exclude_hidden=True,
-                filename_as_id=True
-            ).load_data()
+            from RAG.page_store_reader import PageStoreReader
+            from RAG.processed_page_reader import ProcessedPageReader
+            if ProcessedPageReader.exists(directory_path):
+                # Markdown pages with metadata sidecars become documents without parsing them again
+                self.documents = ProcessedPageReader(directory_path).load_data()
+            elif PageStoreReader.exists(directory_path):
+                # Pages crawled into the compressed page store are streamed from its shards
+                self.documents = PageStoreReader(directory_path).load_data()
+            else:
+                self.documents = SimpleDirectoryReader(
+                    directory_path,
+                    recursive=True,
+                    exclude_hidden=True,
+                    filename_as_id=True
+                ).load_data()
             self.index = VectorStoreIndex.from_documents(
                 self.documents,
+                storage_context=MmapVectorStore.new_storage_context(),
                 show_progress=True
             )
             # Save the index to disk
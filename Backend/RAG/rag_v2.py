@@ -1,15 +1,23 @@
 from llama_index.core import VectorStoreIndex, SimpleDirectoryReader, Settings
 from llama_index.core.query_engine import CitationQueryEngine
-from llama_index.embeddings.huggingface import HuggingFaceEmbedding
 from llama_index.llms.openai import OpenAI
+from RAG.embedding_registry import EmbeddingRegistry
+from RAG.mmap_vector_store import MmapVectorStore
+from RAG.hybrid_retriever import HybridRetriever
+from RAG.stream_indexer import StreamIndexer, IndexingInProgress
 from bs4 import BeautifulSoup
 import os
 import re
 import sys
 import json
+import time
 from typing import Dict, List, Any
 
 class RAGSystem:
+    # Sites of at least ann_min_rows chunks are searched with an IVF index, ann_probes trades recall for latency
+    vector_store_options = {'ann_min_rows': 20000, 'ann_probes': 32}
+    indexing_wait = 10.0  # Seconds to wait for the index of a streaming crawl to be saved before giving up
+
     def __init__(self):
         """
         Initialize RAG system with empty components.
@@ -42,6 +50,10 @@ class RAGSystem:
         # Conversation history with this user
         self.conversation_history = []
 
+        # Version of the index loaded from disk, to notice indexes saved by a streaming crawl
+        self.index_version = None
+        self.index_deltas = 0  # Deltas of a streaming crawl applied to the loaded index
+
     def initialize(self, directory_path: str,
         embed_model_name: str = "BAAI/bge-small-en-v1.5",
         chunk_size: int = 1024,
@@ -55,14 +67,13 @@ class RAGSystem:
             chunk_size (int): Size of text chunks for processing
             chunk_overlap (int): Number of overlapping tokens between chunks
             load_from_disk (bool): Whether to try loading saved index from disk
+        Raises:
+            IndexingInProgress: If a streaming crawl owns the directory and has not saved its index yet
         """
         self.current_directory_path = directory_path
 
-        # Initialize embedding model
-        self.embed_model = HuggingFaceEmbedding(
-            model_name=embed_model_name,
-            embed_batch_size=100
-        )
+        # Shared embedding model, loaded once per process for all websites
+        self.embed_model = EmbeddingRegistry.get(embed_model_name)
         # Configure settings with the new API
         os.environ["OPENAI_API_KEY"] = self.openai_api_key  
         Settings.llm = OpenAI(model="gpt-4o", system_prompt=self.system_prompt_answer_question)
@@ -70,27 +81,44 @@ class RAGSystem:
         Settings.chunk_size = chunk_size
         Settings.chunk_overlap = chunk_overlap
 
+        # A streaming crawl builds the index itself, so wait for its next save rather than building another one
+        if StreamIndexer.is_indexing(directory_path) and (not load_from_disk or not self.wait_for_saved_index()):
+            raise IndexingInProgress(f"Indexing in progress for {directory_path}, the website is queryable after its first save")
+
         # Try to load saved index if it exists
         if load_from_disk and os.path.exists(f"{directory_path}/embedding"):
             print("Loading saved index from disk...")
-            from llama_index.core import StorageContext, load_index_from_storage
-            storage_context = StorageContext.from_defaults(persist_dir=f"{directory_path}/embedding")
-            self.index = load_index_from_storage(storage_context)
+            self.index = self.load_saved_index()
         else:
             # Load documents and create new index
             print("Creating new index...")
-            self.documents = SimpleDirectoryReader(
-                directory_path,
-                recursive=True,
-                exclude_hidden=True,
-                filename_as_id=True
-            ).load_data()
+            from RAG.page_store_reader import PageStoreReader
+            from RAG.processed_page_reader import ProcessedPageReader
+            if ProcessedPageReader.exists(directory_path):
+                # Markdown pages with metadata sidecars become documents without parsing them again
+                self.documents = ProcessedPageReader(directory_path).load_data()
+            elif PageStoreReader.exists(directory_path):
+                # Pages crawled into the compressed page store are streamed from its shards
+                self.documents = PageStoreReader(directory_path).load_data()
+            else:
+                self.documents = SimpleDirectoryReader(
+                    directory_path,
+                    recursive=True,
+                    exclude_hidden=True,
+                    filename_as_id=True
+                ).load_data()
             self.index = VectorStoreIndex.from_documents(
                 self.documents,
+                storage_context=MmapVectorStore.new_storage_context(**self.vector_store_options),
                 show_progress=True
             )
-            # Save the index to disk
+            # Save the index to disk, with the BM25 inverted index of its chunks, replacing deltas of a streaming crawl
+            StreamIndexer.remove_deltas(f"{directory_path}/embedding")
+            self.index_deltas = 0
             self.index.storage_context.persist(persist_dir=f"{directory_path}/embedding")
+            HybridRetriever.build_keyword_index(self.index, f"{directory_path}/embedding")
+            StreamIndexer.write_version(directory_path)
+            self.index_version = StreamIndexer.saved_version(directory_path)
             print("Index saved to disk.")
 
         # Create query engine with response synthesis
@@ -100,15 +128,65 @@ class RAGSystem:
         #     streaming=True
         # )
 
+        # Vector and BM25 keyword search, fused by reciprocal rank fusion
+        # A streaming crawl saves the BM25 index once it finishes, until then it is built in memory from the loaded chunks
+        keyword_dir = None if self.index_deltas or StreamIndexer.is_indexing(directory_path) else f"{directory_path}/embedding"
         self.query_engine = CitationQueryEngine.from_args(
             self.index,
-            similarity_top_k=3,
+            retriever=HybridRetriever.from_index(self.index, keyword_dir, similarity_top_k=3),
             # Here we can control how granular citation sources are, the default is 512
             citation_chunk_size=512,
         )
 
         self.conversation_history = []
 
+    def load_saved_index(self):
+        """
+        Loads the index saved for the current directory with the deltas saved since by a streaming crawl, retrying while
+        the crawl swaps in a newer save.
+        Returns:
+            VectorStoreIndex: The saved index
+        """
+        from llama_index.core import load_index_from_storage
+        for attempt in range(3):
+            # Read before loading, so a save completed meanwhile is picked up by the next staleness check
+            self.index_version = StreamIndexer.saved_version(self.current_directory_path)
+            try:
+                # Vectors are memory-mapped rather than parsed from JSON, converted once for indexes saved as JSON
+                storage_context = MmapVectorStore.load_storage_context(f"{self.current_directory_path}/embedding",
+                                                                       **self.vector_store_options)
+                index = load_index_from_storage(storage_context)
+                self.index_deltas = StreamIndexer.load_deltas(index, f"{self.current_directory_path}/embedding")
+                return index
+            except FileNotFoundError:
+                if attempt == 2 or not StreamIndexer.is_indexing(self.current_directory_path) or not self.wait_for_saved_index():
+                    raise
+
+    def wait_for_saved_index(self) -> bool:
+        """
+        Waits up to indexing_wait seconds for the saved index of the current directory, which is briefly missing while a
+        streaming crawl swaps in a newer save, and until its first save.
+        Returns:
+            bool: True if a saved index exists
+        """
+        deadline = time.monotonic() + self.indexing_wait
+        while not os.path.exists(f"{self.current_directory_path}/embedding"):
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.1)
+        return True
+
+    def is_stale(self) -> bool:
+        """
+        Checks whether a newer index was saved since this one was loaded, as it is while a streaming crawl indexes pages.
+        The version file is written once a save is complete, so files written when loading, such as the converted
+        vectors of an index saved as JSON or its BM25 index, do not count as changes.
+        Returns:
+            bool: True if a newer index was saved to disk
+        """
+        saved_version = StreamIndexer.saved_version(self.current_directory_path)
+        return saved_version is not None and saved_version != self.index_version
+
     def answer_question(self, question: str) -> Dict[str, Any]:
         """
         Process a query against the document store.
@@ -0,0 +1,372 @@
+import os
+import glob
+import json
+import time
+import queue
+import shutil
+import threading
+from os.path import join as pjoin
+import numpy as np
+from llama_index.core import VectorStoreIndex, load_index_from_storage
+from llama_index.core.constants import DATA_KEY
+from llama_index.core.node_parser import SentenceSplitter
+from llama_index.core.schema import MetadataMode
+from llama_index.core.storage.docstore.utils import doc_to_json, json_to_doc
+from RAG.processed_page_reader import ProcessedPageReader
+from RAG.embedding_registry import EmbeddingRegistry
+from RAG.mmap_vector_store import MmapVectorStore
+from RAG.hybrid_retriever import HybridRetriever
+
+
+class IndexingInProgress(RuntimeError):
+    """
+    Raised when a website has no saved index yet because a streaming crawl is still building it.
+    """
+
+
+class StreamIndexer:
+    """
+    Chunks, embeds and indexes crawled pages while the crawl is running, so a website becomes queryable page by page.
+    Pages are queued by the crawler and indexed by a background thread in batches. The index is persisted to the
+    website's embedding directory every persist_interval seconds, where RAGSystem picks it up.
+    Only the first save writes the whole index, later ones append a delta of the chunks and vectors added and the documents
+    deleted since the previous save, which loaders apply with load_deltas. Once the crawl ends, close() saves the whole
+    index again without deltas, with its BM25 index, so saving stays linear in the number of pages.
+    While running, the indexer owns the directory through an owner file it touches regularly, and each save is completed
+    by writing a new version to the version file, which RAGSystem compares to notice newer saves.
+    Args:
+        directory_path (str): Directory of the crawled company, the index is persisted to its 'embedding' subdirectory
+        embed_model_name (str): Name of HuggingFace embedding model to use, the same as RAGSystem's
+        chunk_size (int): Size of text chunks for processing
+        chunk_overlap (int): Number of overlapping tokens between chunks
+        batch_size (int): Maximum number of pages embedded together
+        batch_wait (float): Seconds to wait for a batch to fill up before embedding a smaller one
+        persist_interval (float): Seconds between two saves of the index
+    """
+    embedding_dir_name = 'embedding'
+    version_file_name = 'embedding_version.txt'
+    owner_file_name = 'embedding_indexing.txt'
+    delta_prefix = 'delta-'  # Deltas are saved as <prefix><number>.npy with the vectors and .json with the chunks
+    owner_timeout = 300.0  # Seconds after the last touch of the owner file at which its indexer is considered gone
+
+    def __init__(self, directory_path: str,
+                 embed_model_name: str = "BAAI/bge-small-en-v1.5",
+                 chunk_size: int = 1024,
+                 chunk_overlap: int = 200,
+                 batch_size: int = 32,
+                 batch_wait: float = 2.0,
+                 persist_interval: float = 30.0):
+        self.directory_path = directory_path
+        self.persist_dir = os.path.join(directory_path, self.embedding_dir_name)
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.persist_interval = persist_interval
+
+        self.embed_model = EmbeddingRegistry.get(embed_model_name)
+        self.node_parser = SentenceSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+        self.owner_file = os.path.join(directory_path, self.owner_file_name)
+        self.touch_owner_file()
+        self.delta_count = 0
+        self.index = self.load_index()
+        self.unsaved_nodes = []  # Chunks inserted since the last save
+        self.deleted_doc_ids = set()  # Documents deleted since the last save
+
+        # Unbounded, so the crawler never blocks on the indexer, pages are small compared to the embedding work
+        self.queue = queue.Queue()
+        self.indexed_count = 0
+        self.chunk_count = 0
+        self.embed_seconds = 0.0
+        self.unsaved = False
+        self.last_persist = time.monotonic()
+        self.error = None
+        self.thread = threading.Thread(target=self.run, name='stream-indexer', daemon=True)
+        self.thread.start()
+
+    def load_index(self):
+        """
+        Continues the persisted index of a resumed or incremental crawl, or starts an empty one.
+        Returns:
+            VectorStoreIndex: The index pages are inserted into
+        """
+        if os.path.exists(self.persist_dir):
+            print(f"Continuing index in {self.persist_dir}...")
+            storage_context = MmapVectorStore.load_storage_context(self.persist_dir)
+            index = load_index_from_storage(storage_context, embed_model=self.embed_model)
+            self.delta_count = self.load_deltas(index, self.persist_dir)
+            return index
+        return VectorStoreIndex(nodes=[], embed_model=self.embed_model, storage_context=MmapVectorStore.new_storage_context())
+
+    """
+    ***************
+    *** Queuing ***
+    ***************
+    """
+    def put(self, url: str, text: str, metadata: dict = None):
+        """
+        Queues a saved page for indexing, replacing the indexed version of the url if there is one.
+        Args:
+            url (str): Url of the page, used as document id
+            text (str): Cleaned content of the page
+            metadata (dict): Metadata saved with the page, such as its title and images
+        """
+        if self.error is None:
+            self.queue.put((url, text, metadata))
+
+    def close(self):
+        """
+        Indexes the remaining queued pages and saves the whole index with its BM25 index, replacing the deltas.
+        """
+        self.queue.put(None)
+        self.thread.join()
+        if self.unsaved or self.delta_count:
+            self.persist(complete=True)
+        self.release_owner_file()
+        print(f"Stream indexed {self.indexed_count} pages in {self.chunk_count} chunks, "
+              f"{self.embed_seconds:.1f}s embedding")
+
+    """
+    ****************
+    *** Indexing ***
+    ****************
+    """
+    def run(self):
+        finished = False
+        while not finished:
+            batch, finished = self.next_batch()
+            if batch:
+                try:
+                    self.index_batch(batch)
+                except Exception as e:
+                    # Stop streaming, the index can still be built from the saved pages by RAGSystem
+                    self.error = e
+                    print(f"!!! Stream indexing failed: {e} !!!")
+                    self.release_owner_file()
+                    return
+            self.touch_owner_file()
+            if self.unsaved and time.monotonic() - self.last_persist >= self.persist_interval:
+                self.persist()
+
+    def next_batch(self):
+        """
+        Collects up to batch_size pages, waiting at most batch_wait seconds after the first one.
+        Returns:
+            tuple: (batch of (url, text, metadata), whether the queue was closed)
+        """
+        batch = {}
+        deadline = None
+        while len(batch) < self.batch_size:
+            timeout = self.persist_interval if deadline is None else deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if item is None:
+                return list(batch.values()), True
+            batch[item[0]] = item  # A page saved twice in a batch is indexed once, with its latest content
+            if deadline is None:
+                deadline = time.monotonic() + self.batch_wait
+        return list(batch.values()), False
+
+    def index_batch(self, batch):
+        """
+        Chunks a batch of pages, embeds all chunks in one batch and inserts them into the index.
+        Args:
+            batch (list): Pages as (url, text, metadata)
+        """
+        documents = [ProcessedPageReader.page_document(url, text, metadata) for url, text, metadata in batch]
+        # Re-crawled pages replace their previous chunks
+        indexed = self.index.ref_doc_info
+        for document in documents:
+            if document.doc_id in indexed:
+                self.index.delete_ref_doc(document.doc_id, delete_from_docstore=True)
+                self.deleted_doc_ids.add(document.doc_id)
+
+        nodes = self.node_parser.get_nodes_from_documents(documents)
+        start = time.perf_counter()
+        embeddings = self.embed_model.get_text_embedding_batch([node.get_content(metadata_mode=MetadataMode.EMBED) for node in nodes])
+        self.embed_seconds += time.perf_counter() - start
+        for node, embedding in zip(nodes, embeddings):
+            node.embedding = embedding
+        self.index.insert_nodes(nodes)  # Nodes with embeddings are not embedded again
+        self.unsaved_nodes.extend(nodes)
+
+        self.indexed_count += len(documents)
+        self.chunk_count += len(nodes)
+        self.unsaved = True
+        print(f"Stream indexed {len(documents)} pages ({len(nodes)} chunks), {self.indexed_count} pages in total")
+
+    def persist(self, complete=False):
+        """
+        Saves the index next to the crawled pages, the first time and when complete as a whole, otherwise as a delta.
+        Args:
+            complete (bool): Whether to save the whole index with its BM25 index, replacing the deltas
+        """
+        if complete or not os.path.exists(self.persist_dir):
+            self.save_index(keyword_index=complete)
+        else:
+            self.save_delta()
+        self.write_version(self.directory_path)
+        self.unsaved_nodes = []
+        self.deleted_doc_ids = set()
+        self.unsaved = False
+        self.last_persist = time.monotonic()
+
+    def save_index(self, keyword_index):
+        """
+        Saves the whole index, swapping in the new version so readers never see a partial save.
+        Args:
+            keyword_index (bool): Whether to build and save the BM25 index of its chunks
+        """
+        tmp_dir = f"{self.persist_dir}.tmp"
+        old_dir = f"{self.persist_dir}.old"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        self.index.storage_context.persist(persist_dir=tmp_dir)
+        if keyword_index:
+            HybridRetriever.build_keyword_index(self.index, tmp_dir)
+        if os.path.exists(self.persist_dir):
+            shutil.rmtree(old_dir, ignore_errors=True)
+            os.replace(self.persist_dir, old_dir)
+        os.replace(tmp_dir, self.persist_dir)
+        shutil.rmtree(old_dir, ignore_errors=True)
+        self.delta_count = 0
+        print(f"Saved streamed index with {self.indexed_count} pages to {self.persist_dir}")
+
+    def save_delta(self):
+        """
+        Appends the chunks inserted and the documents deleted since the last save to the saved index. The vectors are
+        written before the chunks, a delta is only complete once its .json file exists.
+        """
+        docstore = self.index.docstore
+        nodes = [node for node in self.unsaved_nodes if docstore.document_exists(node.node_id)]  # Not replaced since
+        self.delta_count += 1
+        path = pjoin(self.persist_dir, f"{self.delta_prefix}{self.delta_count:06d}")
+        with open(f"{path}.npy.tmp", 'wb') as f:
+            np.save(f, np.asarray([node.get_embedding() for node in nodes], dtype=np.float32).reshape(len(nodes), -1))
+        chunks = []
+        for node in nodes:
+            chunk = doc_to_json(node)
+            chunk[DATA_KEY]['embedding'] = None  # Saved in the vectors file
+            chunks.append(chunk)
+        with open(f"{path}.json.tmp", 'w', encoding='utf-8') as f:
+            json.dump({'deleted': sorted(self.deleted_doc_ids), 'nodes': chunks}, f)
+        os.replace(f"{path}.npy.tmp", f"{path}.npy")
+        os.replace(f"{path}.json.tmp", f"{path}.json")
+        print(f"Saved delta {self.delta_count} with {len(nodes)} chunks, {self.indexed_count} pages in total")
+
+    @classmethod
+    def load_deltas(cls, index, persist_dir: str) -> int:
+        """
+        Applies the deltas saved since the last whole save of an index, in the order they were saved.
+        Args:
+            index (VectorStoreIndex): The index loaded from persist_dir
+            persist_dir (str): Directory the index is saved to
+        Returns:
+            int: Number of applied deltas
+        """
+        paths = sorted(glob.glob(pjoin(persist_dir, f"{cls.delta_prefix}*.json")))
+        for path in paths:
+            with open(path, 'r', encoding='utf-8') as f:
+                delta = json.load(f)
+            vectors = np.load(f"{path[:-len('.json')]}.npy")
+            for doc_id in delta['deleted']:
+                if index.docstore.get_ref_doc_info(doc_id) is not None:
+                    index.delete_ref_doc(doc_id, delete_from_docstore=True)
+            nodes = [json_to_doc(chunk) for chunk in delta['nodes']]
+            for node, vector in zip(nodes, vectors):
+                node.embedding = vector.tolist()
+            index.insert_nodes(nodes)
+        return len(paths)
+
+    @classmethod
+    def remove_deltas(cls, persist_dir: str):
+        """
+        Removes the deltas of an index, before it is saved as a whole by another writer.
+        Args:
+            persist_dir (str): Directory the index is saved to
+        """
+        for path in glob.glob(pjoin(persist_dir, f"{cls.delta_prefix}*")):
+            os.remove(path)
+
+    """
+    ******************************
+    *** Versions and ownership ***
+    ******************************
+    """
+    @classmethod
+    def write_version(cls, directory_path: str):
+        """
+        Marks the saved index of a website as a new version, once the save is complete.
+        Args:
+            directory_path (str): Directory of the crawled company
+        """
+        version_file = os.path.join(directory_path, cls.version_file_name)
+        with open(f"{version_file}.tmp", 'w', encoding='utf-8') as f:
+            f.write(str(time.time_ns()))
+        os.replace(f"{version_file}.tmp", version_file)
+
+    @classmethod
+    def saved_version(cls, directory_path: str):
+        """
+        Args:
+            directory_path (str): Directory of the crawled company
+        Returns:
+            str: Version of the saved index, None if no version was written
+        """
+        try:
+            with open(os.path.join(directory_path, cls.version_file_name), 'r', encoding='utf-8') as f:
+                return f.read().strip()
+        except OSError:
+            return None
+
+    @classmethod
+    def is_indexing(cls, directory_path: str) -> bool:
+        """
+        Checks whether a running stream indexer owns the index of a website.
+        Args:
+            directory_path (str): Directory of the crawled company
+        Returns:
+            bool: True if the owner file was touched within owner_timeout seconds
+        """
+        try:
+            return time.time() - os.path.getmtime(os.path.join(directory_path, cls.owner_file_name)) < cls.owner_timeout
+        except OSError:
+            return False
+
+    def touch_owner_file(self):
+        with open(self.owner_file, 'w', encoding='utf-8') as f:
+            f.write(str(os.getpid()))
+
+    def release_owner_file(self):
+        try:
+            os.remove(self.owner_file)
+        except OSError:
+            pass
+
+
+if __name__ == "__main__":
+    import sys
+    import tempfile
+    from os.path import dirname, abspath
+    sys.path.append(dirname(dirname(abspath(__file__))))
+    from RAG.page_store_reader import PageStoreReader
+
+    # Replay a crawled website into a fresh streamed index: python stream_indexer.py ./Output/websites/tum
+    directory_path = sys.argv[1] if len(sys.argv) > 1 else "./Output/websites/tum"
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        indexer = StreamIndexer(tmp_dir, persist_interval=10)
+        start = time.perf_counter()
+        if ProcessedPageReader.exists(directory_path):
+            documents = ProcessedPageReader(directory_path).lazy_load_data()
+        elif PageStoreReader.exists(directory_path):
+            documents = PageStoreReader(directory_path).lazy_load_data()
+        else:
+            from llama_index.core import SimpleDirectoryReader
+            documents = SimpleDirectoryReader(directory_path, recursive=True, exclude_hidden=True, filename_as_id=True).iter_data()
+        for document in documents:
+            for doc in document if isinstance(document, list) else [document]:
+                indexer.put(doc.doc_id, doc.text, doc.metadata)
+        indexer.close()
+        elapsed = time.perf_counter() - start
+        print(f"{indexer.indexed_count} pages in {elapsed:.1f}s, {indexer.indexed_count / elapsed:.1f} pages/s")
@@ -0,0 +1,5 @@
+import sys
+from os.path import dirname, abspath
+# The tests import the Backend packages as the demos run from Backend do, and the System packages as the server does
+sys.path.append(dirname(dirname(abspath(__file__))))
+sys.path.append(dirname(dirname(dirname(abspath(__file__)))))
@@ -0,0 +1,159 @@
+import json
+import time
+import threading
+import multiprocessing
+from os.path import join as pjoin
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from Crawler.crawler import UTASpider
+
+
+page_count = 300
+
+
+class ThrottleSite:
+    """
+    Stub site of page_count linked pages that answers the first fast_requests requests without delay, and the later
+    ones after latency seconds, every error_every-th of them with a 503.
+    Args:
+        latency (float): Seconds before answering a request after the fast ones
+        error_every (int): Answer every n-th request after the fast ones with a 503, 0 for no errors
+        fast_requests (int): Requests answered without delay or error
+    """
+    def __init__(self, latency=0.0, error_every=0, fast_requests=0):
+        self.latency = latency
+        self.error_every = error_every
+        self.fast_requests = fast_requests
+        self.served = 0
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self.handler_class())
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server.server_address[1]}/p0'
+
+    def handler_class(self):
+        site = self
+
+        class ThrottleHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with site.lock:
+                    site.served += 1
+                    served = site.served
+                if served > site.fast_requests:
+                    time.sleep(site.latency)
+                    if site.error_every and served % site.error_every == 0:
+                        self.send_error(503)
+                        return
+                page = int(self.path.strip('/').replace('p', '') or 0)
+                links = ''.join(f'<a href="/p{(page * 7 + i) % page_count}">Page {(page * 7 + i) % page_count}</a>'
+                                for i in range(1, 6))
+                body = (f'<html><head><title>Page {page}</title></head><body><h1>Page {page}</h1>'
+                        f'<p>Content of stub page {page}.</p>{links}</body></html>').encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return ThrottleHandler
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def crawl(output_dir, start_url, settings):
+    """
+    Crawls the stub site in a process of its own, as the Twisted reactor cannot be restarted, and saves the close reason
+    and the concurrency and delay of the host's download slot after each response to result.json.
+    """
+    from scrapy import signals
+    from scrapy.crawler import CrawlerProcess
+    process = CrawlerProcess({
+        'LOG_ENABLED': True,
+        'LOG_LEVEL': 'ERROR',
+        'ROBOTSTXT_OBEY': False,
+        'RETRY_ENABLED': False,
+        'RANDOMIZE_DOWNLOAD_DELAY': False,
+        'DOWNLOADER_MIDDLEWARES': {'Crawler.adaptive_throttle.AdaptiveThrottle': 950},
+        'ADAPTIVE_THROTTLE_ENABLED': True,
+        **settings
+    })
+    crawler = process.create_crawler(UTASpider)
+    slots = []
+
+    def response_received(response, request, spider):
+        slot = crawler.engine.downloader.slots.get(request.meta.get('download_slot'))
+        if slot is not None:
+            slots.append((slot.concurrency, slot.delay))
+
+    crawler.signals.connect(response_received, signal=signals.response_received)
+    process.crawl(crawler, output_dir=output_dir, start_urls=[start_url], company_name='stub', near_duplicate_distance=None)
+    process.start()
+    with open(pjoin(output_dir, 'result.json'), 'w', encoding='utf-8') as f:
+        json.dump({'finish_reason': crawler.stats.get_value('finish_reason'), 'slots': slots}, f)
+
+
+def run_crawl(output_dir, site, settings):
+    process = multiprocessing.get_context('spawn').Process(target=crawl, args=(output_dir, site.url, settings))
+    process.start()
+    process.join(timeout=120)
+    assert process.exitcode == 0
+    with open(pjoin(output_dir, 'result.json'), 'r', encoding='utf-8') as f:
+        result = json.load(f)
+    with open(pjoin(output_dir, 'stub', 'website_info.json'), 'r', encoding='utf-8') as f:
+        info = json.load(f)
+    return result, info
+
+
+def test_slot_speeds_up_for_a_fast_host_and_backs_off_when_it_degrades(tmp_path):
+    settings = {'CONCURRENT_REQUESTS_PER_DOMAIN': 2, 'DOWNLOAD_DELAY': 0.05, 'CRAWL_TIME_BUDGET': 8,
+                'ADAPTIVE_THROTTLE_TARGET_LATENCY': 0.1, 'ADAPTIVE_THROTTLE_ADJUST_INTERVAL': 3,
+                'ADAPTIVE_THROTTLE_MAX_DELAY': 1}
+    with ThrottleSite(latency=0.3, error_every=2, fast_requests=60) as site:
+        result, info = run_crawl(str(tmp_path), site, settings)
+
+    concurrencies = [concurrency for concurrency, _ in result['slots']]
+    delays = [delay for _, delay in result['slots']]
+    peak = concurrencies.index(max(concurrencies))
+    # Raised while the host answers fast, then halved with doubled delays once it is slow and failing
+    assert max(concurrencies) > 2
+    assert min(delays[:peak + 1]) < 0.05
+    assert concurrencies[-1] < max(concurrencies)
+    assert concurrencies[-1] == 1
+    assert delays[-1] > 0.05
+    host = next(iter(info['throttle']['hosts'].values()))
+    assert host['concurrency'] == 1 and host['error_rate'] > 0.1
+
+
+def test_time_budget_closes_the_spider(tmp_path):
+    settings = {'CONCURRENT_REQUESTS_PER_DOMAIN': 1, 'DOWNLOAD_DELAY': 0, 'CRAWL_TIME_BUDGET': 2,
+                'ADAPTIVE_THROTTLE_MAX_CONCURRENCY': 1}
+    with ThrottleSite(latency=0.2) as site:
+        result, info = run_crawl(str(tmp_path), site, settings)
+
+    assert result['finish_reason'] == 'budget_exceeded'
+    assert info['throttle']['budget_exceeded'] == 'time budget of 2s'
+    assert not info['crawl_finished']
+    assert 0 < info['visited_count'] < page_count
+    assert info['throttle']['elapsed_seconds'] < 4
+
+
+def test_byte_budget_closes_the_spider(tmp_path):
+    byte_budget = 5000
+    settings = {'CONCURRENT_REQUESTS_PER_DOMAIN': 2, 'DOWNLOAD_DELAY': 0, 'CRAWL_BYTE_BUDGET': byte_budget}
+    with ThrottleSite() as site:
+        result, info = run_crawl(str(tmp_path), site, settings)
+
+    assert result['finish_reason'] == 'budget_exceeded'
+    assert info['throttle']['budget_exceeded'] == f'byte budget of {byte_budget} bytes'
+    assert info['throttle']['downloaded_bytes'] >= byte_budget
+    assert not info['crawl_finished']
+    assert 0 < info['visited_count'] < page_count
@@ -0,0 +1,114 @@
+import os
+import json
+import time
+from os.path import join as pjoin
+import pytest
+from System.crawl_jobs import CrawlJobManager
+
+
+def fake_crawl(data_dir, company, seconds):
+    """
+    Crawl target writing a website summary, then crawling for the given seconds. Like Scrapy, it stops gracefully on
+    SIGINT, leaving a checkpoint behind.
+    """
+    company_dir = pjoin(data_dir, company)
+    os.makedirs(company_dir, exist_ok=True)
+    try:
+        with open(pjoin(company_dir, 'website_info.json'), 'w', encoding='utf-8') as f:
+            json.dump({'visited_count': 1, 'failed_count': 0, 'crawl_finished': False}, f)
+        time.sleep(seconds)
+    except KeyboardInterrupt:
+        open(pjoin(company_dir, 'checkpoint.json'), 'w').close()
+        return
+    with open(pjoin(company_dir, 'website_info.json'), 'w', encoding='utf-8') as f:
+        json.dump({'visited_count': 10, 'failed_count': 0, 'crawl_finished': True}, f)
+
+
+def wait_for(condition, timeout=20.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'Timed out waiting for the crawl jobs'
+        time.sleep(0.05)
+
+
+@pytest.fixture
+def make_manager(tmp_path):
+    managers = []
+
+    def make_manager(max_workers=2):
+        manager = CrawlJobManager(fake_crawl, data_dir=str(tmp_path), jobs_file=pjoin(tmp_path, 'crawl_jobs.json'),
+                                  max_workers=max_workers, poll_interval=0.05)
+        managers.append(manager)
+        return manager
+
+    yield make_manager
+    for manager in managers:
+        manager.stop()
+        for process in manager.processes.values():
+            process.terminate()
+            process.join()
+
+
+def submit(manager, tmp_path, company, seconds):
+    return manager.submit(company, data_dir=str(tmp_path), company=company, seconds=seconds)
+
+
+def test_one_active_job_per_company_within_the_worker_limit(make_manager, tmp_path):
+    manager = make_manager(max_workers=1)
+    first, created = submit(manager, tmp_path, 'a', 0.5)
+    again, created_again = submit(manager, tmp_path, 'a', 0.5)
+    other, _ = submit(manager, tmp_path, 'b', 0.5)
+    assert created and not created_again and again['job_id'] == first['job_id']
+
+    wait_for(lambda: manager.get_job(first['job_id'])['status'] == 'running')
+    assert manager.get_job(other['job_id'])['status'] == 'queued'
+    progress = manager.status('a')['running'][0]['progress']
+    assert progress is None or progress['visited_count'] == 1  # Written by the worker once it started
+
+    wait_for(lambda: manager.get_job(other['job_id'])['status'] == 'done')
+    assert manager.get_job(first['job_id'])['status'] == 'done'
+    assert manager.status('a')['done'][0]['progress']['crawl_finished']
+    # Finished jobs no longer block a new crawl of the company
+    _, created = submit(manager, tmp_path, 'a', 0)
+    assert created
+
+
+def test_queue_survives_a_restart(make_manager, tmp_path):
+    manager = make_manager(max_workers=1)
+    running, _ = submit(manager, tmp_path, 'a', 30)
+    queued, _ = submit(manager, tmp_path, 'b', 0)
+    wait_for(lambda: manager.get_job(running['job_id'])['status'] == 'running')
+    # The server stops, its crawl dies with it
+    manager.stop()
+    manager.scheduler.join()
+    for process in manager.processes.values():
+        process.kill()
+        process.join()
+    manager.processes = {}
+
+    restarted = make_manager(max_workers=1)
+    assert [(job['job_id'], job['status']) for job in restarted.jobs] == [(running['job_id'], 'queued'),
+                                                                          (queued['job_id'], 'queued')]
+    restarted.jobs[0]['args']['seconds'] = 0  # Resumed from its checkpoint
+    restarted.start()
+    wait_for(lambda: all(job['status'] == 'done' for job in restarted.jobs))
+    with open(pjoin(tmp_path, 'crawl_jobs.json'), 'r', encoding='utf-8') as f:
+        assert [job['status'] for job in json.load(f)] == ['done', 'done']
+
+
+def test_cancel_stops_a_running_crawl_with_sigint(make_manager, tmp_path):
+    manager = make_manager(max_workers=1)
+    running, _ = submit(manager, tmp_path, 'a', 30)
+    queued, _ = submit(manager, tmp_path, 'b', 30)
+    wait_for(lambda: os.path.exists(pjoin(tmp_path, 'a', 'website_info.json')))
+
+    assert manager.cancel(job_id=queued['job_id'])['status'] == 'cancelled'
+    assert manager.cancel(company_name='a')['status'] == 'cancelling'
+    assert manager.status()['running'][0]['job_id'] == running['job_id']
+    wait_for(lambda: manager.get_job(running['job_id'])['status'] == 'cancelled')
+
+    # Stopped gracefully, so the crawl is resumable from its checkpoint
+    assert os.path.exists(pjoin(tmp_path, 'a', 'checkpoint.json'))
+    assert manager.get_job(running['job_id'])['exit_code'] == 0
+    assert not os.path.exists(pjoin(tmp_path, 'b'))
+    assert manager.cancel(company_name='a') is None
@@ -0,0 +1,21 @@
+from Crawler.crawl_manifest import CrawlManifest
+
+
+def test_changes_remove_only_pages_with_a_saved_document(tmp_path):
+    manifest = CrawlManifest(str(tmp_path))
+    manifest.record('https://example.com/kept', status='added', file='processed/example.com/kept.md')
+    manifest.record('https://example.com/gone', status='added', file='processed/example.com/gone.md')
+    manifest.record('https://example.com/print', status='added', file='processed/example.com/print.md')
+    manifest.record('https://example.com/broken', status='failed', error='404 Not Found')
+    manifest.record('https://example.com/copy', status='duplicate', duplicate_of='https://example.com/kept', distance=1)
+    manifest.close()
+
+    manifest = CrawlManifest(str(tmp_path), incremental=True)
+    manifest.record('https://example.com/kept', status='unchanged', file='processed/example.com/kept.md')
+    manifest.record('https://example.com/print', status='duplicate', duplicate_of='https://example.com/kept', distance=0)
+    changes = manifest.changes()
+    manifest.close()
+
+    assert changes['removed'] == [{'url': 'https://example.com/gone', 'file': 'processed/example.com/gone.md'},
+                                  {'url': 'https://example.com/print', 'file': 'processed/example.com/print.md'}]
+    assert changes['unchanged'] == 1
@@ -0,0 +1,89 @@
+import multiprocessing
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import pytest
+from Crawler.crawler import UTASpider
+
+
+hub_count = 8
+words = 'study program research campus faculty student admission course lecture exam degree master'.split()
+
+
+class LinkSite:
+    """
+    Stub site whose home page links to hubs, every hub links to /popular and the first hub also to /lonely, before
+    /popular. Both are found by the first hub at the same depth and score, then /popular gains the in-links of the
+    other hubs while it waits in the scheduler. The paths are recorded in the order they are requested.
+    """
+    def __init__(self):
+        self.requested = []
+        self.pages = {'/': [f'/hub-{hub}' for hub in range(hub_count)], '/popular': [], '/lonely': []}
+        for hub in range(hub_count):
+            self.pages[f'/hub-{hub}'] = ['/lonely', '/popular'] if hub == 0 else ['/popular']
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self.handler_class())
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server.server_address[1]}/'
+
+    def handler_class(self):
+        site = self
+
+        class LinkHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                site.requested.append(self.path)
+                links = site.pages.get(self.path)
+                if links is None:
+                    self.send_error(404)
+                    return
+                body = (f'<html><head><title>{self.path}</title></head><body>'
+                        f'<nav>{"".join(f"<a href={link}>{link}</a> " for link in links)}</nav>'
+                        f'<main><h1>{self.path}</h1><p>{" ".join(words)} {self.path}</p></main></body></html>').encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return LinkHandler
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def crawl(output_dir, start_url):
+    """
+    Crawls the stub site in a process of its own, as the Twisted reactor cannot be restarted.
+    """
+    from scrapy.crawler import CrawlerProcess
+    process = CrawlerProcess({'LOG_ENABLED': True, 'LOG_LEVEL': 'ERROR', 'ROBOTSTXT_OBEY': False,
+                              'CONCURRENT_REQUESTS': 1, 'DOWNLOAD_DELAY': 0,
+                              'SCHEDULER_MEMORY_QUEUE': 'scrapy.squeues.FifoMemoryQueue'})
+    process.crawl(UTASpider, output_dir=output_dir, start_urls=[start_url], company_name='links',
+                  near_duplicate_distance=None, prioritize=True)
+    process.start()
+
+
+@pytest.fixture
+def link_site():
+    with LinkSite() as site:
+        yield site
+
+
+def test_page_with_more_inlinks_is_fetched_first(link_site, tmp_path):
+    process = multiprocessing.get_context('spawn').Process(target=crawl, args=(str(tmp_path), link_site.url))
+    process.start()
+    process.join(timeout=60)
+    assert process.exitcode == 0
+
+    # Requested once more when its in-links raised its score, the stale request is dropped unprocessed
+    requested = [path for path in link_site.requested if path in ('/popular', '/lonely')]
+    assert requested.index('/popular') < requested.index('/lonely')
@@ -0,0 +1,92 @@
+import pytest
+from bs4 import BeautifulSoup
+from Crawler.html_parser import HTMLParser
+from Benchmark.corpus_server import load_corpus
+
+
+corpus = load_corpus()
+# Parents left empty by their children and divs left with a single child, which the corpus pages rarely nest
+corpus['empty-chains'] = (
+    b'<html><head><title>Empty chains</title><meta charset="utf-8"></head><body>'
+    b'<div><div><span> </span><p></p></div></div>'
+    b'<div><div><div><p>Only child</p></div></div><!-- comment --></div>'
+    b'<ul><li><a></a></li><li><b>Kept</b><i>\n</i></li></ul>'
+    b'<div> <div><section><div><em></em></div></section></div> <br></div>'
+    b'<div><div>Text</div><div><div><img src="a.png"></div></div></div>'
+    b'<div><div type="note"></div><p>Left alone once the empty div is gone</p></div>'
+    b'<table><tr><td><div></div></td></tr></table></body></html>'
+)
+
+
+"""
+*************************
+*** Baseline cleaning ***
+*************************
+"""
+def baseline_remove_empty_elements(soup):
+    """
+    HTMLParser.remove_empty_elements before the single-pass rewrite, restarting find_all() after every removal.
+    """
+    preserve_tags = {'hr', 'br', 'img', 'input', 'meta', 'link', 'textarea'}
+    while True:
+        removed = False
+        for tag in soup.find_all():
+            if tag.name in preserve_tags:
+                continue
+            if tag.attrs:
+                continue
+            content = ''.join(str(child) for child in tag.contents).strip()
+            if not content:
+                tag.decompose()
+                removed = True
+                break
+        if not removed:
+            break
+
+
+def baseline_remove_redundant_divs(soup):
+    """
+    HTMLParser.remove_redundant_divs before the single-pass rewrite, restarting find_all() after every change.
+    """
+    while True:
+        redundant_found = False
+        for div in soup.find_all('div'):
+            children = list(div.children)
+            children = [c for c in children if not isinstance(c, str) or c.strip()]
+            if len(children) == 0:
+                div.decompose()
+                redundant_found = True
+                break
+            elif len(children) == 1:
+                div.replace_with(children[0])
+                redundant_found = True
+                break
+        if not redundant_found:
+            break
+
+
+"""
+*************
+*** Tests ***
+*************
+"""
+def cleaned_soup(parser, name):
+    # The soup as the cleaning stages before the rewritten ones leave it
+    soup = BeautifulSoup(corpus[name], 'html.parser')
+    parser.clean_head(soup)
+    parser.clean_elements(soup)
+    return soup
+
+
+@pytest.mark.parametrize('name', list(corpus))
+def test_single_pass_cleaning_matches_baseline(name):
+    parser = HTMLParser(template_learning_pages=0)
+    baseline, single_pass = cleaned_soup(parser, name), cleaned_soup(parser, name)
+
+    baseline_remove_empty_elements(baseline)
+    parser.remove_empty_elements(single_pass)
+    assert str(single_pass) == str(baseline)
+
+    baseline_remove_redundant_divs(baseline)
+    parser.remove_redundant_divs(single_pass)
+    assert str(single_pass) == str(baseline)
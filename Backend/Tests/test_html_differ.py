@@ -0,0 +1,34 @@
+import lxml.html
+import pytest
+from bs4 import BeautifulSoup
+from Crawler.html_differ import SubtreeHasher
+from Crawler.lxml_html_parser import LxmlTemplateLearner
+
+
+template_html = '''<html><body>
+<div class="page"><nav><a href="/">Home</a> <a href="/about">About our company and its history</a></nav></div>
+<footer><p>Copyright 2024 My Website, all rights reserved</p></footer>
+</body></html>'''
+
+page_html = '''<html><body>
+<div class="page">Introduction unique to this page<nav><a href="/">Home</a> <a href="/about">About our company and its history</a></nav>Closing words of this page
+<p>A new paragraph</p></div>
+<footer><p>Copyright 2024 My Website, all rights reserved</p></footer>
+</body></html>'''
+
+
+def region_text(region):
+    if isinstance(region, str):
+        return region.strip()
+    return ' '.join((region.text_content() if isinstance(region, lxml.html.HtmlElement) else region.get_text()).split())
+
+
+@pytest.mark.parametrize('hasher, parse', [
+    (SubtreeHasher(), lambda html: BeautifulSoup(html, 'html.parser')),
+    (LxmlTemplateLearner(), lxml.html.document_fromstring)
+], ids=['bs4', 'lxml'])
+def test_unique_regions_keep_own_text_around_shared_children(hasher, parse):
+    template = hasher.template_hashes(parse(template_html))
+    regions = hasher.unique_regions(parse(page_html), template)
+    assert [region_text(region) for region in regions] == [
+        'Introduction unique to this page', 'Closing words of this page', 'A new paragraph']
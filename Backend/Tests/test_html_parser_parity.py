@@ -0,0 +1,26 @@
+import pytest
+from scrapy.http import HtmlResponse
+from Crawler.html_parser import create_html_parser
+from Benchmark.corpus_server import load_corpus
+
+
+corpus = load_corpus()
+
+
+def parse(backend, name):
+    response = HtmlResponse(url=f'https://www.example.edu/en/{name}', body=corpus[name], encoding='utf-8')
+    return create_html_parser(backend, template_learning_pages=0).parse_page(response)
+
+
+@pytest.mark.parametrize('name', list(corpus))
+def test_backends_parse_corpus_pages_alike(name):
+    """
+    The lxml backend must produce what the BeautifulSoup backend does, including for pages nested deeper than
+    libxml2's default depth limit.
+    """
+    bs4_page, lxml_page = parse('bs4', name), parse('lxml', name)
+    assert lxml_page['markdown'] == bs4_page['markdown']
+    assert lxml_page['links'] == bs4_page['links']
+    assert lxml_page['metadata'] == bs4_page['metadata']
+    assert lxml_page['canonical'] == bs4_page['canonical']
+    assert lxml_page['content_hash'] == bs4_page['content_hash']
@@ -0,0 +1,20 @@
+from Crawler.near_duplicate import SimHashIndex
+
+
+page = 'Our study programs cover engineering, natural sciences, medicine and management at three campuses. ' * 5
+
+
+def test_short_pages_are_not_fingerprinted():
+    index = SimHashIndex()
+    assert index.page_fingerprint('# Title\n\nSource: https://example.com/a\n\n') is None
+    assert index.page_fingerprint('# Title\n\nSource: https://example.com/b\n\nPage moved, see the [new page](/new).') is None
+    assert index.fingerprint(' '.join(['word'] * (index.min_words - 1))) is None
+    assert index.fingerprint(' '.join(['word'] * index.min_words)) is not None
+
+
+def test_long_pages_find_their_near_duplicates():
+    index = SimHashIndex()
+    index.add(index.fingerprint(page), 'https://example.com/programs')
+    url, distance = index.find(index.fingerprint(page + ' Print version.'))
+    assert url == 'https://example.com/programs' and distance <= index.max_distance
+    assert index.find(index.fingerprint('Contact our admissions office for deadlines, fees and visa questions. ' * 5)) is None
@@ -0,0 +1,36 @@
+from Crawler.page_store import PageStore
+
+
+def page(url, body):
+    return f'# Title\n\nSource: [{url}]({url})\n\n{body}'
+
+
+def test_identical_pages_under_different_urls_share_their_blob(tmp_path):
+    store = PageStore(str(tmp_path))
+    first_hash = store.put('https://example.com/a', page('https://example.com/a', 'Same content'))
+    second_hash = store.put('https://example.com/print/a', page('https://example.com/print/a', 'Same content'))
+    store.close()
+    assert first_hash == second_hash
+
+    store = PageStore(str(tmp_path))
+    assert len(store.blobs) == 1
+    assert store.get('https://example.com/print/a') == page('https://example.com/print/a', 'Same content')
+    store.close()
+
+
+def test_pages_read_back_as_put(tmp_path):
+    pages = {
+        'https://example.com/a': page('https://example.com/a', 'Content of a'),
+        'https://example.com/b': page('https://example.com/b', ''),
+        'https://example.com/c': '# No source line\n\nContent of c',
+        'https://example.com/d': '# Source only\n\nSource: [d](d)'
+    }
+    store = PageStore(str(tmp_path))
+    for url, content in pages.items():
+        store.put(url, content)
+    store.close()
+
+    store = PageStore(str(tmp_path))
+    assert {url: store.get(url) for url in pages} == pages
+    assert dict(store.iter_pages()) == pages
+    store.close()
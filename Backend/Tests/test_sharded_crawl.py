@@ -0,0 +1,126 @@
+import os
+import random
+import threading
+from os.path import join as pjoin
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import pytest
+from Crawler.crawl_manifest import CrawlManifest
+from Crawler.page_store import processed_dir_name
+from Crawler.sharded_crawl import ShardedCrawl
+
+
+host_count, pages_per_host = 3, 20
+words = ('study program research campus faculty student admission course lecture exam degree master bachelor '
+         'science engineering library semester application deadline scholarship department professor').split()
+
+
+class StubSite:
+    """
+    Multi-host stub site with one of two link layouts, both reaching every page within the crawl depth:
+    - 'mesh': each server is a host whose home page links to all its pages and the other hosts, and every page links
+      to pages on its own and other hosts. The home page of the first host, the start url, also links to every page,
+      so all pages are found within the crawl depth whatever order the shards crawl them in.
+    - 'chains': the start url links only to the heads of chains of chain_length pages, each linking to the next page
+      of its chain on another host, so every page is reachable only by urls forwarded between the shards.
+    """
+    chain_length = 4
+
+    def __init__(self, layout='mesh'):
+        self.layout = layout
+        self.servers = [ThreadingHTTPServer(('127.0.0.1', 0), self.handler_class()) for _ in range(host_count)]
+        self.ports = [server.server_address[1] for server in self.servers]
+        # Pages other than the start url alternate between the hosts, so consecutive chain pages are on different hosts
+        self.chain_pages = [(host, page) for page in range(pages_per_host) for host in range(host_count) if host or page]
+        self.pages = {(host, self.path(page)): self.page(host, page)
+                      for host in range(host_count) for page in range(pages_per_host)}
+
+    def url(self, host, path='/'):
+        return f'http://127.0.0.1:{self.ports[host]}{path}'
+
+    @staticmethod
+    def path(page):
+        return f'/page-{page}' if page else '/'
+
+    def links(self, host, page):
+        if self.layout == 'chains':
+            if host == 0 and page == 0:
+                heads = self.chain_pages[::self.chain_length]
+                return [self.url(head_host, self.path(head_page)) for head_host, head_page in heads]
+            position = self.chain_pages.index((host, page)) + 1
+            if position % self.chain_length == 0 or position == len(self.chain_pages):
+                return []
+            next_host, next_page = self.chain_pages[position]
+            return [self.url(next_host, self.path(next_page))]
+
+        links = [f'/page-{(page * 3 + k) % pages_per_host}' for k in range(1, 4)]
+        links += [self.url((host + 1) % host_count, f'/page-{page}'),
+                  self.url((host + 2) % host_count, f'/page-{page * 5 % pages_per_host}')]
+        if page == 0:
+            links += [f'/page-{i}' for i in range(pages_per_host)]
+            links += [self.url(i) for i in range(host_count)]
+        if host == 0 and page == 0:
+            links += [self.url(i, f'/page-{j}') for i in range(1, host_count) for j in range(1, pages_per_host)]
+        return links
+
+    def page(self, host, page):
+        rng = random.Random(host * 100000 + page)
+        paragraphs = ''.join(f'<p>{" ".join(rng.choice(words) for _ in range(80))}</p>' for _ in range(5))
+        return (f'<html><head><title>Host {host} page {page}</title></head><body>'
+                f'<nav>{"".join(f"<a href={link}>Link {link}</a> " for link in self.links(host, page))}</nav>'
+                f'<main><h1>Host {host} page {page}</h1>{paragraphs}</main></body></html>').encode('utf-8')
+
+    def handler_class(self):
+        site = self
+
+        class StubHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = site.pages.get((site.ports.index(self.server.server_address[1]), self.path))
+                if body is None:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return StubHandler
+
+    def __enter__(self):
+        for server in self.servers:
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+
+
+@pytest.fixture(scope='module')
+def stub_sites():
+    with StubSite('mesh') as mesh, StubSite('chains') as chains:
+        yield {'mesh': mesh, 'chains': chains}
+
+
+@pytest.mark.parametrize('layout, shard_count, partition', [('mesh', 1, 'host'), ('mesh', host_count, 'host'),
+                                                            ('mesh', host_count, 'url'), ('chains', host_count, 'host'),
+                                                            ('chains', host_count, 'url')])
+def test_shards_crawl_every_page_once(stub_sites, tmp_path, layout, shard_count, partition):
+    stub_site = stub_sites[layout]
+    settings = {'LOG_ENABLED': True, 'LOG_LEVEL': 'ERROR', 'ROBOTSTXT_OBEY': False,
+                'CONCURRENT_REQUESTS': 16, 'CONCURRENT_REQUESTS_PER_DOMAIN': 8, 'DOWNLOAD_DELAY': 0}
+    company_name = f'stub-{layout}-{shard_count}-{partition}'
+    info = ShardedCrawl(str(tmp_path), company_name, [stub_site.url(0)], shard_count=shard_count, partition=partition,
+                        settings=settings, near_duplicate_distance=None).run()
+
+    # Links to /page-0 are not found, the home page is /
+    records = [record for record in CrawlManifest.load_records(pjoin(tmp_path, company_name, CrawlManifest.file_name)).values()
+               if record['status'] != 'failed']
+    pages = sum(len(files) for _, _, files in os.walk(pjoin(tmp_path, company_name, processed_dir_name))) // 2
+    expected = host_count * pages_per_host
+    assert info['crawl_finished']
+    assert info['visited_count'] == len(records) == pages == expected
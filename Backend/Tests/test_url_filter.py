@@ -0,0 +1,15 @@
+from Crawler.url_filter import URLFilter
+
+
+def test_excluded_prefixes_match_lowercase_hosts_and_exact_paths():
+    url_filter = URLFilter('https://www.tum.de/', ['WWW.TUM.de/en/News/Archive', 'https://Campus.tum.de/'])
+    assert not url_filter.allows('https://www.tum.de/en/News/Archive/2019')
+    assert url_filter.allows('https://www.tum.de/en/news/archive/2019')
+    assert url_filter.allows('https://www.tum.de/en/')
+
+
+def test_excluded_hosts_include_subdomains():
+    url_filter = URLFilter(None, ['https://Campus.tum.de/', 'login.tum.de'])
+    assert not url_filter.allows('https://campus.tum.de/courses')
+    assert not url_filter.allows('https://sso.login.tum.de/')
+    assert url_filter.allows('https://www.tum.de/')
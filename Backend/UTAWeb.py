@@ -2,11 +2,26 @@ import tldextract
 import os
 from os.path import join as pjoin
 from Crawler.crawler import UTASpider
+from Crawler.crawl_checkpoint import CrawlCheckpoint
+from Crawler.sharded_crawl import ShardedCrawl
 from scrapy.crawler import CrawlerProcess
 
 
 class UTAWeb:
     _rag_systems = {}  # Dictionary to store RAG systems by company_name in memory
+    crawler_settings = {
+        'LOG_ENABLED': True,
+        'LOG_LEVEL': 'ERROR',
+        'ROBOTSTXT_OBEY': True,
+        'DOWNLOAD_TIMEOUT': 10,
+        # Start gently, the adaptive throttle adjusts concurrency and delay per host from its latency and errors
+        'CONCURRENT_REQUESTS_PER_DOMAIN': 2,
+        'DOWNLOAD_DELAY': 1,
+        'DOWNLOADER_MIDDLEWARES': {'Crawler.adaptive_throttle.AdaptiveThrottle': 950},
+        'ADAPTIVE_THROTTLE_ENABLED': True,
+        'ADAPTIVE_THROTTLE_MAX_CONCURRENCY': 10,
+        'ADAPTIVE_THROTTLE_MIN_DELAY': 0.1
+    }
 
     def __init__(self, initializing=False, data_dir=None):
         self.crawler_process = None  # Temporary crawler process worker without storing in memory
@@ -24,24 +39,23 @@ class UTAWeb:
         # Initialize Crawler    
         if not self.crawler_process:
             print("Crawler Initializing...")
-            self.crawler_process = CrawlerProcess({
-                'LOG_ENABLED': True,
-                'LOG_LEVEL': 'ERROR',
-                'ROBOTSTXT_OBEY': True,
-                'CONCURRENT_REQUESTS_PER_DOMAIN': 10,
-                'DOWNLOAD_DELAY': 1,
-                'DOWNLOAD_TIMEOUT': 10
-            })
+            self.crawler_process = CrawlerProcess(self.crawler_settings)
 
     def initialize_rag(self, directory_path: str=None, load_from_disk: bool=True):
         # Initialize RAG System for specific company if not exists or force re-embedding
         company_name = directory_path.replace('\\', '/').split('/')[-1] if directory_path else None
-        if company_name not in self._rag_systems or not load_from_disk:
+        # A streamed index saved since the RAG system was loaded is reloaded, to query the pages crawled meanwhile
+        stale = company_name in self._rag_systems and load_from_disk and self._rag_systems[company_name].is_stale()
+        if company_name not in self._rag_systems or not load_from_disk or stale:
             print(f"Initializing RAG System for {company_name}...")
             from RAG.rag_v2 import RAGSystem
-            self._rag_systems[company_name] = RAGSystem()
+            history = self._rag_systems[company_name].conversation_history if stale else []
+            rag_system = RAGSystem()
             if directory_path:
-                self._rag_systems[company_name].initialize(directory_path=directory_path, load_from_disk=load_from_disk)
+                # Raises IndexingInProgress before the first save of a streaming crawl, keeping any loaded system
+                rag_system.initialize(directory_path=directory_path, load_from_disk=load_from_disk)
+                rag_system.conversation_history = history
+            self._rag_systems[company_name] = rag_system
         return self._rag_systems[company_name]
 
     """
@@ -65,27 +79,57 @@ class UTAWeb:
             company_name = extracted.domain
         return company_name
 
-    def crawl_web(self, web_url: str, company_name: str=None, domain_limit: str=None, exclude_domains: list[str]=None):
+    def crawl_web(self, web_url: str, company_name: str=None, domain_limit: str=None, exclude_domains: list[str]=None, resume: bool=True,
+                  incremental: bool=False, cleaning_workers: int=0, url_rules: dict=None,
+                  prioritize: bool=False, time_budget: float=None, byte_budget: int=None, stream_index: bool=False,
+                  shards: int=1, shard_partition: str='host'):
         """
         Initialize and run web crawler on specified URLs.
         Args:
             web_urls (list[str]): List of starting URLs to crawl
             company_name (str): Name of company for organizing output
             domain_limit (str): Domain restriction for crawler (None for unrestricted)
+            resume (bool): Whether to resume an interrupted crawl from its checkpoint
+            incremental (bool): Whether to re-crawl an existing website, skipping pages unchanged since the last crawl
+            cleaning_workers (int): Number of worker processes cleaning pages off the crawler's reactor, 0 to clean in the crawler
+            url_rules (dict): Further url rules of the crawler, see Crawler.url_filter.URLFilter
+            prioritize (bool): Whether to seed the crawl from the website's sitemaps and crawl the most important pages first
+            time_budget (float): Seconds after which the crawl is stopped and left resumable, None for no limit
+            byte_budget (int): Downloaded bytes after which the crawl is stopped and left resumable, None for no limit
+            stream_index (bool): Whether to index pages while crawling, so the website can be queried before the crawl finishes
+            shards (int): Number of crawler processes for very large websites, each crawling a shard of the urls
+            shard_partition (str): How urls are split between the shards, 'host' for websites with many subdomains or 'url'
         Returns:
-            str: 'Exist' if company directory exists and contains files, 'Success' if crawling is successful
+            str: 'Exist' if company directory exists and contains files (unless re-crawling incrementally), 'Success' if crawling is successful
         """
         company_name = self.get_company_name_from_url(web_url) if company_name is None else company_name
         company_dir = pjoin(self.data_dir, company_name)
+        if shards > 1 and (incremental or stream_index):
+            print("\n!!! Incremental and streamed crawls run in a single process, ignoring shards !!!\n")
+            shards = 1
+        if shards > 1:
+            resumable = resume and ShardedCrawl.is_resumable(company_dir)
+        else:
+            resumable = resume and os.path.exists(pjoin(company_dir, CrawlCheckpoint.file_name))
         
         # Check if company directory exists and contains files
-        if os.path.exists(company_dir) and os.listdir(company_dir):
+        if os.path.exists(company_dir) and os.listdir(company_dir) and not resumable and not incremental:
             print(f"\n!!! Website data for {web_url} already exists in {company_dir} !!!\n")
             return 'Exist'
+        # Crawl a very large website with one process per shard
+        elif shards > 1:
+            ShardedCrawl(self.data_dir, company_name, [web_url], shard_count=shards, partition=shard_partition,
+                         settings=self.crawler_settings, domain_limit=domain_limit, exclude_domains=exclude_domains,
+                         cleaning_workers=cleaning_workers, url_rules=url_rules, prioritize=prioritize,
+                         time_budget=time_budget, byte_budget=byte_budget).run(resume=resumable)
+            return 'Success'
         # Initialize crawler and start crawling
         else:   
             self.initialize_crawler()
-            self.crawler_process.crawl(UTASpider, output_dir=self.data_dir, start_urls=[web_url], company_name=company_name, domain_limit=domain_limit, exclude_domains=exclude_domains)
+            self.crawler_process.crawl(UTASpider, output_dir=self.data_dir, start_urls=[web_url], company_name=company_name, domain_limit=domain_limit, exclude_domains=exclude_domains,
+                                       resume=resumable, incremental=incremental, cleaning_workers=cleaning_workers, url_rules=url_rules,
+                                       prioritize=prioritize, time_budget=time_budget, byte_budget=byte_budget,
+                                       stream_index=stream_index)
             self.crawler_process.start()
             return 'Success'
 
@@ -211,7 +211,7 @@ function setStart() {
                     success: (response) => {
                         if (response.status === 'success') {
                             $welcomeMessage.stop().fadeOut(100, function() {
-                                websiteInfo.currentPage = response.website_analysis_info.visited_urls.length;
+                                websiteInfo.currentPage = visitedCount(response.website_analysis_info);
                                 websiteInfo.anlysisFinished = response.website_analysis_info.crawl_finished;
 
                                 updateByAnalysisStatus();
@@ -356,12 +356,12 @@ function setAnalyze() {
             if (response.status === 'success') {
                 const websiteData = response.data;
                 // Update stats using the same format as websiteManager
-                $('.pages-count').text(websiteData.visited_urls.length);
+                $('.pages-count').text(visitedCount(websiteData));
                 $('.domains-count').text(Object.keys(websiteData.domain_urls).length);
-                $('.failed-urls-count').text(websiteData.failed_urls?.length || 0);
+                $('.failed-urls-count').text(failedCount(websiteData));
 
                 // Enable chat button if more than 10 pages analyzed
-                if (websiteData.visited_urls.length >= 10) {
+                if (visitedCount(websiteData) >= 10) {
                     $('#startChatBtn')
                         .prop('disabled', false)
                         .html('<i class="bi bi-chat-dots-fill me-2"></i>Start chat with this website')
@@ -498,13 +498,13 @@ function setAnalyze() {
         `);
 
         // Update analysis status
-        const newPageNumber = websiteAnalysisInfo.visited_urls.length - websiteInfo.currentPage;
+        const newPageNumber = visitedCount(websiteAnalysisInfo) - websiteInfo.currentPage;
         updateByAnalysisStatus(newPageNumber);
 
         $modal.find('.update-time').text('Last Update ' + websiteAnalysisInfo.crawl_time);
-        $modal.find('.pages-count').text(websiteAnalysisInfo.visited_urls.length);
+        $modal.find('.pages-count').text(visitedCount(websiteAnalysisInfo));
         $modal.find('.domains-count').text(Object.keys(websiteAnalysisInfo.domain_urls).length);
-        // $modal.find('.failed-urls-count').text(websiteAnalysisInfo.failed_urls?.length || 0);
+        // $modal.find('.failed-urls-count').text(failedCount(websiteAnalysisInfo));
         // $modal.find('.subdomain-limit').text(websiteAnalysisInfo.domain_limit || 'None');
         
         // Update domains list
@@ -556,6 +556,15 @@ function getWebsiteInfoFromUrl(url) {
     };
 }
 
+// Page counts of a website info, from the url lists for websites crawled before the counts were saved
+function visitedCount(info) {
+    return info.visited_count ?? (info.visited_urls || []).length;
+}
+
+function failedCount(info) {
+    return info.failed_count ?? (info.failed_urls || []).length;
+}
+
 function addHttps(url) {
     if (!url) return '';
     if (!url.startsWith('http://') && !url.startsWith('https://')) {
@@ -301,7 +301,7 @@ export class WebsiteManager {
                                 <span class="badge ${site.crawl_finished ? 'website-status-bg-success' : 'website-status-bg-warning'} me-2">
                                     ${site.crawl_finished ? 'Analyzed' : 'In Progress'}
                                 </span>
-                                <span class="stats-text">${site.visited_urls.length} pages analyzed</span>
+                                <span class="stats-text">${this.visitedCount(site)} pages analyzed</span>
                             </div>
                         </div>
                     `;
@@ -353,9 +353,9 @@ export class WebsiteManager {
         $modal.find('.domain-url')
             .text(websiteData.start_urls[0])
             .attr('href', websiteData.start_urls[0]);
-        $modal.find('.pages-count').text(websiteData.visited_urls.length);
+        $modal.find('.pages-count').text(this.visitedCount(websiteData));
         $modal.find('.domains-count').text(Object.keys(websiteData.domain_urls).length);
-        $modal.find('.failed-urls-count').text(websiteData.failed_urls?.length || 0);
+        $modal.find('.failed-urls-count').text(this.failedCount(websiteData));
         $modal.find('.subdomain-limit').text(websiteData.domain_limit || 'None');
         
         this.updateModalDomainsList($modal, websiteData);
@@ -366,6 +366,15 @@ export class WebsiteManager {
         modal.show();
     }
 
+    // Page counts of a website info, from the url lists for websites crawled before the counts were saved
+    visitedCount(websiteData) {
+        return websiteData.visited_count ?? (websiteData.visited_urls || []).length;
+    }
+
+    failedCount(websiteData) {
+        return websiteData.failed_count ?? (websiteData.failed_urls || []).length;
+    }
+
     formatTimestamp(timestamp) {
         const date = new Date(timestamp);
         const now = new Date();
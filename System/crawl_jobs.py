@@ -0,0 +1,256 @@
+import json
+import os
+import signal
+import threading
+import uuid
+from datetime import datetime
+from multiprocessing import Process
+from os.path import join as pjoin
+
+
+class CrawlJobManager:
+    """
+    Queues crawl requests and runs them in a bounded number of worker processes, each with its own Twisted reactor.
+    Jobs are persisted, so queued and interrupted jobs are picked up again after a server restart, and only one job
+    per company is queued or running at a time.
+    Args:
+        target (callable): Function running one crawl in a worker process, called with the job's arguments as keyword arguments
+        data_dir (str): Directory of the crawled websites, used for live page counts
+        jobs_file (str): Path of the persistent job queue
+        max_workers (int): Maximum number of crawls running at once
+        history_size (int): Number of finished jobs kept for status reporting
+        poll_interval (float): Seconds between two scheduling rounds
+    """
+    active_statuses = ('queued', 'running')
+
+    def __init__(self, target, data_dir="./Output/websites", jobs_file="./Output/crawl_jobs.json", max_workers=2,
+                 history_size=200, poll_interval=1.0):
+        self.target = target
+        self.data_dir = data_dir
+        self.jobs_file = jobs_file
+        self.max_workers = max_workers
+        self.history_size = history_size
+        self.poll_interval = poll_interval
+
+        self.lock = threading.RLock()
+        self.jobs = []  # Job dicts in submission order
+        self.processes = {}  # {job id: Process}
+        self.stop_event = threading.Event()
+        self.scheduler = None
+        self.load_jobs()
+
+    """
+    *****************
+    *** Job queue ***
+    *****************
+    """
+    def load_jobs(self):
+        """
+        Loads the persisted jobs, requeueing jobs whose worker died with the previous server, as crawls resume from checkpoints.
+        """
+        if not os.path.exists(self.jobs_file):
+            return
+        try:
+            with open(self.jobs_file, 'r', encoding='utf-8') as f:
+                self.jobs = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"!!! Failed to load crawl jobs {self.jobs_file}: {e} !!!")
+            self.jobs = []
+        for job in self.jobs:
+            if job['status'] == 'running':
+                job.update(status='queued', pid=None, started_at=None)
+            elif job['status'] == 'cancelling':
+                job.update(status='cancelled', pid=None)
+
+    def save_jobs(self):
+        """
+        Writes the job queue atomically, dropping the oldest finished jobs beyond the history size.
+        """
+        finished = [job for job in self.jobs if job['status'] not in self.active_statuses + ('cancelling',)]
+        for job in finished[:max(0, len(finished) - self.history_size)]:
+            self.jobs.remove(job)
+        os.makedirs(os.path.dirname(os.path.abspath(self.jobs_file)), exist_ok=True)
+        tmp_path = f'{self.jobs_file}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.jobs, f, indent=2)
+        os.replace(tmp_path, self.jobs_file)
+
+    def submit(self, company_name, **kwargs):
+        """
+        Queues a crawl, unless a crawl of the same company is already queued or running.
+        Args:
+            company_name (str): Name of the company to crawl
+            kwargs: Arguments of the target function
+        Returns:
+            tuple: (job, created), where created is False if the active job of the company was returned instead
+        """
+        with self.lock:
+            active = self.active_job(company_name)
+            if active:
+                return active, False
+            job = {
+                'job_id': uuid.uuid4().hex[:12],
+                'company_name': company_name,
+                'args': kwargs,
+                'status': 'queued',
+                'pid': None,
+                'exit_code': None,
+                'created_at': self.now(),
+                'started_at': None,
+                'finished_at': None
+            }
+            self.jobs.append(job)
+            self.save_jobs()
+        self.start()
+        return job, True
+
+    def cancel(self, job_id=None, company_name=None):
+        """
+        Cancels a queued job, or stops a running crawl gracefully so it remains resumable from its checkpoint.
+        Args:
+            job_id (str): Id of the job to cancel
+            company_name (str): Company whose active job to cancel, if no job id is given
+        Returns:
+            dict: The cancelled job, or None if there is no such active job
+        """
+        with self.lock:
+            job = self.get_job(job_id) if job_id else self.active_job(company_name)
+            if not job or job['status'] not in self.active_statuses:
+                return None
+            if job['status'] == 'queued':
+                job.update(status='cancelled', finished_at=self.now())
+            else:
+                job['status'] = 'cancelling'
+                process = self.processes.get(job['job_id'])
+                if process is not None and process.is_alive():
+                    # Scrapy closes the spider gracefully on SIGINT, saving its checkpoint
+                    if hasattr(signal, 'SIGINT') and os.name != 'nt':
+                        os.kill(process.pid, signal.SIGINT)
+                    else:
+                        process.terminate()
+            self.save_jobs()
+            return job
+
+    def get_job(self, job_id):
+        return next((job for job in self.jobs if job['job_id'] == job_id), None)
+
+    def active_job(self, company_name):
+        return next((job for job in self.jobs if job['company_name'] == company_name and job['status'] in self.active_statuses), None)
+
+    @staticmethod
+    def now():
+        return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    """
+    ******************
+    *** Scheduling ***
+    ******************
+    """
+    def start(self):
+        """
+        Starts the scheduler thread if it is not running yet.
+        """
+        with self.lock:
+            if self.scheduler is None or not self.scheduler.is_alive():
+                self.stop_event.clear()
+                self.scheduler = threading.Thread(target=self.run_scheduler, name='crawl-job-scheduler', daemon=True)
+                self.scheduler.start()
+
+    def stop(self):
+        """
+        Stops the scheduler thread, running crawls continue in their processes.
+        """
+        self.stop_event.set()
+
+    def run_scheduler(self):
+        while not self.stop_event.is_set():
+            try:
+                self.schedule()
+            except Exception as e:
+                print(f"!!! Crawl job scheduling failed: {e} !!!")
+            self.stop_event.wait(self.poll_interval)
+
+    def schedule(self):
+        """
+        Reaps finished workers and starts queued jobs while worker slots are free.
+        """
+        with self.lock:
+            changed = False
+            # Reap finished workers
+            for job_id, process in list(self.processes.items()):
+                if process.is_alive():
+                    continue
+                process.join()
+                job = self.get_job(job_id)
+                if job:
+                    if job['status'] == 'cancelling':
+                        job['status'] = 'cancelled'
+                    else:
+                        job['status'] = 'done' if process.exitcode == 0 else 'failed'
+                    job.update(exit_code=process.exitcode, pid=None, finished_at=self.now())
+                del self.processes[job_id]
+                changed = True
+
+            # Start queued jobs in submission order
+            for job in self.jobs:
+                if len(self.processes) >= self.max_workers:
+                    break
+                if job['status'] != 'queued':
+                    continue
+                process = Process(target=self.target, kwargs=job['args'], name=f"crawl-{job['company_name']}", daemon=False)
+                process.start()
+                self.processes[job['job_id']] = process
+                job.update(status='running', pid=process.pid, started_at=self.now())
+                print(f"Started crawl job {job['job_id']} for {job['company_name']}")
+                changed = True
+
+            if changed:
+                self.save_jobs()
+
+    """
+    **************
+    *** Status ***
+    **************
+    """
+    def status(self, company_name=None):
+        """
+        Reports the crawl jobs with live page counts from the website summaries the running crawlers keep rewriting.
+        Args:
+            company_name (str): Only report the jobs of this company
+        Returns:
+            dict: Jobs grouped by 'queued', 'running' and 'done', where done includes failed and cancelled jobs
+        """
+        with self.lock:
+            jobs = [dict(job) for job in self.jobs if company_name is None or job['company_name'] == company_name]
+        report = {'queued': [], 'running': [], 'done': []}
+        for job in jobs:
+            job.pop('args', None)
+            if job['status'] in ('running', 'cancelling') or (job['status'] == 'done' and company_name):
+                job['progress'] = self.progress(job['company_name'])
+            group = job['status'] if job['status'] in ('queued', 'running') else 'running' if job['status'] == 'cancelling' else 'done'
+            report[group].append(job)
+        report['done'].reverse()  # Newest first
+        return report
+
+    def progress(self, company_name):
+        """
+        Reads the live page counts of a crawl.
+        Args:
+            company_name (str): Name of the crawled company
+        Returns:
+            dict: Visited, failed and stream-indexed page counts, crawl speed and whether the crawl finished, or None before the first summary
+        """
+        try:
+            with open(pjoin(self.data_dir, company_name, 'website_info.json'), 'r', encoding='utf-8') as f:
+                info = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+        return {
+            'visited_count': info.get('visited_count', 0),
+            'failed_count': info.get('failed_count', 0),
+            'pages_per_second': info.get('pages_per_second'),
+            'indexed_count': info.get('indexed_count'),
+            'crawl_finished': info.get('crawl_finished', False),
+            'updated_at': info.get('crawl_time')
+        }
+
@@ -3,14 +3,17 @@ from os.path import join as pjoin
 import sys
 from flask import Flask, request, jsonify, send_from_directory
 from flask_cors import CORS
-from multiprocessing import Process
 import glob
 import json
 # Add Backend directory directly
 sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Backend'))
 
 from Backend.UTAWeb import UTAWeb
+from Crawler.url_filter import URLFilter
+from RAG.embedding_registry import EmbeddingRegistry
+from RAG.stream_indexer import IndexingInProgress
 from System.conversation import Conversation
+from System.crawl_jobs import CrawlJobManager
 from System.user import User
 
 app = Flask(__name__)
@@ -29,6 +32,7 @@ CORS(app, resources={
 })
 # Global variable declaration
 utaweb = None
+crawl_jobs = None
 
 """
 **********************
@@ -137,7 +141,7 @@ def serve_images(filename):
 *** Crawling & Analysis ***
 ***************************
 """
-def crawl_process(web_url, domain_limit):
+def crawl_process(web_url, domain_limit, incremental=False, url_rules=None, prioritize=False, stream_index=False, shards=1):
     """
     Crawl a website
     Return:
@@ -151,7 +155,12 @@ def crawl_process(web_url, domain_limit):
     utaweb_instance.crawl_web(
         web_url=web_url,
         company_name=company_name,
-        domain_limit=domain_limit
+        domain_limit=domain_limit,
+        incremental=incremental,
+        url_rules=url_rules,
+        prioritize=prioritize,
+        stream_index=stream_index,
+        shards=shards
     )
 
 @app.route('/crawl', methods=['POST'])
@@ -170,13 +179,61 @@ def crawl():
 
     # Use the domain limit as the start url if provided, otherwise use the domain name
     domain_limit = data['domainLimit'] if data['domainLimit'] != '' else data['domainName']
-    # Start crawl process
-    process = Process(
-        target=crawl_process,
-        args=(domain_limit, domain_limit)
+    # Optional url rules, such as {"deny_paths": ["/en/news/"], "exclude_patterns": ["[?&]page=\\d+"]}
+    url_rules = data.get('urlRules')
+    try:
+        URLFilter.from_rules(domain_limit, rules=url_rules)
+    except (ValueError, TypeError) as e:
+        return jsonify({"status": "error", "message": f"Invalid url rules: {e}"})
+    # Crawl very large websites with several processes, each crawling a shard of the urls
+    shards = data.get('shards', 1)
+    if isinstance(shards, bool) or not isinstance(shards, int) or shards < 1:
+        return jsonify({"status": "error", "message": f"Invalid shards: {shards!r}, expected a positive integer"}), 400
+    # Queue the crawl, a crawl of the same company that is already queued or running is reused
+    company_name = UTAWeb.get_company_name_from_url(domain_limit)
+    job, created = crawl_jobs.submit(
+        company_name,
+        web_url=domain_limit,
+        domain_limit=domain_limit,
+        incremental=data.get('incremental', False),
+        url_rules=url_rules,
+        prioritize=data.get('prioritize', False),
+        # Index pages while crawling, so the website can be queried before the crawl finishes
+        stream_index=data.get('streamIndex', False),
+        shards=shards
     )
-    process.start()
-    return jsonify({"status": "success", "message": "Crawling started in background"})
+    message = "Crawling queued in background" if created else f"Crawl of {company_name} is already {job['status']}"
+    return jsonify({"status": "success", "message": message, "job_id": job['job_id'], "company_name": company_name})
+
+@app.route('/crawl_status', methods=['GET', 'POST'])
+def crawl_status():
+    """
+    Get the queued, running and finished crawl jobs, with live page counts of running crawls
+    Return:
+        queued, running, done: Lists of crawl jobs
+    """
+    data = request.get_json(silent=True) or {}
+    company_name = data.get('companyName')
+    if not company_name and data.get('domainName'):
+        company_name = UTAWeb.get_company_name_from_url(data['domainName'])
+    return jsonify(crawl_jobs.status(company_name))
+
+@app.route('/cancel_crawl', methods=['POST'])
+def cancel_crawl():
+    """
+    Cancel a queued or running crawl job, running crawls stop after saving their checkpoint
+    Return:
+        status: success or error
+        message: message to display
+    """
+    data = request.json
+    company_name = data.get('companyName')
+    if not company_name and data.get('domainName'):
+        company_name = UTAWeb.get_company_name_from_url(data['domainName'])
+    job = crawl_jobs.cancel(job_id=data.get('jobId'), company_name=company_name)
+    if job is None:
+        return jsonify({"status": "error", "message": "No queued or running crawl found"})
+    return jsonify({"status": "success", "message": f"Crawl of {job['company_name']} {job['status']}", "job_id": job['job_id']})
 
 """
 *******************
@@ -206,6 +263,9 @@ def initialize_rag_system():
         website_info = json.load(open(pjoin(directory_path, 'website_info.json'), 'r'))
         print(f'RAG systems initialized for {data["web_url"]}')
         return jsonify({"status": "success", "message": "RAG systems initialized", "recommended_questions": recommended_questions, "website_analysis_info": website_info})
+    except IndexingInProgress as e:
+        # A streaming crawl has not saved its index yet, the client retries later
+        return jsonify({"status": "indexing", "message": str(e)})
     except Exception as e:
         print(f"Error initializing RAG systems: {e}")
         return jsonify({"status": "error", "message": "Error initializing RAG systems"})
@@ -219,7 +279,10 @@ def query():
     """
     print(request.json)
     data = request.json
-    result = utaweb.query(query=data['query'], web_url=data['web_url'])
+    try:
+        result = utaweb.query(query=data['query'], web_url=data['web_url'])
+    except IndexingInProgress as e:
+        return jsonify({"status": "indexing", "answer": str(e)})
     # Init user for saving conversations
     user = User(user_id=data['user_id'])
     # Save conversation
@@ -229,11 +292,27 @@ def query():
     conv.save_conversation()
     return jsonify({"answer": result})
 
+@app.route('/embedding_models', methods=['GET'])
+def embedding_models():
+    """
+    Get the embedding models loaded by the server, shared by all websites
+    Return:
+        models: Load time and memory footprint of each model
+    """
+    return jsonify({"models": EmbeddingRegistry.stats()})
+
 
 # Singleton initialization in the main
 if __name__ == '__main__':
     # Create singleton UTAWeb instance for rag system
     utaweb = UTAWeb(initializing=False, data_dir="./Output/websites")
+    # Crawl jobs run in their own processes, at most max_workers at a time
+    crawl_jobs = CrawlJobManager(crawl_process, data_dir="./Output/websites", jobs_file="./Output/crawl_jobs.json", max_workers=2)
+    # Resume jobs queued before a restart, only in the serving process and not in the debug reloader's watcher
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        crawl_jobs.start()
+        # Load the embedding model while the server starts, so the first website does not wait for it
+        EmbeddingRegistry.warm_up(background=True)
     
     print("Starting server...")
     app.run(host='0.0.0.0', port=7777, debug=True) 
\ No newline at end of file